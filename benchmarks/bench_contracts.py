@@ -0,0 +1,41 @@
+import json
+import sys
+import time
+
+from saim.client import HOUSEHOLD, PRODUCT, STOCK, STOCK_ITEM
+from saim.contracts import validate
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.standin import PRODUCTS_CATALOG
+
+UNAUTHORIZED = {'error': {'error_title': 'Unauthorized',
+                          'error_message': 'Not authorized to access data.  Please check the URI for correctness.',
+                          'control_code': '7010'}}
+
+
+def per_call(fn, *args, repeat=20000):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def main(stock_sizes):
+    # validation next to what the response already cost to decode, per response
+    cases = [('household', 'GET', HOUSEHOLD, 200, dict(SEED_HOUSEHOLD, id='1001')),
+             ('stock item', 'GET', STOCK_ITEM, 200, SEED_STOCK[0]),
+             ('product', 'GET', PRODUCT, 200, PRODUCTS_CATALOG[0]),
+             ('7010 error', 'GET', HOUSEHOLD, 401, UNAUTHORIZED)]
+    for size in stock_sizes:
+        cases.append(('stock x%d' % size, 'GET', STOCK, 200, [dict(SEED_STOCK[0], id=str(n)) for n in range(size)]))
+
+    print('%-14s %12s %12s' % ('response', 'validate us', 'json us'))
+    for name, method, template, status, data in cases:
+        payload = json.dumps(data)
+        repeat = max(20000 // max(len(data) if isinstance(data, list) else 1, 1), 20)
+        assert not validate(method, template, status, data)
+        print('%-14s %12.2f %12.2f' % (name, per_call(validate, method, template, status, data, repeat=repeat) * 1e6,
+                                        per_call(json.loads, payload, repeat=repeat) * 1e6))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100, 1000])
@@ -0,0 +1,70 @@
+import json
+import sys
+import time
+
+from saim import Client
+from saim.errors import TransportError
+from saim.faults import FaultInjector, Rule
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.standin import StandinServer
+
+# client throughput and tail latency against a degraded stand-in; pass a scenario json to run that instead
+SCENARIOS = {
+    'healthy': [],
+    'slow': [Rule(latency={'dist': 'lognormal', 'median': 0.005, 'sigma': 1.0})],
+    'flaky': [Rule(errors=0.05, status=503), Rule(drop=0.02), Rule(truncate=0.02)],
+    'bursts': [Rule(burst=(20, 200), status=503)],
+    'drip': [Rule('GET *', drip=0.1, drip_chunk=32, drip_interval=0.002)],
+}
+
+
+def percentile(values, p):
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+
+def run(scenario, transport, requests, workers):
+    faults = FaultInjector()
+    with StandinServer(faults=faults) as server, Client('key', server.base_url, transport, timeout=10) as client:
+        household_id = client.post_household(SEED_HOUSEHOLD).json()['id']
+        client.post_stock(household_id, SEED_STOCK)
+        # the faults start with the measured requests
+        if isinstance(scenario, dict):
+            faults.phases = FaultInjector.from_scenario(scenario).phases
+            faults.rng.seed(scenario.get('seed'))
+        else:
+            faults.set_rules(scenario)
+            faults.rng.seed(1)
+        faults.restart()
+
+        def call(n):
+            start = time.perf_counter()
+            try:
+                status = client.get_stock(household_id).status
+            except TransportError:
+                status = 'transport'
+            return time.perf_counter() - start, status
+
+        start = time.perf_counter()
+        results = [result for _, result, _ in client.map(call, range(requests), workers, ordered=False)]
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    failed = sum(1 for r in results if r[1] != 200)
+    return requests / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.99), failed
+
+
+def main(argv):
+    scenarios = dict(SCENARIOS)
+    if argv:
+        with open(argv[0], encoding='utf-8') as f:
+            scenarios = {argv[0]: json.load(f)}
+    requests = 2000
+    print('%-10s %-8s %10s %10s %10s %8s' % ('scenario', 'client', 'req/s', 'p50 ms', 'p99 ms', 'failed'))
+    for name, scenario in scenarios.items():
+        for transport in ('urllib', 'pooled'):
+            rate, p50, p99, failed = run(scenario, transport, requests, 16)
+            print('%-10s %-8s %10.0f %10.2f %10.2f %8d' % (name, transport, rate, p50 * 1000, p99 * 1000, failed))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,57 @@
+import sys
+import time
+
+import numpy as np
+
+from saim import analytics
+
+
+def make_series(items, per_item, seed=0):
+    # synthetic histories straight into columns: mostly removals, an occasional restock, spread over 60 days
+    rng = np.random.default_rng(seed)
+    n = items * per_item
+    item = np.repeat(np.arange(items), per_item)
+    now = analytics.now_days()
+    time_ = now - rng.uniform(0, 60, n)
+    quantity = np.where(rng.random(n) < 0.8, -rng.integers(1, 4, n), rng.integers(5, 20, n))
+    series = analytics.TransactionSeries([str(k) for k in range(items)], item, time_, quantity)
+    return series, now, rng.integers(0, 30, items), rng.integers(1, 5, items)
+
+
+def naive(series, now, on_hand, minimum, window):
+    # per-item python loop, what scoring looks like without the columns
+    days = []
+    bounds = np.searchsorted(series.item, np.arange(len(series) + 1))
+    for i in range(len(series)):
+        used = sum(-q for t, q in zip(series.time[bounds[i]:bounds[i + 1]], series.quantity[bounds[i]:bounds[i + 1]])
+                   if q < 0 and now - window < t <= now)
+        rate = used / window
+        headroom = on_hand[i] - minimum[i]
+        days.append(0.0 if headroom < 0 else headroom / rate if rate else float('inf'))
+    return days
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(sizes, per_item=20):
+    print('%10s %12s %12s %12s %12s' % ('items', 'score s', 'halflife s', 'rolling s', 'naive s'))
+    for size in sizes:
+        series, now, on_hand, minimum = make_series(size, per_item)
+        score, result = timed(analytics.forecast, series, on_hand, minimum, now, 14)
+        weighted, _ = timed(analytics.forecast, series, on_hand, minimum, now, 14, 7)
+        rolling, _ = timed(analytics.rolling_rates, series, now, 14, 7)
+        # the loop only on a slice, scaled up
+        sample = min(size, 20000)
+        part, _ = timed(naive, analytics.TransactionSeries(series.keys[:sample], series.item[:sample * per_item],
+                                                           series.time[:sample * per_item],
+                                                           series.quantity[:sample * per_item]),
+                        now, on_hand, minimum, 14)
+        print('%10d %12.3f %12.3f %12.3f %12.1f' % (size, score, weighted, rolling, part * size / sample))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 500000])
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+from saim.cache import CachingTransport, EntityCache
+from saim.client import HOUSEHOLD, HOUSEHOLDS, PRODUCTS, STOCK, STOCK_ITEM, Client
+from saim.contracts import validate
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.serialize import JsonArrayWriter
+from saim.standin import PRODUCTS_CATALOG
+from saim.transport import Response
+from saim.validation import validate_household, validate_stock_item
+
+# microbenchmarks of the sdk's hot paths (encoding request bodies, validation, contract checks, decoding responses,
+# cache lookups) with stored baselines, so a change that slows one of them down shows up:
+#
+#   PYTHONPATH=. python benchmarks/bench_hotpaths.py run                              # time every case
+#   PYTHONPATH=. python benchmarks/bench_hotpaths.py run --save baseline.json         # and store the times
+#   PYTHONPATH=. python benchmarks/bench_hotpaths.py compare baseline.json            # exit 1 on a regression
+#   PYTHONPATH=. python benchmarks/bench_hotpaths.py compare baseline.json new.json   # two stored runs
+#
+# -k NAME runs the cases whose name contains NAME. the payloads are the ones the unittests send and expect: the
+# household of test_1_post_households, the two stock items of test_post_households_stock_list (and 10k of them), the
+# product list of test_get_products_list and the 7010 envelope of the unauthorized tests. each case's time is the best
+# of --rounds short rounds, the one least disturbed by the rest of the machine. a baseline only means something on the
+# machine and python it was taken with, compare warns when they differ. the cases are timed in --processes child
+# processes and the best of those counts too, and a case that comes out more than --threshold slower is timed again
+# (--retries) before it counts as a regression
+
+THRESHOLD = 0.2
+ROUNDS = 20
+ROUND_TIME = 0.02
+PROCESSES = 3
+
+UNAUTHORIZED = {'error': {'error_title': 'Unauthorized',
+                          'error_message': 'Not authorized to access data.  Please check the URI for correctness.',
+                          'control_code': '7010'}}
+
+
+def stock(size):
+    return [dict(SEED_STOCK[n % 2], id=str(1310035849 + n)) for n in range(size)]
+
+
+def products(size):
+    return [dict(PRODUCTS_CATALOG[0], id=str(1207714220 + n)) for n in range(size)]
+
+
+class Canned:
+    # a transport that answers everything with one response, for the cache's miss path
+    def __init__(self, status, payload):
+        self.status = status
+        self.payload = payload
+
+    def send(self, request, timeout=None):
+        return Response(self.status, self.payload, {})
+
+    def close(self):
+        pass
+
+
+def cases():
+    # [(name, fn), ...], fn doing one call of the path
+    client = Client('key', 'http://127.0.0.1:1/saim/v1')
+    household = dict(SEED_HOUSEHOLD, id='1001')
+    stock_10k = stock(10000)
+    products_100 = products(100)
+    writer = JsonArrayWriter()
+    item = {'household_id': '1001', 'list_id': 'main', 'stock_id': SEED_STOCK[0]['id']}
+
+    result = [
+        ('encode household', lambda: client.build_request('POST', HOUSEHOLDS, body=SEED_HOUSEHOLD)),
+        ('encode stock x2', lambda: writer.dump(SEED_STOCK)),
+        ('encode stock x10k', lambda: writer.dump(stock_10k)),
+        ('encode stock x10k chunked', lambda: sum(len(chunk) for chunk in writer.chunks(stock_10k))),
+        ('validate household', lambda: validate_household(SEED_HOUSEHOLD)),
+        ('validate stock x2', lambda: [validate_stock_item(item) for item in SEED_STOCK]),
+        ('validate stock x10k', lambda: [validate_stock_item(item) for item in stock_10k]),
+        ('contract household', lambda: validate('GET', HOUSEHOLD, 200, household)),
+        ('contract stock x10k', lambda: validate('GET', STOCK, 200, stock_10k)),
+        ('contract products x100', lambda: validate('GET', PRODUCTS, 200, products_100)),
+        ('contract error 7010', lambda: validate('GET', HOUSEHOLD, 401, UNAUTHORIZED)),
+    ]
+
+    for name, status, data in (('household', 200, household), ('stock x2', 200, SEED_STOCK),
+                               ('stock x10k', 200, stock_10k), ('products x100', 200, products_100),
+                               ('error 7010', 401, UNAUTHORIZED)):
+        payload = json.dumps(data).encode()
+        if status == 200:
+            result.append(('parse ' + name, lambda status=status, payload=payload: Response(status, payload).json()))
+        else:
+            result.append(('parse ' + name, lambda status=status, payload=payload: Response(status, payload).error))
+
+    # a household from the cache, through the transport like every client call; a stock item the cache doesn't have
+    cache = EntityCache()
+    caching = CachingTransport(Canned(200, json.dumps(household).encode()), cache)
+    hit = client.build_request('GET', HOUSEHOLD, {'household_id': '1001'})
+    caching.send(hit)
+    miss = client.build_request('GET', STOCK_ITEM, item)
+    missing = CachingTransport(Canned(404, b'{}'), EntityCache())
+    result += [('cache hit household', lambda: caching.send(hit)),
+               ('cache miss stock item', lambda: missing.send(miss))]
+    return result
+
+
+def measure(fn, rounds=ROUNDS, round_time=ROUND_TIME):
+    # seconds per call, the best of rounds rounds of at least round_time each: many short rounds give the best one a
+    # fair chance of not being interrupted
+    timer = timeit.Timer(fn)
+    number = 1
+    while timer.timeit(number) < round_time:
+        number *= 2
+    return min(timer.repeat(rounds, number)) / number
+
+
+def _spawn(pattern, rounds, names):
+    # {name: seconds} timed by a child process
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'run.json')
+        command = [sys.executable, os.path.abspath(__file__), '--rounds', str(rounds), '--processes', '0']
+        if pattern:
+            command += ['-k', pattern]
+        for name in names or ():
+            command += ['--case', name]
+        subprocess.run(command + ['run', '--save', path], stdout=subprocess.DEVNULL, check=True)
+        return load(path)['cases']
+
+
+def run(pattern=None, rounds=ROUNDS, names=None, processes=PROCESSES, out=sys.stdout):
+    # the best time of every case over `processes` child processes (0: time them in this one): a process that landed
+    # on a busy cpu stays slow for as long as it runs
+    results = {}
+    if processes:
+        for _ in range(processes):
+            for name, seconds in _spawn(pattern, rounds, names).items():
+                results[name] = min(results.get(name, seconds), seconds)
+    else:
+        for name, fn in cases():
+            if (pattern and pattern not in name) or (names and name not in names):
+                continue
+            results[name] = measure(fn, rounds)
+    for name, seconds in results.items():
+        print('%-28s %12.3f us' % (name, seconds * 1e6), file=out)
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'machine': platform.machine(), 'platform': platform.platform(), 'created': time.time(),
+            'cases': results}
+
+
+def recheck(baseline, current, threshold=THRESHOLD, retries=3, rounds=ROUNDS, out=sys.stdout):
+    # times the cases that look regressed again in a new process, up to retries times, keeping their best time: a
+    # one-off slow run shouldn't fail the comparison, a real regression stays slow
+    for _ in range(retries):
+        suspects = [name for name, seconds in current['cases'].items()
+                    if name in baseline['cases'] and seconds > baseline['cases'][name] * (1 + threshold)]
+        if not suspects:
+            return
+        again = _spawn(None, rounds, suspects)
+        for name in suspects:
+            current['cases'][name] = min(current['cases'][name], again[name])
+            print('%-28s %12.3f us (again)' % (name, current['cases'][name] * 1e6), file=out)
+
+
+def compare(baseline, current, threshold=THRESHOLD, pattern=None, out=sys.stdout):
+    # prints every case next to its baseline; returns the names of those more than threshold slower
+    for key in ('python', 'implementation', 'machine'):
+        if baseline.get(key) != current.get(key):
+            print('warning: baseline %s is %s, this is %s' % (key, baseline.get(key), current.get(key)), file=out)
+    regressions = []
+    print('%-28s %12s %12s %8s' % ('case', 'baseline us', 'current us', 'change'), file=out)
+    for name, seconds in current['cases'].items():
+        before = baseline['cases'].get(name)
+        if before is None:
+            print('%-28s %12s %12.3f %8s' % (name, '-', seconds * 1e6, 'new'), file=out)
+            continue
+        change = seconds / before - 1
+        mark = ''
+        if change > threshold:
+            regressions.append(name)
+            mark = '  REGRESSION'
+        print('%-28s %12.3f %12.3f %+7.1f%%%s' % (name, before * 1e6, seconds * 1e6, change * 100, mark), file=out)
+    for name in baseline['cases']:
+        if name not in current['cases'] and (pattern is None or pattern in name):
+            print('%-28s %12.3f %12s %8s' % (name, baseline['cases'][name] * 1e6, '-', 'gone'), file=out)
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save(path, results):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_hotpaths.py', description='Microbenchmarks with baselines.')
+    parser.add_argument('-k', dest='pattern', help='only the cases whose name contains this')
+    parser.add_argument('--case', action='append', help='only this case (repeatable)')
+    parser.add_argument('--processes', type=int, default=PROCESSES,
+                        help='time the cases in this many processes, the best one counts (default: %d)' % PROCESSES)
+    parser.add_argument('--rounds', type=int, default=ROUNDS,
+                        help='rounds per case, the best one counts (default: %d)' % ROUNDS)
+    commands = parser.add_subparsers(dest='command', metavar='<command>')
+    commands.required = True
+    run_parser = commands.add_parser('run', help='time the cases')
+    run_parser.add_argument('--save', metavar='FILE', help='store the times as a baseline')
+    compare_parser = commands.add_parser('compare', help='time the cases (or load FILE) and compare to a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current', nargs='?', help='a stored run instead of timing the cases now')
+    compare_parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                                help='slowdown that fails the comparison (default: %s, 20%%)' % THRESHOLD)
+    compare_parser.add_argument('--retries', type=int, default=3,
+                                help='times to time a case that looks regressed again (default: 3)')
+    compare_parser.add_argument('--save', metavar='FILE', help='store this run as well')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run(args.pattern, args.rounds, args.case, args.processes)
+        if args.save:
+            save(args.save, results)
+        return 0
+
+    baseline = load(args.baseline)
+    if args.current:
+        current = load(args.current)
+        if args.pattern:
+            current['cases'] = {k: v for k, v in current['cases'].items() if args.pattern in k}
+    else:
+        current = run(args.pattern, args.rounds, args.case, args.processes, out=sys.stderr)
+        recheck(baseline, current, args.threshold, args.retries, args.rounds, out=sys.stderr)
+        if args.save:
+            save(args.save, current)
+    regressions = compare(baseline, current, args.threshold, args.pattern)
+    if regressions:
+        print('%d of %d cases regressed by more than %d%%: %s' % (
+            len(regressions), len(current['cases']), args.threshold * 100, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+
+from saim import Client
+from saim.standin import Backend, Handler, StandinServer
+from saim.transport import PooledTransport, UrllibTransport
+
+# 1k concurrent small GETs (stock items of one household) against the local stand-in, per transport:
+#   python benchmarks/bench_http2.py [requests] [concurrency]
+# the http/2 run needs httpx[http2] for the client and h2 for the local h2c server, and is skipped without them
+
+
+class CountingHandler(Handler):
+    connections = 0
+
+    def setup(self):
+        CountingHandler.connections += 1
+        super().setup()
+
+
+def seed(backend, items=50):
+    status, data = backend.handle('POST', '/saim/v1/households', {'first_name': 'John', 'last_name': 'Doe',
+                                                                   'address': 'Cardboard Box #3',
+                                                                   'email': 'homeless@nowhere.com'})
+    household_id = data['id']
+    stock = [{'id': str(1310035849 + n), 'title': 'item %d' % n, 'on_hand': 3, 'on_order': 0, 'min': 2, 'max': 5}
+             for n in range(items)]
+    backend.handle('POST', '/saim/v1/households/%s/lists/main/stock' % household_id, stock)
+    return household_id, [item['id'] for item in stock]
+
+
+def serve_h2(backend):
+    # a minimal h2c (prior knowledge) server on top of the same backend
+    import h2.config
+    import h2.connection
+    import h2.events
+
+    class Protocol(asyncio.Protocol):
+        def connection_made(self, transport):
+            self.transport = transport
+            self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False,
+                                                                             header_encoding='utf-8'))
+            self.streams = {}
+            self.conn.initiate_connection()
+            transport.write(self.conn.data_to_send())
+            ServerState.connections += 1
+
+        def data_received(self, data):
+            for event in self.conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    self.streams[event.stream_id] = (dict(event.headers), bytearray())
+                elif isinstance(event, h2.events.DataReceived):
+                    self.streams[event.stream_id][1].extend(event.data)
+                    self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    headers, body = self.streams.pop(event.stream_id)
+                    status, data = backend.handle(headers[':method'], headers[':path'],
+                                                  json.loads(body) if body else None)
+                    payload = json.dumps(data).encode()
+                    self.conn.send_headers(event.stream_id, [(':status', str(status)),
+                                                             ('content-type', 'application/json'),
+                                                             ('content-length', str(len(payload)))])
+                    self.conn.send_data(event.stream_id, payload, end_stream=True)
+            self.transport.write(self.conn.data_to_send())
+
+    class ServerState:
+        connections = 0
+        port = None
+
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(loop.create_server(Protocol, '127.0.0.1', 0))
+        ServerState.port = server.sockets[0].getsockname()[1]
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return ServerState
+
+
+def run(name, client, household_id, stock_ids, requests, concurrency):
+    # warm up, then time the burst
+    list(client.map(lambda stock_id: client.get_stock_item(household_id, stock_id), stock_ids[:concurrency],
+                    concurrency))
+    calls = [stock_ids[n % len(stock_ids)] for n in range(requests)]
+    latencies = []
+    start = time.perf_counter()
+    for stock_id, resp, error in client.map(lambda stock_id: client.get_stock_item(household_id, stock_id), calls,
+                                            concurrency, ordered=False):
+        if error is not None or resp.status != 200:
+            raise SystemExit('%s failed: %s' % (name, error or resp.status))
+        latencies.append(resp.elapsed)
+    total = time.perf_counter() - start
+    latencies.sort()
+    print('%-16s %8.0f req/s %9.2f ms p50 %9.2f ms p99' % (name, requests / total,
+                                                           latencies[len(latencies) // 2] * 1000,
+                                                           latencies[int(len(latencies) * 0.99)] * 1000), end='')
+    client.close()
+
+
+def main(requests=1000, concurrency=100):
+    backend = Backend()
+    household_id, stock_ids = seed(backend)
+
+    with StandinServer(backend=backend, handler=CountingHandler) as server:
+        for name, transport in (('urllib', UrllibTransport()), ('pooled http/1.1', PooledTransport(concurrency))):
+            before = CountingHandler.connections
+            run(name, Client('key', server.base_url, transport), household_id, stock_ids, requests, concurrency)
+            print('   %5d connections' % (CountingHandler.connections - before))
+
+    from saim import http2
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        h2 = None
+    if not http2.available() or h2 is None:
+        print('%-16s skipped (pip install httpx[http2])' % 'http/2')
+        return
+
+    state = serve_h2(backend)
+    transport = http2.Http2Transport(prior_knowledge=True)
+    run('http/2', Client('key', 'http://127.0.0.1:%d/saim/v1' % state.port, transport), household_id, stock_ids,
+        requests, concurrency)
+    print('   %5d connections' % state.connections)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,54 @@
+import sys
+import threading
+import time
+
+from saim.metrics import DURATION, IN_FLIGHT, REQUESTS, Registry, declare
+
+
+class LockedRegistry(Registry):
+    # the obvious alternative: one dict and one lock for everyone
+    def __init__(self):
+        super().__init__()
+        self._values = {}
+        self._hists = {}
+        self._global = threading.Lock()
+
+    def inc(self, name, labels=(), value=1):
+        with self._global:
+            self._values[(name, labels)] = self._values.get((name, labels), 0) + value
+
+    def observe(self, name, labels, value):
+        with self._global:
+            super().observe(name, labels, value)
+
+
+def record(registry, n):
+    # what MetricsTransport records per request
+    labels = ('GET', '/households/{household_id}')
+    outcome = labels + ('200', '')
+    for _ in range(n):
+        registry.inc(IN_FLIGHT, labels)
+        registry.observe(DURATION, labels, 0.004)
+        registry.inc(IN_FLIGHT, labels, -1)
+        registry.inc(REQUESTS, outcome)
+
+
+def run(registry, threads, n):
+    workers = [threading.Thread(target=record, args=(registry, n)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) / (threads * n)
+
+
+def main(n=100000):
+    print('%-10s %8s %16s' % ('registry', 'threads', 'us per request'))
+    for threads in (1, 4, 16):
+        for name, registry in (('sharded', declare(Registry())), ('locked', declare(LockedRegistry()))):
+            print('%-10s %8d %16.3f' % (name, threads, run(registry, threads, n // threads) * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,85 @@
+import random
+import sys
+import time
+
+from saim import pricing
+from saim.fixtures import SEED_STOCK
+from saim.standin import PRODUCTS_CATALOG
+
+
+def make(items, per_household=200, products=50000, seed=0):
+    # stock lists like the seed's, of ids drawn from a catalog like the stand-in's; some ids aren't in the catalog
+    rng = random.Random(seed)
+    catalog = [dict(PRODUCTS_CATALOG[0], id=str(1207714220 + n), price=round(rng.uniform(0.5, 80), 2))
+               for n in range(products)]
+    stock_lists = {}
+    for n in range(items):
+        item = dict(SEED_STOCK[n % 2], id=str(1207714220 + rng.randrange(int(products * 1.05))),
+                    on_hand=rng.randrange(12), on_order=rng.randrange(3))
+        stock_lists.setdefault(str(1001 + n // per_household), []).append(item)
+    return stock_lists, catalog
+
+
+def naive(stock_lists, catalog):
+    # nested loops over the dicts, what pricing looks like without the columns
+    per_household = {}
+    for household_id, items in stock_lists.items():
+        units = cents = 0
+        for item in items:
+            position = (item.get('on_hand') or 0) + (item.get('on_order') or 0)
+            minimum = item.get('min') or 0
+            if position >= minimum:
+                continue
+            quantity = max(item.get('max') or 0, minimum) - position
+            units += quantity
+            for product in catalog:
+                if product['id'] == item['id']:
+                    cents += quantity * round(product['price'] * 100)
+                    break
+        per_household[household_id] = (units, cents)
+    return per_household
+
+
+def naive_dict(stock_lists, catalog):
+    # the same with the catalog indexed by id first, the best a loop does
+    prices = {product['id']: round(product['price'] * 100) for product in catalog if product.get('price') is not None}
+    per_household = {}
+    for household_id, items in stock_lists.items():
+        units = cents = 0
+        for item in items:
+            position = (item.get('on_hand') or 0) + (item.get('on_order') or 0)
+            minimum = item.get('min') or 0
+            if position < minimum:
+                quantity = max(item.get('max') or 0, minimum) - position
+                units += quantity
+                cents += quantity * prices.get(item['id'], 0)
+        per_household[household_id] = (units, cents)
+    return per_household
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(sizes):
+    # columns: flattening the stock lists and the catalog; price: restock() and per_household() on the columns, what
+    # pricing the same stock again costs; the loops go from the dicts every time
+    print('%10s %12s %12s %12s %14s' % ('items', 'columns s', 'price s', 'dict loop s', 'nested loop s'))
+    for size in sizes:
+        stock_lists, catalog = make(size)
+        columns, (stock, prices) = timed(lambda: (pricing.StockColumns.from_lists(stock_lists),
+                                                  pricing.PriceTable.from_products(catalog)))
+        priced, per_household = timed(lambda: pricing.restock(stock, prices).per_household())
+        loop, expected = timed(naive_dict, stock_lists, catalog)
+        assert {k: (v['units'], round(v['cost'] * 100)) for k, v in per_household.items()} == expected
+        # the nested loop only on a slice of the households, scaled up
+        sample = dict(list(stock_lists.items())[:max(len(stock_lists) // 100, 1)])
+        nested, _ = timed(naive, sample, catalog)
+        scale = size / sum(len(items) for items in sample.values())
+        print('%10d %12.3f %12.3f %12.3f %14.1f' % (size, columns, priced, loop, nested * scale))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 500000])
@@ -0,0 +1,49 @@
+import sys
+import time
+
+from saim import Client
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.scans import BarcodeIndex, ScanIngestor
+from saim.standin import StandinServer
+
+
+def run(base_url, households, rate, seconds, max_batch, max_delay):
+    # scans at `rate` per second for `seconds`, spread over the households and their two items
+    index = BarcodeIndex({str(n): item['id'] for n, item in enumerate(SEED_STOCK)})
+    with Client('key', base_url, 'pooled') as client:
+        with ScanIngestor(client, index, max_batch, max_delay, max_workers=8) as ingestor:
+            start = time.monotonic()
+            total = int(rate * seconds)
+            for n in range(total):
+                due = start + n / rate
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                ingestor.submit({'household_id': households[n % len(households)], 'barcode': str(n % 2)})
+            ingestor.flush()
+            elapsed = time.monotonic() - start
+            return ingestor.stats(), total / elapsed
+
+
+def main(rate, seconds=3.0):
+    with StandinServer() as server:
+        with Client('key', server.base_url) as client:
+            households = []
+            for _ in range(20):
+                household_id = client.post_household(SEED_HOUSEHOLD).json()['id']
+                client.post_stock(household_id, SEED_STOCK)
+                households.append(household_id)
+
+        print('%-22s %10s %10s %12s %10s %10s' % ('batching', 'scans/s', 'calls', 'scans/call', 'p50 ms',
+                                                 'p99 ms'))
+        for name, max_batch, max_delay in (('none (batch of 1)', 1, 0.0), ('500 or 10 ms', 500, 0.01),
+                                           ('500 or 50 ms', 500, 0.05)):
+            stats, achieved = run(server.base_url, households, rate, seconds, max_batch, max_delay)
+            latency = stats['latency']
+            print('%-22s %10.0f %10d %12.1f %10.2f %10.2f' % (name, achieved, stats['transactions'],
+                                                              stats['scans_per_transaction'],
+                                                              latency['p50'] * 1000, latency['p99'] * 1000))
+
+
+if __name__ == '__main__':
+    main(*[float(arg) for arg in sys.argv[1:]] or [3000])
@@ -0,0 +1,60 @@
+import random
+import sys
+import time
+
+from saim.search import ProductIndex
+
+# a made-up vocabulary in the spirit of the /products payloads in tests/unittests_plus.py
+WORDS = ('gillette proglide manual razor blade refills men count sensitive skin precision trimmer comfort shave '
+         'thinner finer blades glide effortlessly hair tug pull soap shampoo conditioner towel paper tissue coffee '
+         'filter detergent laundry dish sponge battery charger bulb toothpaste brush floss lotion sunscreen').split()
+
+
+def make_catalog(size, seed=0):
+    rng = random.Random(seed)
+    products = []
+    for n in range(size):
+        # a few unique-ish words per product so the vocabulary grows with the catalog like real titles do
+        extra = ['sku%x' % rng.randrange(size * 4), 'model%d' % rng.randrange(size)]
+        products.append({'id': str(1000000000 + n),
+                         'title': ' '.join(rng.sample(WORDS, 6) + extra[:1]),
+                         'description': ' '.join(rng.choices(WORDS, k=25) + extra),
+                         'price': round(rng.uniform(1, 100), 2)})
+    return products
+
+
+def linear_search(products, query):
+    # what callers did before the index: scan every product dict
+    terms = query.casefold().split()
+    return [p for p in products
+            if all(t in (p['title'] + ' ' + p['description']).casefold() for t in terms)]
+
+
+def timed(fn, *args, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(*args)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main(sizes):
+    queries = ['proglide razor', 'razor bla', 'coffee filter', 'sensitive skin trim', 'sku1f']
+    print('%10s %10s %12s %12s %12s' % ('products', 'build s', 'query ms', 'prefix ms', 'linear ms'))
+    for size in sizes:
+        products = make_catalog(size)
+        build, index = timed(ProductIndex, products)
+
+        query = sum(timed(index.search, q, 10, False, repeat=5)[0] for q in queries) / len(queries)
+        prefix = sum(timed(index.search, q, 10, True, repeat=5)[0] for q in queries) / len(queries)
+        linear, _ = timed(linear_search, products, queries[0])
+
+        # incremental updates, a sample of changed products re-indexed one at a time
+        changed = [dict(p, title=p['title'] + ' updated') for p in products[:1000]]
+        update, _ = timed(lambda: [index.update(p) for p in changed])
+
+        print('%10d %10.2f %12.3f %12.3f %12.1f   (%.1f us/update)'
+              % (size, build, query * 1000, prefix * 1000, linear * 1000, update / len(changed) * 1e6))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
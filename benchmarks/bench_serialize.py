@@ -0,0 +1,38 @@
+import json
+import sys
+import time
+import tracemalloc
+
+from saim.fixtures import SEED_STOCK
+from saim.serialize import JsonArrayWriter
+
+
+def measure(fn):
+    # (seconds, peak bytes allocated while building the body); timed without tracemalloc, which slows everything down
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(sizes):
+    writer = JsonArrayWriter()
+    print('%-10s %-18s %10s %12s' % ('items', 'body', 'ms', 'peak MiB'))
+    for size in sizes:
+        items = [dict(SEED_STOCK[n % len(SEED_STOCK)], id=str(n)) for n in range(size)]
+        # once so the reused buffer has its size, as it would after the first post
+        writer.dump(items)
+        cases = [('json.dumps', lambda: json.dumps(items).encode()),
+                 ('dump (reused)', lambda: writer.dump(items)),
+                 ('chunks 64k', lambda: sum(len(chunk) for chunk in writer.chunks(items)))]
+        for name, fn in cases:
+            elapsed, peak = measure(fn)
+            print('%-10d %-18s %10.1f %12.2f' % (size, name, elapsed * 1e3, peak / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 100000])
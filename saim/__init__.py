@@ -0,0 +1,21 @@
+# the public names are imported lazily so that `import saim` (and with it the saim command line) stays cheap until a
+# client is actually needed
+_exports = {
+    'BASE_URL': 'saim.client',
+    'Client': 'saim.client',
+    'ApiError': 'saim.errors',
+    'NotSentError': 'saim.errors',
+    'SaimError': 'saim.errors',
+    'TransportError': 'saim.errors'
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError("module 'saim' has no attribute '%s'" % name)
+    import importlib
+    value = getattr(importlib.import_module(_exports[name]), name)
+    globals()[name] = value
+    return value
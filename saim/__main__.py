@@ -0,0 +1,5 @@
+import sys
+
+from saim.cli import main
+
+sys.exit(main())
@@ -0,0 +1,158 @@
+import datetime
+
+from saim.client import STOCK, TRANSACTIONS
+from saim.validation import TRANSACTION_TYPES
+
+# optional: pip install saim-python-sdk[analytics]
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# consumption forecasting over many stock items at once:
+#
+#   series = TransactionSeries.from_histories(keys, histories)
+#   forecast = forecast(series, on_hand, minimum, window=14)
+#   forecast['days_left']                              # days until each item drops below its min
+#
+# the histories are flattened once into columns (item index, time in days, signed quantity); everything after that
+# is numpy over the columns, so re-scoring is a few passes over flat arrays instead of a python loop per item
+
+DAY = 86400.0
+
+
+def available():
+    return np is not None
+
+
+def _require():
+    if np is None:
+        raise ImportError('saim.analytics needs numpy')
+
+
+def _days(dates):
+    # '2021-04-02T19:11:38.412000Z' -> days since the epoch; numpy parses iso dates but warns about the 'Z'
+    stamps = np.array([d[:-1] if d.endswith('Z') else d for d in dates], dtype='datetime64[us]')
+    return stamps.astype('int64') / (DAY * 1e6)
+
+
+def now_days():
+    return datetime.datetime.now(datetime.timezone.utc).timestamp() / DAY
+
+
+class TransactionSeries:
+    # columns of all transactions of all items, sorted by item then time: item[i] is the index into keys
+    def __init__(self, keys, item, time, quantity):
+        _require()
+        self.keys = list(keys)
+        order = np.lexsort((time, item))
+        self.item = np.asarray(item, dtype=np.int64)[order]
+        self.time = np.asarray(time, dtype=np.float64)[order]
+        self.quantity = np.asarray(quantity, dtype=np.float64)[order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_histories(cls, keys, histories):
+        # histories[n] is the transaction list of keys[n], as returned by GET .../transactions
+        _require()
+        lengths = [len(history) for history in histories]
+        flat = [transaction for history in histories for transaction in history]
+        item = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+        time = _days([transaction['date'] for transaction in flat])
+        quantity = np.array([TRANSACTION_TYPES.get(t['type'], 0) * t.get('quantity', 0) for t in flat],
+                            dtype=np.float64)
+        return cls(keys, item, time, quantity)
+
+    def consumption(self, now, window):
+        # units removed per item during the last `window` days before `now`
+        mask = (self.quantity < 0) & (self.time > now - window) & (self.time <= now)
+        return np.bincount(self.item[mask], weights=-self.quantity[mask], minlength=len(self.keys))
+
+    def daily(self, now, days):
+        # (items, days) matrix of units removed per day, the last column being the day that ends at `now`
+        mask = (self.quantity < 0) & (self.time > now - days) & (self.time <= now)
+        day = np.minimum((self.time[mask] - (now - days)).astype(np.int64), days - 1)
+        cells = np.bincount(self.item[mask] * days + day, weights=-self.quantity[mask],
+                            minlength=len(self.keys) * days)
+        return cells.reshape(len(self.keys), days)
+
+
+def rates(series, now, window=14, halflife=None):
+    # average units consumed per day over the window; with a halflife (days) recent removals weigh more
+    _require()
+    if halflife is None:
+        return series.consumption(now, window) / window
+    mask = (series.quantity < 0) & (series.time > now - window) & (series.time <= now)
+    age = now - series.time[mask]
+    weights = 0.5 ** (age / halflife)
+    weighted = np.bincount(series.item[mask], weights=-series.quantity[mask] * weights, minlength=len(series))
+    # normalise by the weighted length of the window, so a constant daily rate comes out unchanged
+    span = halflife / np.log(2) * (1 - 0.5 ** (window / halflife))
+    return weighted / span
+
+
+def rolling_rates(series, now, days, window=7):
+    # (items, days) matrix: the `window`-day trailing average consumption at the end of each of the last days
+    _require()
+    daily = series.daily(now, days + window - 1)
+    totals = np.cumsum(daily, axis=1)
+    totals = np.concatenate([np.zeros((len(series), 1)), totals], axis=1)
+    return (totals[:, window:] - totals[:, :-window]) / window
+
+
+def days_until_below_min(on_hand, minimum, rate):
+    # days until on_hand drops under min at the given rate: 0 if it already has, inf if nothing is being consumed
+    _require()
+    on_hand = np.asarray(on_hand, dtype=np.float64)
+    minimum = np.asarray(minimum, dtype=np.float64)
+    rate = np.asarray(rate, dtype=np.float64)
+    headroom = on_hand - minimum
+    days = np.full(headroom.shape, np.inf)
+    np.divide(headroom, rate, out=days, where=rate > 0)
+    days[headroom < 0] = 0.0
+    return days
+
+
+def forecast(series, on_hand, minimum, now=None, window=14, halflife=None):
+    # on_hand and minimum line up with series.keys
+    now = now_days() if now is None else now
+    rate = rates(series, now, window, halflife)
+    return {'rate': rate, 'days_left': days_until_below_min(on_hand, minimum, rate)}
+
+
+def at_risk(series, days_left, horizon):
+    # (key, days) of the items expected below min within `horizon` days, soonest first
+    _require()
+    index = np.flatnonzero(days_left <= horizon)
+    index = index[np.argsort(days_left[index], kind='stable')]
+    return [(series.keys[i], float(days_left[i])) for i in index]
+
+
+def collect(client, household_ids, list_id='main', max_workers=8):
+    # fetches stock and histories for the households; returns (series, on_hand, minimum)
+    _require()
+
+    def fetch_stock(household_id):
+        return client.request_json('GET', STOCK, {'household_id': household_id, 'list_id': list_id})
+
+    items = []
+    for household_id, stock, error in client.map(fetch_stock, household_ids, max_workers):
+        if error is not None:
+            raise error
+        items.extend(((household_id, list_id, item['id']), item) for item in stock)
+
+    def fetch_history(key):
+        return client.request_json('GET', TRANSACTIONS, dict(zip(('household_id', 'list_id', 'stock_id'), key)))
+
+    histories = []
+    for key, history, error in client.map(fetch_history, [key for key, _ in items], max_workers):
+        if error is not None:
+            raise error
+        histories.append(history)
+
+    series = TransactionSeries.from_histories([key for key, _ in items], histories)
+    on_hand = np.array([item.get('on_hand', 0) for _, item in items], dtype=np.float64)
+    minimum = np.array([item.get('min', 0) for _, item in items], dtype=np.float64)
+    return series, on_hand, minimum
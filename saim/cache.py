@@ -0,0 +1,186 @@
+import collections
+import hashlib
+import threading
+import time
+import urllib.parse
+
+from saim.client import HOUSEHOLD, STOCK, STOCK_ITEM, TRANSACTIONS, parse_path
+from saim.transport import Response
+
+# a client-side cache of single entities (GET /households/{id} and GET .../stock/{stock_id}):
+#
+#   client = Client(api_key, cache=4 * 1024 * 1024)     # or cache=EntityCache(...) to share one between clients
+#   client.cache.stats()                                 # hits, misses, hit_ratio, bytes, entries, evictions, ...
+#
+# it is bounded by the estimated bytes of what it holds, evicting least recently used entries first. writes through
+# the same client drop what they make stale before they are sent: PUT of a household, PUT/DELETE of a stock item, a
+# transaction POST (on_hand moves) and a stock POST (any item of the list may have been replaced). changes made by
+# anyone else are only picked up once an entry expires (ttl) or is evicted
+#
+# entries are kept apart per api (scheme, host and base path) and per api key, so clients sharing a cache never get
+# each other's answers; a write through any of them drops the entity for all of them
+
+CACHED = (HOUSEHOLD, STOCK_ITEM)
+
+# per entry on top of the payload: the key, the headers and the bookkeeping
+ENTRY_OVERHEAD = 256
+
+
+def _key(template, params, scope=None):
+    # the entity (template, household_id, list_id, stock_id), and the scope it was read in
+    return template, params.get('household_id'), params.get('list_id'), params.get('stock_id'), scope
+
+
+class EntityCache:
+    def __init__(self, max_bytes=4 * 1024 * 1024, ttl=None, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = collections.OrderedDict()
+        self._lists = collections.defaultdict(set)
+        self._scoped = collections.defaultdict(set)
+        self._versions = collections.Counter()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def size(payload, headers):
+        return len(payload) + sum(len(k) + len(v) for k, v in headers.items()) + ENTRY_OVERHEAD
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and self.clock() - entry[3] > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def _version(self, key):
+        return self._versions[key[:4]], self._versions[('list',) + key[1:3]]
+
+    def version(self, key):
+        with self._lock:
+            return self._version(key)
+
+    def put(self, key, status, payload, headers, version=None):
+        # version is what version(key) returned before the request went out: if the entry was invalidated while the
+        # request was in flight, the response may predate the write and isn't stored
+        size = self.size(payload, headers)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version is not None and self._version(key) != version:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (status, payload, headers, self.clock(), size)
+            self._lists[key[1:3]].add(key)
+            self._scoped[key[:4]].add(key)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry[4]
+        for index, group_key in ((self._lists, key[1:3]), (self._scoped, key[:4])):
+            group = index.get(group_key)
+            if group is not None:
+                group.discard(key)
+                if not group:
+                    del index[group_key]
+
+    def invalidate(self, key):
+        # the entity in every scope
+        with self._lock:
+            self._versions[key[:4]] += 1
+            for scoped in list(self._scoped.get(key[:4], ())):
+                self._drop(scoped)
+                self.invalidations += 1
+
+    def invalidate_list(self, household_id, list_id):
+        # every cached item of one stock list
+        with self._lock:
+            self._versions[('list', household_id, list_id)] += 1
+            for key in list(self._lists.get((household_id, list_id), ())):
+                self._drop(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._lists.clear()
+            self._scoped.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'bytes': self.bytes, 'max_bytes': self.max_bytes, 'entries': len(self._entries),
+                'evictions': self.evictions, 'invalidations': self.invalidations}
+
+
+class CachingTransport:
+    # wraps another transport; plain GETs of CACHED endpoints are answered from the cache, writes invalidate
+    def __init__(self, transport, cache):
+        self.transport = transport
+        self.cache = cache
+        self._scopes = {}
+
+    def _scope(self, request, template, params):
+        # (scheme://host/base path, digest of the api key); the base path is the url's path up to the endpoint
+        parts = urllib.parse.urlsplit(request.url)
+        base = parts.scheme + '://' + parts.netloc + parts.path.rstrip('/')[:-len(template.format(**params))]
+        api_key = request.headers.get('api_key', '')
+        scope = self._scopes.get((base, api_key))
+        if scope is None:
+            scope = self._scopes[(base, api_key)] = (base, hashlib.sha256(api_key.encode()).hexdigest()[:16])
+        return scope
+
+    def send(self, request, timeout=None):
+        template, params = parse_path(request.url)
+        if request.method == 'GET':
+            if template not in CACHED or set(request.headers) - {'api_key'}:
+                # conditional and other special requests go to the server as they are
+                return self.transport.send(request, timeout)
+            key = _key(template, params, self._scope(request, template, params))
+            entry = self.cache.get(key)
+            if entry is not None:
+                return Response(entry[0], entry[1], dict(entry[2]))
+            version = self.cache.version(key)
+            resp = self.transport.send(request, timeout)
+            if resp.status == 200:
+                self.cache.put(key, resp.status, resp.payload, resp.headers, version)
+            return resp
+
+        self._invalidate(request.method, template, params)
+        resp = self.transport.send(request, timeout)
+        # once more for a GET that went out while the write was in flight and came back with the old state
+        self._invalidate(request.method, template, params)
+        return resp
+
+    def _invalidate(self, method, template, params):
+        if template == HOUSEHOLD and method in ('PUT', 'DELETE'):
+            self.cache.invalidate(_key(HOUSEHOLD, params))
+        elif template == STOCK_ITEM and method in ('PUT', 'DELETE'):
+            self.cache.invalidate(_key(STOCK_ITEM, params))
+        elif template == TRANSACTIONS and method == 'POST':
+            self.cache.invalidate(_key(STOCK_ITEM, params))
+        elif template == STOCK and method in ('POST', 'PUT', 'DELETE'):
+            self.cache.invalidate_list(params.get('household_id'), params.get('list_id'))
+
+    def close(self):
+        self.transport.close()
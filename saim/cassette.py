@@ -0,0 +1,197 @@
+import atexit
+import email.message
+import http.client
+import io
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import urllib.response
+
+from saim.client import template_for
+from saim.errors import SaimError, TransportError
+from saim.transport import Request, Response, UrllibTransport
+
+
+class CassetteError(SaimError):
+    pass
+
+
+def _text(data):
+    if data is None or hasattr(data, '__next__'):
+        # a streamed body is gone once it was sent
+        return None
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return bytes(data).decode('utf-8', 'surrogateescape')
+    return data
+
+
+def _canonical_body(body):
+    # request bodies are matched on their json value, so key order or whitespace differences don't matter
+    body = _text(body)
+    if not body:
+        return None
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(',', ':'))
+    except ValueError:
+        return body
+
+
+def match_key(method, url, body):
+    parts = urllib.parse.urlsplit(url)
+    return method.upper(), parts.path + ('?' + parts.query if parts.query else ''), _canonical_body(body)
+
+
+class Cassette:
+    # a json file holding the recorded interactions in the order they happened:
+    # [{'method', 'url', 'template', 'body', 'status', 'headers', 'payload', 'elapsed'}, ...]
+    def __init__(self, path=None, interactions=None):
+        self.path = path
+        self.interactions = list(interactions or [])
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(path, json.load(f)['interactions'])
+
+    def save(self, path=None):
+        path = path or self.path
+        tmp = path + '.tmp'
+        with self._lock:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'interactions': self.interactions}, f, indent=1)
+            os.replace(tmp, path)
+
+    def append(self, request, response):
+        interaction = {
+            'method': request.method,
+            'url': request.url,
+            'template': request.template or template_for(request.url),
+            'body': _text(request.body),
+            'status': response.status,
+            'headers': response.headers,
+            'payload': _text(response.payload),
+            'elapsed': round(response.elapsed, 6)
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+        return interaction
+
+
+class RecordingTransport:
+    # passes every request through to the real transport and writes the pair to the cassette
+    def __init__(self, cassette, transport=None):
+        self.cassette = cassette
+        self.transport = transport if transport is not None else UrllibTransport()
+
+    def send(self, request, timeout=None):
+        response = self.transport.send(request, timeout=timeout)
+        self.cassette.append(request, response)
+        return response
+
+    def close(self):
+        self.transport.close()
+        if self.cassette.path:
+            self.cassette.save()
+
+
+class ReplayTransport:
+    # answers requests from a cassette without touching the network
+    #
+    # requests are matched on method, path and json body; identical requests (e.g. GETting the same stock item before
+    # and after a PUT) get their recorded responses back in recording order, the last one repeating once used up.
+    # latency scales the recorded timings: 0 replays instantly, 1.0 sleeps for the original round trip
+    def __init__(self, cassette, latency=0.0):
+        self.cassette = cassette
+        self.latency = latency
+        self._lock = threading.Lock()
+        self.rewind()
+
+    def rewind(self):
+        self._queues = {}
+        for interaction in self.cassette.interactions:
+            key = match_key(interaction['method'], interaction['url'], interaction['body'])
+            self._queues.setdefault(key, []).append(interaction)
+        self._positions = dict.fromkeys(self._queues, 0)
+
+    def lookup(self, method, url, body=None):
+        key = match_key(method, url, body)
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                raise CassetteError('no recorded interaction for %s %s' % key[:2])
+            position = self._positions[key]
+            self._positions[key] = min(position + 1, len(queue) - 1)
+        return queue[position]
+
+    def send(self, request, timeout=None):
+        interaction = self.lookup(request.method, request.url, request.body)
+        elapsed = interaction['elapsed'] * self.latency
+        if elapsed > 0:
+            time.sleep(elapsed)
+        payload = interaction['payload']
+        return Response(interaction['status'],
+                        payload.encode('utf-8', 'surrogateescape') if payload is not None else b'',
+                        dict(interaction['headers']),
+                        elapsed)
+
+    def close(self):
+        pass
+
+
+class CassetteHandler(urllib.request.BaseHandler):
+    # lets code that calls urllib.request.urlopen directly (like the unittests) go through a saim transport;
+    # non-2xx responses still come back as HTTPError through urllib's normal error processing
+    handler_order = 100
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def _open(self, req):
+        request = Request(req.get_method(), req.full_url, template_for(req.full_url), req.data,
+                          dict(req.header_items()))
+        try:
+            response = self.transport.send(request, timeout=req.timeout)
+        except TransportError as e:
+            raise urllib.error.URLError(str(e)) from e
+        headers = email.message.Message()
+        for name, value in response.headers.items():
+            headers[name] = value
+        resp = urllib.response.addinfourl(io.BytesIO(response.payload), headers, req.full_url, response.status)
+        resp.msg = http.client.responses.get(response.status, '')
+        return resp
+
+    http_open = _open
+    https_open = _open
+
+
+def install(path, mode='auto', latency=0.0):
+    # routes every urllib.request.urlopen call in this process through a cassette
+    #
+    # mode 'record' always hits the network and (re)writes the cassette, 'replay' never does, and 'auto' replays when
+    # the cassette file exists and records it otherwise
+    if mode == 'auto':
+        mode = 'replay' if os.path.exists(path) else 'record'
+    if mode == 'record':
+        transport = RecordingTransport(Cassette(path))
+        atexit.register(transport.close)
+    elif mode == 'replay':
+        transport = ReplayTransport(Cassette.load(path), latency)
+    else:
+        raise ValueError('unknown cassette mode: ' + mode)
+
+    urllib.request.install_opener(urllib.request.build_opener(CassetteHandler(transport)))
+    return transport
+
+
+def install_from_env():
+    # SAIM_CASSETTE=path [SAIM_CASSETTE_MODE=auto|record|replay] [SAIM_REPLAY_LATENCY=0|1.0]
+    path = os.environ.get('SAIM_CASSETTE')
+    if not path:
+        return None
+    return install(path, os.environ.get('SAIM_CASSETTE_MODE', 'auto'),
+                   float(os.environ.get('SAIM_REPLAY_LATENCY', '0')))
@@ -0,0 +1,443 @@
+import argparse
+import json
+import os
+import sys
+
+# only argparse/json/os/sys are imported up front; the client (and urllib, ssl, http with it) and anything heavier are
+# imported inside the commands that need them, so `saim --help` doesn't pay for them
+
+
+def _client(args):
+    from saim.client import Client
+    tracer = None
+    if args.trace:
+        from saim.tracing import FileExporter, Tracer
+        tracer = Tracer(FileExporter(args.trace), args.trace_sample)
+    limiter = None
+    if args.adaptive:
+        from saim.limiter import AdaptiveLimiter
+        limiter = AdaptiveLimiter(initial=min(8, args.workers), max_limit=args.workers)
+    client = Client(args.api_key, args.base_url, args.transport, timeout=args.timeout,
+                    metrics=bool(args.metrics_port), tracer=tracer, limiter=limiter)
+    if args.metrics_port:
+        from saim.metrics import MetricsServer
+        MetricsServer(client.metrics, port=args.metrics_port).start()
+    return client
+
+
+def _load_json(value):
+    # literal json, @file, or - for stdin
+    if value == '-':
+        return json.load(sys.stdin)
+    if value.startswith('@'):
+        with open(value[1:], encoding='utf-8') as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def _ids(values):
+    # ids on the command line, or - to read one per line from stdin
+    for value in values:
+        if value == '-':
+            for line in sys.stdin:
+                line = line.strip()
+                if line:
+                    yield line
+        else:
+            yield value
+
+
+def _raw(resp):
+    # the body of a response that isn't json (an html page from a proxy, an empty 502)
+    return resp.payload.decode('utf-8', 'replace')
+
+
+def _print(resp):
+    try:
+        data = resp.json()
+    except ValueError:
+        pass
+    else:
+        if data is not None or resp.ok:
+            json.dump(data, sys.stdout if resp.ok else sys.stderr, indent=2)
+            print(file=sys.stdout if resp.ok else sys.stderr)
+            return 0 if resp.ok else 1
+    print('HTTP %d: %s' % (resp.status, _raw(resp) or '(no body)'), file=sys.stderr)
+    return 1
+
+
+def _bulk(args, call, items):
+    # one ndjson line per item as results come in; the exit code says whether everything succeeded
+    failed = 0
+    with _client(args) as client:
+        results = client.map(lambda item: call(client, item), items, args.workers, ordered=not args.unordered)
+        for item, resp, error in results:
+            if error is not None:
+                record = {'input': item, 'error': str(error)}
+                failed += 1
+            else:
+                try:
+                    record = {'input': item, 'status': resp.status, 'body': resp.json()}
+                    failed += not resp.ok
+                except ValueError:
+                    record = {'input': item, 'status': resp.status, 'raw': _raw(resp)}
+                    failed += 1
+            sys.stdout.write(json.dumps(record) + '\n')
+    return 1 if failed else 0
+
+
+#
+# households
+#
+def households_get(args):
+    with _client(args) as client:
+        return _print(client.get_household(args.household_id))
+
+
+def households_create(args):
+    with _client(args) as client:
+        return _print(client.post_household(_load_json(args.json)))
+
+
+def households_update(args):
+    with _client(args) as client:
+        return _print(client.put_household(args.household_id, _load_json(args.json)))
+
+
+def households_lists(args):
+    with _client(args) as client:
+        return _print(client.get_lists(args.household_id))
+
+
+def households_get_many(args):
+    return _bulk(args, lambda client, household_id: client.get_household(household_id), _ids(args.household_ids))
+
+
+def households_snapshot(args):
+    from saim.snapshot import snapshot
+    with _client(args) as client:
+        snap = snapshot(client, args.household_id, not args.no_transactions, args.workers)
+    data = snap.to_dict()
+    if not args.timings:
+        del data['calls']
+    json.dump(data, sys.stdout, indent=2)
+    print()
+    for call in snap.errors:
+        print('%s %s: %s' % (call.name, call.params, call.error), file=sys.stderr)
+    return 1 if snap.errors else 0
+
+
+#
+# stock
+#
+def stock_list(args):
+    with _client(args) as client:
+        return _print(client.get_stock(args.household_id, args.list_id))
+
+
+def stock_add(args):
+    with _client(args) as client:
+        return _print(client.post_stock(args.household_id, _load_json(args.json), args.list_id))
+
+
+def stock_get(args):
+    with _client(args) as client:
+        return _print(client.get_stock_item(args.household_id, args.stock_id, args.list_id))
+
+
+def stock_update(args):
+    with _client(args) as client:
+        return _print(client.put_stock_item(args.household_id, args.stock_id, _load_json(args.json), args.list_id))
+
+
+def stock_delete(args):
+    with _client(args) as client:
+        return _print(client.delete_stock_item(args.household_id, args.stock_id, args.list_id))
+
+
+def stock_get_many(args):
+    return _bulk(args, lambda client, stock_id: client.get_stock_item(args.household_id, stock_id, args.list_id),
+                 _ids(args.stock_ids))
+
+
+def stock_delete_many(args):
+    return _bulk(args, lambda client, stock_id: client.delete_stock_item(args.household_id, stock_id, args.list_id),
+                 _ids(args.stock_ids))
+
+
+#
+# transactions
+#
+def transactions_list(args):
+    with _client(args) as client:
+        return _print(client.get_transactions(args.household_id, args.stock_id, args.list_id))
+
+
+def transactions_add(args):
+    with _client(args) as client:
+        return _print(client.post_transaction(args.household_id, args.stock_id,
+                                              {'type': args.type, 'quantity': args.quantity}, args.list_id))
+
+
+def transactions_list_many(args):
+    return _bulk(args, lambda client, stock_id: client.get_transactions(args.household_id, stock_id, args.list_id),
+                 _ids(args.stock_ids))
+
+
+#
+# products
+#
+def products_list(args):
+    with _client(args) as client:
+        return _print(client.get_products())
+
+
+def products_get(args):
+    with _client(args) as client:
+        return _print(client.get_product(args.product_id))
+
+
+def products_get_many(args):
+    return _bulk(args, lambda client, product_id: client.get_product(product_id), _ids(args.product_ids))
+
+
+def products_search(args):
+    from saim.search import ProductIndex
+    with _client(args) as client:
+        index = ProductIndex.from_client(client)
+    for product, score in index.search(args.query, limit=args.limit):
+        print('%s\t%.3f\t%s' % (product['id'], score, product.get('title', '')))
+    return 0
+
+
+#
+# export
+#
+def export(args):
+    from saim.export import export
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output != '-' else sys.stdout
+    try:
+        with _client(args) as client:
+            counts = export(client, _ids(args.household_ids), out, args.format, max_workers=args.workers,
+                            max_households=args.households, transactions=not args.no_transactions)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(counts), file=sys.stderr)
+    return 1 if counts.get('error') else 0
+
+
+def warmup(args):
+    from saim.warmup import measure
+    report = measure(args.api_key, args.base_url, args.transport, args.connections, args.requests)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+def reconcile(args):
+    import asyncio
+    from saim.counts import CountReconciler, read_counts
+
+    async def run(reconciler):
+        async for result in reconciler.run(read_counts(args.file, args.format)):
+            sys.stdout.write(json.dumps(result) + '\n')
+
+    with _client(args) as client:
+        reconciler = CountReconciler(client, args.list_id, args.household, args.workers, args.post_workers,
+                                     args.batch_size)
+        asyncio.run(run(reconciler))
+    print(json.dumps(reconciler.counts), file=sys.stderr)
+    if args.stats:
+        for stats in reconciler.stats.values():
+            print(json.dumps(stats.to_dict()), file=sys.stderr)
+    counts = reconciler.counts
+    return 1 if counts.get('failed') or counts.get('unknown') or counts.get('invalid') else 0
+
+
+def scans(args):
+    import time
+    from saim.scans import BarcodeIndex, ScanIngestor, ScanServer
+    with _client(args) as client:
+        index = BarcodeIndex.load(client)
+        with ScanIngestor(client, index, args.max_batch, args.max_delay, args.workers) as ingestor:
+            with ScanServer(ingestor, args.host, args.port) as server:
+                print('listening for scans on %s:%d, %d barcodes' % (server.address + (len(index),)), file=sys.stderr)
+                try:
+                    while True:
+                        time.sleep(args.interval)
+                        print(json.dumps(ingestor.stats()), file=sys.stderr)
+                except KeyboardInterrupt:
+                    pass
+        print(json.dumps(ingestor.stats()), file=sys.stderr)
+    return 0
+
+
+#
+# import
+#
+def _importer(args, client):
+    from saim.importer import Importer
+    results = args.results or args.file + '.results.ndjson'
+    return Importer(client, results, args.workers, args.retry_failed, args.retry_unknown)
+
+
+def import_households(args):
+    from saim.importer import read_rows
+    with _client(args) as client:
+        counts = _importer(args, client).import_households(read_rows(args.file, args.format))
+    print(json.dumps(counts), file=sys.stderr)
+    return 1 if counts.get('failed') or counts.get('unknown') else 0
+
+
+def import_stock(args):
+    from saim.importer import load_keys, read_rows
+    keys = load_keys(args.household_keys) if args.household_keys else None
+    with _client(args) as client:
+        counts = _importer(args, client).import_stock(read_rows(args.file, args.format), keys, args.batch_size)
+    print(json.dumps(counts), file=sys.stderr)
+    return 1 if counts.get('failed') or counts.get('unknown') else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='saim', description='Command line access to the SAIM API.')
+    parser.add_argument('--api-key', default=os.environ.get('SAIM_API_KEY', ''),
+                        help='API key (default: $SAIM_API_KEY)')
+    parser.add_argument('--base-url', default=os.environ.get('SAIM_BASE_URL', 'https://apisb.shop.com/saim/v1'),
+                        help='API base url (default: $SAIM_BASE_URL or the sandbox)')
+    parser.add_argument('--timeout', type=float, default=30, help='per request timeout in seconds')
+    parser.add_argument('--transport', choices=['urllib', 'pooled', 'http2'], default='pooled',
+                        help='connection handling (default: pooled http/1.1 keep-alive)')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent requests for the *-many commands')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='adapt the requests in flight per endpoint to latency and 429s, up to --workers')
+    parser.add_argument('--metrics-port', type=int,
+                        help='serve prometheus metrics on 127.0.0.1:<port>/metrics while the command runs')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='append a span per call and http attempt to FILE (see python -m saim.tracing)')
+    parser.add_argument('--trace-sample', type=float, default=1.0, help='fraction of traces to record (default: 1)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='print *-many results as they complete instead of in input order')
+    groups = parser.add_subparsers(dest='group', metavar='<group>')
+    groups.required = True
+
+    def command(group, name, func, help, *arguments):
+        sub = group.add_parser(name, help=help)
+        for argument in arguments:
+            sub.add_argument(*argument[0], **argument[1])
+        sub.set_defaults(func=func)
+        return sub
+
+    household_id = (['household_id'], {})
+    stock_id = (['stock_id'], {})
+    list_id = (['--list', '-l'], {'dest': 'list_id', 'default': 'main', 'help': 'stock list id (default: main)'})
+    json_body = (['json'], {'help': 'json body, @file or - for stdin'})
+
+    households = groups.add_parser('households', help='households and their lists')
+    households = households.add_subparsers(metavar='<command>')
+    households.required = True
+    command(households, 'get', households_get, 'GET /households/{id}', household_id)
+    command(households, 'create', households_create, 'POST /households', json_body)
+    command(households, 'update', households_update, 'PUT /households/{id}', household_id, json_body)
+    command(households, 'lists', households_lists, 'GET /households/{id}/lists', household_id)
+    command(households, 'snapshot', households_snapshot, 'a household with its lists, stock and transactions',
+            household_id, (['--no-transactions'], {'action': 'store_true', 'help': 'skip transaction histories'}),
+            (['--timings'], {'action': 'store_true', 'help': 'include every call with its timing'}))
+    command(households, 'get-many', households_get_many, 'GET many households concurrently',
+            (['household_ids'], {'nargs': '+', 'help': 'ids, or - to read them from stdin'}))
+
+    stock = groups.add_parser('stock', help='stock lists and stock items')
+    stock = stock.add_subparsers(metavar='<command>')
+    stock.required = True
+    command(stock, 'list', stock_list, 'GET .../lists/{list}/stock', household_id, list_id)
+    command(stock, 'add', stock_add, 'POST .../lists/{list}/stock', household_id, json_body, list_id)
+    command(stock, 'get', stock_get, 'GET .../stock/{stock_id}', household_id, stock_id, list_id)
+    command(stock, 'update', stock_update, 'PUT .../stock/{stock_id}', household_id, stock_id, json_body, list_id)
+    command(stock, 'delete', stock_delete, 'DELETE .../stock/{stock_id}', household_id, stock_id, list_id)
+    command(stock, 'get-many', stock_get_many, 'GET many stock items concurrently', household_id,
+            (['stock_ids'], {'nargs': '+', 'help': 'ids, or - to read them from stdin'}), list_id)
+    command(stock, 'delete-many', stock_delete_many, 'DELETE many stock items concurrently', household_id,
+            (['stock_ids'], {'nargs': '+', 'help': 'ids, or - to read them from stdin'}), list_id)
+
+    transactions = groups.add_parser('transactions', help='stock item transactions')
+    transactions = transactions.add_subparsers(metavar='<command>')
+    transactions.required = True
+    command(transactions, 'list', transactions_list, 'GET .../stock/{stock_id}/transactions',
+            household_id, stock_id, list_id)
+    command(transactions, 'add', transactions_add, 'POST .../stock/{stock_id}/transactions',
+            household_id, stock_id, (['type'], {'help': 'transaction type, e.g. add'}),
+            (['quantity'], {'type': int}), list_id)
+    command(transactions, 'list-many', transactions_list_many, 'GET transactions of many stock items concurrently',
+            household_id, (['stock_ids'], {'nargs': '+', 'help': 'ids, or - to read them from stdin'}), list_id)
+
+    products = groups.add_parser('products', help='the product catalog')
+    products = products.add_subparsers(metavar='<command>')
+    products.required = True
+    command(products, 'list', products_list, 'GET /products')
+    command(products, 'get', products_get, 'GET /products/{id}', (['product_id'], {}))
+    command(products, 'get-many', products_get_many, 'GET many products concurrently',
+            (['product_ids'], {'nargs': '+', 'help': 'ids, or - to read them from stdin'}))
+    command(products, 'search', products_search, 'search titles and descriptions', (['query'], {}),
+            (['--limit'], {'type': int, 'default': 10}))
+
+    command(groups, 'export', export, 'stream households with their lists, stock and transactions to a file',
+            (['household_ids'], {'nargs': '+', 'help': 'ids, or - to read them from stdin'}),
+            (['--format', '-f'], {'choices': ['ndjson', 'csv'], 'default': 'ndjson'}),
+            (['--output', '-o'], {'default': '-', 'help': 'output file (default: stdout)'}),
+            (['--households'], {'type': int, 'default': 4, 'help': 'households fetched at the same time'}),
+            (['--no-transactions'], {'action': 'store_true', 'help': 'skip transaction histories'}))
+
+    command(groups, 'warmup', warmup, 'first-request latency of a cold and a warmed-up client',
+            (['--connections'], {'type': int, 'default': 4, 'help': 'connections to open ahead (default: 4)'}),
+            (['--requests'], {'type': int, 'default': 20, 'help': 'requests for the steady state latency'}))
+
+    command(groups, 'reconcile', reconcile, 'post add/remove transactions so on_hand matches a physical count file',
+            (['file'], {'help': 'csv/ndjson with household_id, stock_id and count per row'}),
+            (['--format', '-f'], {'choices': ['csv', 'ndjson'], 'help': 'default: from the file extension'}),
+            (['--household'], {'help': 'household id for rows without one'}), list_id,
+            (['--post-workers'], {'type': int, 'default': 8, 'help': 'concurrent transaction posts (default: 8)'}),
+            (['--batch-size'], {'type': int, 'default': 500, 'help': 'rows per stock list fetch (default: 500)'}),
+            (['--stats'], {'action': 'store_true', 'help': 'print per stage throughput to stderr'}))
+
+    command(groups, 'scans', scans, 'turn barcode scans (json lines over tcp) into transactions',
+            (['--host'], {'default': '127.0.0.1'}), (['--port'], {'type': int, 'default': 7070}),
+            (['--max-batch'], {'type': int, 'default': 500, 'help': 'scans per micro-batch (default: 500)'}),
+            (['--max-delay'], {'type': float, 'default': 0.05,
+                               'help': 'seconds a scan may wait for its batch to fill (default: 0.05)'}),
+            (['--interval'], {'type': float, 'default': 10, 'help': 'seconds between stats lines on stderr'}))
+
+    imports = groups.add_parser('import', help='resumable bulk imports from csv/ndjson files')
+    imports = imports.add_subparsers(metavar='<command>')
+    imports.required = True
+    import_options = [
+        (['file'], {}),
+        (['--format', '-f'], {'choices': ['csv', 'ndjson'], 'help': 'default: from the file extension'}),
+        (['--results', '-r'], {'help': 'per row results, also the checkpoint (default: <file>.results.ndjson)'}),
+        (['--retry-failed'], {'action': 'store_true', 'help': 'resubmit rows that failed in an earlier run'}),
+        (['--retry-unknown'], {'action': 'store_true',
+                               'help': 'resubmit rows whose outcome is unknown (may create duplicates)'})
+    ]
+    command(imports, 'households', import_households, 'POST /households for every row', *import_options)
+    command(imports, 'stock', import_stock, 'POST .../lists/{list}/stock for every row', *import_options,
+            (['--household-keys'], {'help': 'results file of a household import, to resolve household_key'}),
+            (['--batch-size'], {'type': int, 'default': 100, 'help': 'stock items per POST'}))
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        # SaimError and friends are only imported once a command ran, so match on the package rather than the class
+        if type(e).__module__.startswith('saim.'):
+            print('saim: error: %s' % e, file=sys.stderr)
+            return 2
+        raise
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import json
+import re
+import urllib.parse
+
+from saim.errors import ApiError
+from saim.transport import Request, make_transport
+
+BASE_URL = 'https://apisb.shop.com/saim/v1'
+
+# endpoint templates, named after the resources in the unittests
+HOUSEHOLDS = '/households'
+HOUSEHOLD = '/households/{household_id}'
+LISTS = '/households/{household_id}/lists'
+STOCK_LIST = '/households/{household_id}/lists/{list_id}'
+STOCK = '/households/{household_id}/lists/{list_id}/stock'
+STOCK_ITEM = '/households/{household_id}/lists/{list_id}/stock/{stock_id}'
+TRANSACTIONS = '/households/{household_id}/lists/{list_id}/stock/{stock_id}/transactions'
+PRODUCTS = '/products'
+PRODUCT = '/products/{product_id}'
+
+ENDPOINTS = (HOUSEHOLDS, HOUSEHOLD, LISTS, STOCK_LIST, STOCK, STOCK_ITEM, TRANSACTIONS, PRODUCTS, PRODUCT)
+_endpoint_res = [(re.compile(re.sub(r'\\{(\w+)\\}', r'(?P<\1>[^/]+)', re.escape(template)) + '$'), template)
+                 for template in sorted(ENDPOINTS, key=len, reverse=True)]
+
+
+def parse_path(url):
+    # maps a concrete url (or path) back to its endpoint template and the (still quoted) values of its placeholders,
+    # e.g. ('/households/{household_id}/lists', {'household_id': '1001'}); (path, {}) if it isn't a SAIM endpoint
+    path = urllib.parse.urlsplit(url).path.rstrip('/')
+    for endpoint_re, template in _endpoint_res:
+        match = endpoint_re.search(path)
+        if match:
+            return template, match.groupdict()
+    return path, {}
+
+
+def template_for(url):
+    # for traffic that didn't come through the client
+    return parse_path(url)[0]
+
+
+class Client:
+    # transport is a transport object or the name of one ('urllib', 'pooled', 'http2'; see make_transport).
+    # cache is an EntityCache or a size in bytes for one, caching single households and stock items (see saim.cache).
+    # contracts is the fraction of responses to check against saim.contracts, warning about violations.
+    # metrics is True or a saim.metrics.Registry to record requests, pool, cache and contract metrics into.
+    # tracer is a saim.tracing.Tracer, for a span per call and per http attempt.
+    # limiter is True or a saim.limiter.AdaptiveLimiter, holding the requests in flight per endpoint to a limit that
+    # adapts to latency and overload answers
+    def __init__(self, api_key, base_url=BASE_URL, transport='urllib', timeout=30, cache=None, contracts=None,
+                 metrics=None, tracer=None, limiter=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.transport = make_transport(transport) if isinstance(transport, str) else transport
+        self.timeout = timeout
+        self.tracer = tracer
+        if tracer is not None:
+            if hasattr(self.transport, 'tracer'):
+                # the pooled transport traces its attempts itself, retries included
+                self.transport.tracer = tracer
+            else:
+                from saim.tracing import TracingTransport
+                self.transport = TracingTransport(self.transport, tracer)
+        self.metrics = None
+        if metrics:
+            # innermost, so latencies are the server's and cache hits aren't counted as requests
+            from saim.metrics import MetricsTransport, Registry
+            self.metrics = metrics if isinstance(metrics, Registry) else Registry()
+            self.transport = MetricsTransport(self.transport, self.metrics)
+        self.limiter = None
+        if limiter:
+            # outside the metrics, so time spent waiting for a slot isn't taken for the server's latency
+            from saim.limiter import AdaptiveLimiter, LimitingTransport
+            self.limiter = limiter if isinstance(limiter, AdaptiveLimiter) else AdaptiveLimiter()
+            self.transport = LimitingTransport(self.transport, self.limiter)
+        if contracts:
+            from saim.contracts import ContractCheckingTransport
+            self.transport = ContractCheckingTransport(self.transport, contracts)
+        self.cache = None
+        if cache is not None:
+            from saim.cache import CachingTransport, EntityCache
+            self.cache = cache if isinstance(cache, EntityCache) else EntityCache(cache)
+            self.transport = CachingTransport(self.transport, self.cache)
+        if self.metrics is not None:
+            from saim.metrics import instrument
+            instrument(self, self.metrics)
+
+    def close(self):
+        self.transport.close()
+        if self.metrics is not None:
+            self.metrics.unregister(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def build_request(self, method, template, params=None, body=None, headers=None):
+        path = template.format(**{k: urllib.parse.quote(str(v), safe='') for k, v in (params or {}).items()})
+        headers = dict(headers or {}, api_key=self.api_key)
+        if body is not None:
+            # bytes-like bodies (see saim.serialize) and iterators of bytes (sent chunked) go out as they are
+            if not isinstance(body, (bytes, bytearray, memoryview)) and not hasattr(body, '__next__'):
+                body = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        return Request(method, self.base_url + path, template, body, headers)
+
+    def request(self, method, template, params=None, body=None, headers=None):
+        request = self.build_request(method, template, params, body, headers)
+        if self.tracer is None:
+            return self.transport.send(request, timeout=self.timeout)
+        with self.tracer.span(method + ' ' + template, params) as span:
+            resp = self.transport.send(request, timeout=self.timeout)
+            span.set('http.status_code', resp.status)
+            return resp
+
+    def request_json(self, method, template, params=None, body=None):
+        # like request() but returns the decoded payload and raises ApiError for anything that isn't a 2xx
+        resp = self.request(method, template, params, body)
+        if not resp.ok:
+            raise ApiError(resp.status, resp.error)
+        return resp.json()
+
+    def warm_up(self, connections=4):
+        # resolves the api host (into a dns cache the transport keeps using) and opens pooled connections before the
+        # first request needs them; only the pooled transport keeps connections, anything else is left as it is
+        transport = self.transport
+        while not hasattr(transport, 'warm') and hasattr(transport, 'transport'):
+            # through the caching and contract checking wrappers
+            transport = transport.transport
+        if not hasattr(transport, 'warm'):
+            return {'connections': 0, 'connect_seconds': [], 'dns_seconds': 0.0}
+        if transport.dns is None:
+            from saim.dnscache import DnsCache
+            transport.dns = DnsCache()
+        return transport.warm(self.base_url, connections, self.timeout)
+
+    def map(self, fn, items, max_workers=8, ordered=True):
+        # the concurrent path for bulk work: fn(item) runs on a bounded thread pool, yielding (item, result, error)
+        from saim.concurrency import bounded_map
+        return bounded_map(fn, items, max_workers, ordered)
+
+    #
+    # households
+    #
+    def post_household(self, household):
+        return self.request('POST', HOUSEHOLDS, body=household)
+
+    def get_household(self, household_id):
+        return self.request('GET', HOUSEHOLD, {'household_id': household_id})
+
+    def put_household(self, household_id, fields):
+        return self.request('PUT', HOUSEHOLD, {'household_id': household_id}, fields)
+
+    def get_lists(self, household_id):
+        return self.request('GET', LISTS, {'household_id': household_id})
+
+    #
+    # stock lists and stock
+    #
+    def get_stock_list(self, household_id, list_id='main'):
+        return self.request('GET', STOCK_LIST, {'household_id': household_id, 'list_id': list_id})
+
+    def get_stock(self, household_id, list_id='main'):
+        return self.request('GET', STOCK, {'household_id': household_id, 'list_id': list_id})
+
+    def post_stock(self, household_id, items, list_id='main', chunked=False):
+        # lists are encoded into a reused buffer, or streamed with chunked=True (see saim.serialize)
+        if isinstance(items, (list, tuple)):
+            from saim.serialize import writer
+            items = writer().chunks(items) if chunked else writer().dump(items)
+        return self.request('POST', STOCK, {'household_id': household_id, 'list_id': list_id}, items)
+
+    def get_stock_item(self, household_id, stock_id, list_id='main'):
+        return self.request('GET', STOCK_ITEM, {'household_id': household_id, 'list_id': list_id,
+                                                'stock_id': stock_id})
+
+    def put_stock_item(self, household_id, stock_id, fields, list_id='main'):
+        return self.request('PUT', STOCK_ITEM, {'household_id': household_id, 'list_id': list_id,
+                                                'stock_id': stock_id}, fields)
+
+    def delete_stock_item(self, household_id, stock_id, list_id='main'):
+        return self.request('DELETE', STOCK_ITEM, {'household_id': household_id, 'list_id': list_id,
+                                                   'stock_id': stock_id})
+
+    #
+    # transactions
+    #
+    def post_transaction(self, household_id, stock_id, transaction, list_id='main'):
+        return self.request('POST', TRANSACTIONS, {'household_id': household_id, 'list_id': list_id,
+                                                   'stock_id': stock_id}, transaction)
+
+    def get_transactions(self, household_id, stock_id, list_id='main'):
+        return self.request('GET', TRANSACTIONS, {'household_id': household_id, 'list_id': list_id,
+                                                  'stock_id': stock_id})
+
+    #
+    # products
+    #
+    def get_products(self):
+        return self.request('GET', PRODUCTS)
+
+    def get_product(self, product_id):
+        return self.request('GET', PRODUCT, {'product_id': product_id})
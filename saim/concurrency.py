@@ -0,0 +1,37 @@
+import collections
+import concurrent.futures
+
+from saim.tracing import propagate
+
+
+def bounded_map(fn, items, max_workers=8, ordered=True, window=None):
+    # calls fn(item) for every item on a thread pool and yields (item, result, error) with exactly one of result/error
+    # set. at most `window` calls are pending at a time (2 * max_workers by default), so items can be a lazy
+    # generator of any length without queueing everything up front. ordered=False yields in completion order. calls
+    # run in a copy of the caller's context, so they trace as children of the caller's span (see saim.tracing)
+    window = window or max_workers * 2
+    items = iter(items)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque()
+
+        def submit():
+            for item in items:
+                pending.append((item, executor.submit(propagate(fn), item)))
+                if len(pending) >= window:
+                    return
+
+        submit()
+        while pending:
+            if ordered:
+                item, future = pending.popleft()
+                concurrent.futures.wait([future])
+            else:
+                done, _ = concurrent.futures.wait([f for i, f in pending],
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for n, (item, future) in enumerate(pending):
+                    if future in done:
+                        del pending[n]
+                        break
+            error = future.exception()
+            yield item, (None if error else future.result()), error
+            submit()
@@ -0,0 +1,307 @@
+import random
+import re
+import warnings
+
+from saim.client import (ENDPOINTS, HOUSEHOLD, HOUSEHOLDS, LISTS, PRODUCT, PRODUCTS, STOCK, STOCK_ITEM, STOCK_LIST,
+                         TRANSACTIONS, parse_path)
+from saim.errors import SaimError
+
+# response contracts for every endpoint, written down from the expected_resp dicts in tests/unittests_plus.py:
+#
+#   errors = validate('GET', HOUSEHOLD, 200, data)             # [] when the response keeps to the contract
+#   client = Client(api_key, contracts=0.01)                    # check 1% of live responses, warn on violations
+#
+# schemas are plain python values: a type (str, int, float, bool), a dict of fields, a one-element list for arrays,
+# or one of the markers below. compile_schema() turns one into the source of a python function once, so checking a
+# response is a walk over the data without looking at the schema again. fields the contract doesn't mention are
+# allowed
+
+
+class ContractError(SaimError):
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+class Optional:
+    def __init__(self, schema):
+        self.schema = schema
+
+
+class Const:
+    def __init__(self, value):
+        self.value = value
+
+
+class OneOf:
+    # one of several schemas, e.g. OneOf(str, {...}); constants can be given as Const
+    def __init__(self, *schemas):
+        self.schemas = schemas
+
+
+class Regex:
+    def __init__(self, pattern):
+        self.pattern = pattern
+
+
+class Map:
+    # an object with any keys, all values matching one schema
+    def __init__(self, schema):
+        self.schema = schema
+
+
+_MISSING = object()
+_TYPE_NAMES = {str: 'string', int: 'integer', float: 'number', bool: 'boolean'}
+
+
+def _closure(schema, path):
+    # the markers that don't inline well, as closures over compiled sub-schemas
+    if isinstance(schema, Regex):
+        match = re.compile(schema.pattern).match
+
+        def check(value, errors):
+            if type(value) is not str or not match(value):
+                errors.append('%s: %r does not match %r' % (path, value, schema.pattern))
+        return check
+
+    if isinstance(schema, OneOf):
+        options = [compile_schema(option, path) for option in schema.schemas]
+
+        def check(value, errors):
+            for option in options:
+                attempt = []
+                option(value, attempt)
+                if not attempt:
+                    return
+            errors.append('%s: matches none of %d alternatives' % (path, len(options)))
+        return check
+
+    if isinstance(schema, Map):
+        item = compile_schema(schema.schema, path + '.*')
+
+        def check(value, errors):
+            if type(value) is not dict:
+                errors.append('%s: expected object, got %s' % (path, type(value).__name__))
+                return
+            for v in value.values():
+                item(v, errors)
+        return check
+
+    raise TypeError('not a schema: %r' % (schema,))
+
+
+class _Generator:
+    # writes the source of one check(value, errors) function for a whole schema: nested objects and arrays become
+    # nested ifs and for loops, so a valid response costs a type() and a dict.get() per field and no calls
+    def __init__(self):
+        self.lines = []
+        self.namespace = {'_MISSING': _MISSING}
+        self.count = 0
+
+    def ref(self, value):
+        self.count += 1
+        name = '_r%d' % self.count
+        self.namespace[name] = value
+        return name
+
+    def var(self):
+        self.count += 1
+        return '_v%d' % self.count
+
+    def line(self, depth, text):
+        self.lines.append('    ' * depth + text)
+
+    def mismatch(self, depth, var, path, expected):
+        message = '%s: expected %s, got %%s' % (path, expected)
+        self.line(depth, 'errors.append(%r %% type(%s).__name__)' % (message, var))
+
+    def emit(self, schema, var, path, depth):
+        if isinstance(schema, Optional):
+            schema = schema.schema
+
+        if schema is float:
+            self.line(depth, 'if type(%s) is not float and type(%s) is not int:' % (var, var))
+            self.mismatch(depth + 1, var, path, 'number')
+        elif isinstance(schema, type):
+            # type() rather than isinstance, so True isn't an integer
+            self.line(depth, 'if type(%s) is not %s:' % (var, self.ref(schema)))
+            self.mismatch(depth + 1, var, path, _TYPE_NAMES.get(schema, schema.__name__))
+        elif isinstance(schema, Const):
+            expected = self.ref(schema.value)
+            self.line(depth, 'if %s != %s:' % (var, expected))
+            self.line(depth + 1, 'errors.append(%r %% (%s, %s))' % (path + ': expected %r, got %r', expected, var))
+        elif isinstance(schema, dict):
+            self.line(depth, 'if type(%s) is not dict:' % var)
+            self.mismatch(depth + 1, var, path, 'object')
+            self.line(depth, 'else:')
+            self.line(depth + 1, 'pass')
+            for name, field in schema.items():
+                value = self.var()
+                self.line(depth + 1, '%s = %s.get(%r, _MISSING)' % (value, var, name))
+                self.line(depth + 1, 'if %s is _MISSING:' % value)
+                if isinstance(field, Optional):
+                    self.line(depth + 2, 'pass')
+                else:
+                    self.line(depth + 2, 'errors.append(%r)' % ('%s.%s: missing' % (path, name)))
+                self.line(depth + 1, 'else:')
+                self.emit(field, value, '%s.%s' % (path, name), depth + 2)
+        elif isinstance(schema, list):
+            item = self.var()
+            self.line(depth, 'if type(%s) is not list:' % var)
+            self.mismatch(depth + 1, var, path, 'array')
+            self.line(depth, 'else:')
+            self.line(depth + 1, 'for %s in %s:' % (item, var))
+            self.emit(schema[0], item, path + '[]', depth + 2)
+        else:
+            self.line(depth, '%s(%s, errors)' % (self.ref(_closure(schema, path)), var))
+
+
+def compile_schema(schema, path='$'):
+    # returns check(value, errors), appending a message per violation to errors
+    generator = _Generator()
+    generator.line(0, 'def check(value, errors):')
+    generator.emit(schema, 'value', path, 1)
+    exec('\n'.join(generator.lines), generator.namespace)
+    return generator.namespace['check']
+
+
+def compile_validator(schema):
+    # validator(value) -> list of violations, empty when value matches
+    check = compile_schema(schema)
+
+    def validator(value):
+        errors = []
+        check(value, errors)
+        return errors
+    return validator
+
+
+#
+# schemas
+#
+def error(status, title, control_code, message=str):
+    return status, {'error': {'error_title': Const(title), 'error_message': message,
+                              'control_code': Const(control_code)}}
+
+
+UNAUTHORIZED = error(401, 'Unauthorized', '7010')
+INVALID = error(400, 'Invalid request data.', '7020', OneOf(Map([str]), str))
+LIST_NOT_FOUND = error(404, 'Data Error', '1111')
+ITEM_NOT_FOUND = error(404, 'Data Error', '1081')
+PRODUCT_NOT_FOUND = error(404, 'Data Error', '1111')
+INVALID_TRANSACTION = error(422, 'Invalid Transaction Type', '1')
+
+UPDATE_SUCCESSFUL = {'message': Const('Update successful.')}
+DELETE_SUCCESSFUL = {'message': Const('Delete successful.')}
+
+HOUSEHOLD_SCHEMA = {
+    'id': str,
+    'address': str,
+    'first_name': Optional(str),
+    'last_name': Optional(str),
+    'email': Optional(str),
+    'primary_phone': Optional(str)
+}
+LIST_SCHEMA = {'id': str, 'description': str}
+STOCK_SCHEMA = {
+    'id': str,
+    'title': Optional(str),
+    'on_hand': Optional(int),
+    'on_order': Optional(int),
+    'min': Optional(int),
+    'max': Optional(int)
+}
+TRANSACTION_SCHEMA = {'type': str, 'quantity': int, 'date': Regex(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d')}
+PRODUCT_SCHEMA = {
+    'id': str,
+    'title': str,
+    'description': Optional(str),
+    'price': Optional(float),
+    'image_url': Optional(str),
+    'barcode_url': Optional(str)
+}
+
+# (method, template) -> ((status, schema), ...)
+CONTRACTS = {
+    ('POST', HOUSEHOLDS): ((201, {'id': str}), INVALID, UNAUTHORIZED),
+    ('GET', HOUSEHOLD): ((200, HOUSEHOLD_SCHEMA), UNAUTHORIZED),
+    ('PUT', HOUSEHOLD): ((200, UPDATE_SUCCESSFUL), INVALID, UNAUTHORIZED),
+    ('GET', LISTS): ((200, [LIST_SCHEMA]), UNAUTHORIZED),
+    ('GET', STOCK_LIST): ((200, [STOCK_SCHEMA]), UNAUTHORIZED, LIST_NOT_FOUND),
+    ('GET', STOCK): ((200, [STOCK_SCHEMA]), UNAUTHORIZED, LIST_NOT_FOUND),
+    ('POST', STOCK): ((200, UPDATE_SUCCESSFUL), INVALID, UNAUTHORIZED, LIST_NOT_FOUND),
+    ('GET', STOCK_ITEM): ((200, STOCK_SCHEMA), UNAUTHORIZED, LIST_NOT_FOUND, ITEM_NOT_FOUND),
+    ('PUT', STOCK_ITEM): ((200, UPDATE_SUCCESSFUL), INVALID, UNAUTHORIZED, LIST_NOT_FOUND, ITEM_NOT_FOUND),
+    ('DELETE', STOCK_ITEM): ((200, DELETE_SUCCESSFUL), UNAUTHORIZED, LIST_NOT_FOUND, ITEM_NOT_FOUND),
+    ('GET', TRANSACTIONS): ((200, [TRANSACTION_SCHEMA]), UNAUTHORIZED, LIST_NOT_FOUND, ITEM_NOT_FOUND),
+    ('POST', TRANSACTIONS): ((200, UPDATE_SUCCESSFUL), INVALID, UNAUTHORIZED, LIST_NOT_FOUND, ITEM_NOT_FOUND,
+                             INVALID_TRANSACTION),
+    ('GET', PRODUCTS): ((200, [PRODUCT_SCHEMA]),),
+    ('GET', PRODUCT): ((200, PRODUCT_SCHEMA), INVALID, PRODUCT_NOT_FOUND),
+}
+
+# compiled once at import: (method, template) -> {status: [validator, ...]}
+_validators = {}
+for _endpoint, _responses in CONTRACTS.items():
+    for _status, _schema in _responses:
+        _validators.setdefault(_endpoint, {}).setdefault(_status, []).append(compile_validator(_schema))
+
+
+def validate(method, template, status, data):
+    # violations of the contract of one response; template may also be a concrete url or path
+    if template not in ENDPOINTS:
+        template = parse_path(template)[0]
+    statuses = _validators.get((method, template))
+    if statuses is None:
+        return ['%s %s: no contract' % (method, template)]
+    validators = statuses.get(status)
+    if validators is None:
+        return ['%s %s: unexpected status %s' % (method, template, status)]
+    errors = None
+    for validator in validators:
+        errors = validator(data)
+        if not errors:
+            return errors
+    # several error envelopes share a status (1111 and 1081 are both 404s); report against the last one tried
+    return ['%s %s %s: %s' % (method, template, status, e) for e in errors]
+
+
+def check(method, template, status, data):
+    errors = validate(method, template, status, data)
+    if errors:
+        raise ContractError(errors)
+
+
+class ContractCheckingTransport:
+    # wraps another transport and validates a random sample of the responses; violations are counted and passed to
+    # on_violation(request, response, errors), which warns by default
+    def __init__(self, transport, sample=0.01, on_violation=None, rng=random.random):
+        self.transport = transport
+        self.sample = sample
+        self.on_violation = on_violation or self._warn
+        self.rng = rng
+        self.checked = 0
+        self.violations = 0
+
+    @staticmethod
+    def _warn(request, response, errors):
+        warnings.warn('%s %s broke its contract: %s' % (request.method, request.url, '; '.join(errors)),
+                      RuntimeWarning, stacklevel=4)
+
+    def send(self, request, timeout=None):
+        resp = self.transport.send(request, timeout)
+        if resp.status != 304 and self.rng() < self.sample:
+            self.checked += 1
+            try:
+                data = resp.json()
+            except ValueError as e:
+                errors = ['%s %s: body is not json (%s)' % (request.method, request.template, e)]
+            else:
+                errors = validate(request.method, request.template, resp.status, data)
+            if errors:
+                self.violations += 1
+                self.on_violation(request, resp, errors)
+        return resp
+
+    def close(self):
+        self.transport.close()
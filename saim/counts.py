@@ -0,0 +1,356 @@
+import asyncio
+import concurrent.futures
+import itertools
+import time
+
+from saim.client import STOCK
+from saim.errors import ApiError, NotSentError, TransportError
+from saim.importer import MalformedRow, read_rows
+from saim.tracing import propagate
+
+# reconciles physical counts (a stock id and the quantity found on the shelf) against the stock lists, posting an add
+# or remove transaction for every item whose on_hand is off:
+#
+#   reconciler = CountReconciler(client)
+#   async for result in reconciler.run(read_counts('counts.csv')): ...
+#   results = reconciler.reconcile(read_counts('counts.csv'))          # the same from synchronous code
+#   reconciler.stats['fetch'].to_dict()                                 # rows, throughput, busy/idle/blocked seconds
+#
+#   household_id,stock_id,count
+#   1001,1310035849,4
+#
+# four stages, each an async generator over the one before it with a bounded queue in between, so a slow stage holds
+# the ones upstream back instead of letting them pile up rows in memory:
+#
+#   read   rows from the file, grouped into batches of consecutive rows of one household
+#   fetch  GET .../lists/{list}/stock once per batch, fetch_workers at a time
+#   diff   the counted quantities against on_hand
+#   post   POST .../stock/{stock_id}/transactions for every difference, post_workers at a time
+#
+# the client is synchronous, so calls run on a thread pool. an item counted more than once in a file is set to its
+# last count: a household's next batch isn't fetched before its previous batch is posted, so it sees those
+# transactions already applied. every result has a state: posted, unchanged, unknown_item (not on the list, nothing
+# posted), invalid (bad row), failed, or unknown (the connection failed mid-request, the transaction may be in)
+
+BATCH_SIZE = 500
+QUEUE_SIZE = 16
+READ_CHUNK = 1000
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.workers = 0
+        self.rows = 0
+        self.busy = 0.0
+        self.idle = 0.0
+        self.blocked = 0.0
+        self.max_queued = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def throughput(self):
+        # rows per second while the stage had work
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed else 0.0
+
+    def to_dict(self):
+        # busy is time spent working, idle waiting for the stage upstream, blocked waiting for room downstream; a
+        # stage that is mostly busy while the others are idle or blocked is the bottleneck
+        return {'stage': self.name, 'workers': self.workers, 'rows': self.rows, 'elapsed': self.elapsed,
+                'throughput': self.throughput, 'busy': self.busy, 'idle': self.idle, 'blocked': self.blocked,
+                'max_queued': self.max_queued}
+
+
+async def stage(source, fn, stats, workers=1, queue_size=QUEUE_SIZE, flush=None):
+    # yields what `workers` concurrent calls of fn(item) return (a list each) for the items of the async iterable
+    # source, at most queue_size of them waiting to be taken. items are batches: len(item) counts toward stats.rows.
+    # flush() returns what is left once source is exhausted. an exception in source or fn is raised to the consumer
+    inbox = asyncio.Queue(workers)
+    outbox = asyncio.Queue(queue_size)
+    stats.workers = workers
+
+    async def feed():
+        try:
+            async for item in source:
+                await inbox.put(item)
+        finally:
+            if hasattr(source, 'aclose'):
+                await source.aclose()
+        for _ in range(workers):
+            await inbox.put(_DONE)
+
+    async def put(output):
+        start = time.perf_counter()
+        await outbox.put(output)
+        stats.blocked += time.perf_counter() - start
+        stats.max_queued = max(stats.max_queued, outbox.qsize())
+
+    async def work():
+        while True:
+            start = time.perf_counter()
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            if stats.started is None:
+                stats.started = time.perf_counter()
+            else:
+                stats.idle += time.perf_counter() - start
+            stats.rows += len(item)
+            start = time.perf_counter()
+            outputs = await fn(item)
+            stats.busy += time.perf_counter() - start
+            for output in outputs:
+                await put(output)
+
+    tasks = [asyncio.ensure_future(feed())] + [asyncio.ensure_future(work()) for _ in range(workers)]
+
+    async def supervise():
+        try:
+            await asyncio.gather(*tasks)
+            for output in (flush() if flush else ()):
+                await put(output)
+        except Exception as e:
+            for task in tasks:
+                task.cancel()
+            await outbox.put(_Failure(e))
+            return
+        stats.finished = time.perf_counter()
+        await outbox.put(_DONE)
+
+    supervisor = asyncio.ensure_future(supervise())
+    try:
+        while True:
+            output = await outbox.get()
+            if output is _DONE:
+                return
+            if isinstance(output, _Failure):
+                raise output.error
+            yield output
+    finally:
+        # also when the consumer stops early: nothing keeps running upstream
+        supervisor.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+def read_counts(path, format=None):
+    # (row number, row) from a csv or ndjson count file, see saim.importer.read_rows
+    return read_rows(path, format)
+
+
+class _Batch:
+    # consecutive rows of one household. after is the done event of the household's previous batch
+    def __init__(self, household_id, after):
+        self.household_id = household_id
+        self.after = after
+        self.done = asyncio.Event()
+        self.rows = 0
+        self.items = {}
+        self.results = []
+        self.stock = None
+
+    def __len__(self):
+        return self.rows
+
+
+class CountReconciler:
+    def __init__(self, client, list_id='main', household_id=None, fetch_workers=8, post_workers=8,
+                 batch_size=BATCH_SIZE, queue_size=QUEUE_SIZE):
+        # household_id is used for rows that don't name one
+        self.client = client
+        self.list_id = list_id
+        self.household_id = household_id
+        self.fetch_workers = fetch_workers
+        self.post_workers = post_workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.stats = {}
+        self.counts = {}
+
+    #
+    # read
+    #
+    def _parse(self, n, row):
+        if isinstance(row, MalformedRow):
+            return {'rows': [n], 'household_id': self.household_id, 'stock_id': None, 'state': 'invalid',
+                    'error': str(row)}
+        household_id = row.get('household_id', self.household_id)
+        stock_id = row.get('stock_id', row.get('id'))
+        errors = []
+        if not household_id:
+            errors.append('household_id is required')
+        if not stock_id:
+            errors.append('stock_id is required')
+        count = row.get('count')
+        try:
+            count = int(count)
+            if count < 0:
+                errors.append('count must not be negative')
+        except (TypeError, ValueError):
+            errors.append('count must be an integer')
+        if errors:
+            return {'rows': [n], 'household_id': household_id, 'stock_id': stock_id, 'state': 'invalid',
+                    'error': '; '.join(errors)}
+        return str(household_id), str(stock_id), count
+
+    def _reader(self):
+        # (fn, flush) of the read stage; fn is only ever called by one worker at a time
+        current = [None]
+        last_done = {}
+
+        def start(household_id):
+            batch = current[0] = _Batch(household_id, last_done.get(household_id))
+            last_done[household_id] = batch.done
+            return batch
+
+        async def fn(rows):
+            batches = []
+            for n, row in rows:
+                parsed = self._parse(n, row)
+                batch = current[0]
+                if isinstance(parsed, dict):
+                    if batch is None:
+                        batch = start(None)
+                    batch.rows += 1
+                    batch.results.append(parsed)
+                    continue
+                household_id, stock_id, count = parsed
+                if batch is None or batch.household_id != household_id or batch.rows >= self.batch_size:
+                    if batch is not None:
+                        batches.append(batch)
+                    batch = start(household_id)
+                batch.rows += 1
+                result = batch.items.get(stock_id)
+                if result is None:
+                    result = batch.items[stock_id] = {'rows': [], 'household_id': household_id,
+                                                      'stock_id': stock_id}
+                    batch.results.append(result)
+                result['rows'].append(n)
+                result['counted'] = count
+            return batches
+
+        def flush():
+            return [current[0]] if current[0] is not None else []
+        return fn, flush
+
+    async def _chunks(self, loop, executor, rows):
+        # the rows READ_CHUNK at a time, read on the thread pool so file access doesn't block the loop
+        rows = iter(rows)
+        while True:
+            chunk = await loop.run_in_executor(executor, lambda: list(itertools.islice(rows, READ_CHUNK)))
+            if not chunk:
+                return
+            yield chunk
+
+    #
+    # fetch, diff, post
+    #
+    def _fail(self, batch, error):
+        state = 'unknown' if isinstance(error, TransportError) else 'failed'
+        for result in batch.items.values():
+            result.update(state=state, status=getattr(error, 'status', None), error=str(error))
+
+    def _fetcher(self, loop, executor):
+        async def fn(batch):
+            if batch.after is not None:
+                await batch.after.wait()
+            if batch.items:
+                params = {'household_id': batch.household_id, 'list_id': self.list_id}
+                try:
+                    stock = await loop.run_in_executor(executor, propagate(self.client.request_json),
+                                                       'GET', STOCK, params)
+                except (ApiError, NotSentError, TransportError) as e:
+                    self._fail(batch, e)
+                else:
+                    batch.stock = {item['id']: item for item in stock}
+            return [batch]
+        return fn
+
+    async def _diff(self, batch):
+        if batch.stock is not None:
+            for stock_id, result in batch.items.items():
+                item = batch.stock.get(stock_id)
+                if item is None:
+                    result['state'] = 'unknown_item'
+                    continue
+                on_hand = item.get('on_hand', 0)
+                result.update(on_hand=on_hand, delta=result['counted'] - on_hand)
+                if not result['delta']:
+                    result['state'] = 'unchanged'
+        return [batch]
+
+    def _poster(self, loop, executor):
+        # at most post_workers transactions in flight across all batches
+        semaphore = asyncio.Semaphore(self.post_workers)
+
+        async def post(batch, result):
+            delta = result['delta']
+            transaction = {'type': 'add' if delta > 0 else 'remove', 'quantity': abs(delta)}
+            async with semaphore:
+                try:
+                    resp = await loop.run_in_executor(executor, propagate(self.client.post_transaction),
+                                                      batch.household_id, result['stock_id'], transaction, self.list_id)
+                except TransportError as e:
+                    result.update(state='unknown', status=None, error=str(e))
+                    return
+                except NotSentError as e:
+                    result.update(state='failed', status=None, error=str(e))
+                    return
+            if resp.ok:
+                result.update(state='posted', status=resp.status)
+            else:
+                result.update(state='failed', status=resp.status, error=resp.error)
+
+        async def fn(batch):
+            try:
+                await asyncio.gather(*[post(batch, result) for result in batch.items.values()
+                                       if 'state' not in result])
+            finally:
+                batch.done.set()
+            return [batch]
+        return fn
+
+    #
+    # pipeline
+    #
+    async def run(self, rows):
+        # yields a result per counted item (per row for invalid rows) as its batch completes
+        loop = asyncio.get_running_loop()
+        executor = concurrent.futures.ThreadPoolExecutor(self.fetch_workers + self.post_workers + 1)
+        self.stats = {name: StageStats(name) for name in ('read', 'fetch', 'diff', 'post')}
+        read, flush = self._reader()
+        pipeline = stage(self._chunks(loop, executor, rows), read, self.stats['read'], 1, self.queue_size, flush)
+        pipeline = stage(pipeline, self._fetcher(loop, executor), self.stats['fetch'], self.fetch_workers,
+                         self.queue_size)
+        pipeline = stage(pipeline, self._diff, self.stats['diff'], 1, self.queue_size)
+        pipeline = stage(pipeline, self._poster(loop, executor), self.stats['post'], self.post_workers,
+                         self.queue_size)
+        try:
+            async for batch in pipeline:
+                for result in batch.results:
+                    self.counts[result['state']] = self.counts.get(result['state'], 0) + 1
+                    yield result
+        finally:
+            await pipeline.aclose()
+            executor.shutdown(wait=False)
+
+    def reconcile(self, rows):
+        # run() to completion from synchronous code; returns every result
+        async def collect():
+            return [result async for result in self.run(rows)]
+        return asyncio.run(collect())
@@ -0,0 +1,105 @@
+import ipaddress
+import socket
+import threading
+import time
+
+# optional: pip install saim-python-sdk[dns]. with dnspython, entries live as long as the records' own ttl says
+try:
+    import dns.resolver as _resolver
+except ImportError:
+    _resolver = None
+
+
+def _literal(host):
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+class DnsCache:
+    # host lookups for the pooled transport, cached so new connections don't each pay for getaddrinfo. with dnspython
+    # the addresses come from one A and one AAAA query and expire after the records' ttl, else they come from
+    # getaddrinfo and expire after `ttl` seconds; never later than max_ttl
+    def __init__(self, ttl=60.0, max_ttl=3600.0, resolver=None, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_ttl = max_ttl
+        self.resolver = resolver or self._resolve
+        self.clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+
+    def _resolve(self, host, port):
+        # (addrinfo list, ttl or None)
+        if _resolver is not None and not _literal(host):
+            try:
+                return self._query(host, port)
+            except Exception:
+                # /etc/hosts names and anything else dns has no answer for
+                pass
+        return socket.getaddrinfo(host, port, type=socket.SOCK_STREAM), None
+
+    def _query(self, host, port):
+        # the addresses and ttl from one A and one AAAA query, ipv4 first: an unreachable ipv6 route costs a connect
+        # timeout on every new connection
+        infos, ttls = [], []
+        for rdtype, family in (('A', socket.AF_INET), ('AAAA', socket.AF_INET6)):
+            rrset = _resolver.resolve(host, rdtype, raise_on_no_answer=False).rrset
+            if rrset is None:
+                continue
+            ttls.append(rrset.ttl)
+            for rdata in rrset:
+                sockaddr = (rdata.address, port) if family == socket.AF_INET else (rdata.address, port, 0, 0)
+                infos.append((family, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', sockaddr))
+        if not infos:
+            raise OSError('no addresses for %s' % host)
+        return infos, min(ttls)
+
+    def resolve(self, host, port):
+        key = (host, port)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        start = time.perf_counter()
+        infos, ttl = self.resolver(host, port)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.lookup_seconds += elapsed
+            self._entries[key] = (infos, now + min(ttl if ttl is not None else self.ttl, self.max_ttl))
+        return infos
+
+    def forget(self, host, port):
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def create_connection(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        # drop-in for socket.create_connection on http.client connections (conn._create_connection), trying the cached
+        # addresses in order; if none of them answers the entry is dropped, so the next attempt looks the host up again
+        host, port = address
+        error = None
+        for family, type_, proto, _, sockaddr in self.resolve(host, port):
+            sock = socket.socket(family, type_, proto)
+            try:
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                error = e
+                sock.close()
+        self.forget(host, port)
+        raise error or OSError('no addresses for %s' % host)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries),
+                'lookup_seconds': self.lookup_seconds}
@@ -0,0 +1,23 @@
+class SaimError(Exception):
+    pass
+
+
+class TransportError(SaimError):
+    # raised when no http response could be obtained at all (dns failure, refused connection, timeout...)
+    pass
+
+
+class NotSentError(SaimError):
+    # raised when a request was given up on before any of it went out (no concurrency slot came free in time);
+    # unlike a TransportError it can't have been applied, so it is always safe to send again
+    pass
+
+
+class ApiError(SaimError):
+    # raised by the helpers that need a successful response; carries the SAIM error envelope, e.g.
+    # {'error_title': 'Unauthorized', 'error_message': '...', 'control_code': '7010'}
+    def __init__(self, status, error):
+        self.status = status
+        self.error = error or {}
+        self.control_code = self.error.get('control_code')
+        super().__init__('%s %s (control_code %s)' % (status, self.error.get('error_title', ''), self.control_code))
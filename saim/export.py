@@ -0,0 +1,214 @@
+import concurrent.futures
+import csv
+import json
+import queue
+import threading
+
+from saim.errors import NotSentError, TransportError
+
+# one flat record per entity, tagged with the ids of its parents, so nothing ever has to be held as a nested document
+CSV_FIELDS = ['record', 'household_id', 'list_id', 'stock_id', 'id',
+              'first_name', 'last_name', 'address', 'email', 'primary_phone',
+              'description',
+              'title', 'on_hand', 'on_order', 'min', 'max',
+              'type', 'quantity', 'date',
+              'call', 'status', 'error']
+
+_done = object()
+
+
+class NdjsonWriter:
+    def __init__(self, fp):
+        self.fp = fp
+
+    def write(self, record):
+        self.fp.write(json.dumps(record) + '\n')
+
+
+class CsvWriter:
+    def __init__(self, fp, fields=CSV_FIELDS):
+        self._writer = csv.DictWriter(fp, fields, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def write(self, record):
+        if isinstance(record.get('error'), (dict, list)):
+            record = dict(record, error=json.dumps(record['error']))
+        self._writer.writerow(record)
+
+
+WRITERS = {'ndjson': NdjsonWriter, 'csv': CsvWriter}
+
+
+class _Household:
+    # counts the outstanding calls of one household's tree; the last one to finish frees its slot
+    def __init__(self, household_id, slots):
+        self.household_id = household_id
+        self._slots = slots
+        self._pending = 1
+        self._lock = threading.Lock()
+
+    def add(self, n):
+        with self._lock:
+            self._pending += n
+
+    def finish(self):
+        with self._lock:
+            self._pending -= 1
+            last = self._pending == 0
+        if last:
+            self._slots.release()
+
+
+class Exporter:
+    # walks household -> lists -> stock -> transactions for every household id and hands flat records to write() as
+    # the calls complete
+    #
+    # memory is bounded by max_households (how many household trees are being fetched at once), buffer (records
+    # fetched but not written yet) and twice max_workers (calls waiting for a worker), not by how many households
+    # there are: the id iterator is only advanced when a household tree finishes, workers block when the writer falls
+    # behind, and a call spawned while the pool is backed up runs in the thread that spawned it
+    def __init__(self, client, max_workers=8, max_households=4, buffer=1000, transactions=True):
+        self.client = client
+        self.max_workers = max_workers
+        self.max_households = max_households
+        self.buffer = buffer
+        self.transactions = transactions
+        self.counts = {}
+
+    def export(self, household_ids, write):
+        records = queue.Queue(self.buffer)
+        slots = threading.BoundedSemaphore(self.max_households)
+        stop = threading.Event()
+        executor = concurrent.futures.ThreadPoolExecutor(self.max_workers)
+        backlog = threading.BoundedSemaphore(2 * self.max_workers)
+
+        def emit(record):
+            # blocks while the buffer is full, unless the export was abandoned
+            while not stop.is_set():
+                try:
+                    records.put(record, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def run(household, fn, *args):
+            try:
+                if not stop.is_set():
+                    fn(household, *args)
+            except Exception as e:
+                emit({'record': 'error', 'household_id': household.household_id, 'error': str(e)})
+            finally:
+                household.finish()
+
+        def submit(household, *call):
+            # with the backlog full the call runs right here, since waiting for room could deadlock the workers that
+            # spawn calls. a call that never runs (the export was abandoned) still counts as finished, or its
+            # household's slot would never come back
+            if not backlog.acquire(blocking=False):
+                run(household, *call)
+                return
+
+            def done(future):
+                backlog.release()
+                if future.cancelled():
+                    household.finish()
+
+            try:
+                executor.submit(run, household, *call).add_done_callback(done)
+            except RuntimeError:
+                # shut down already
+                backlog.release()
+                household.finish()
+
+        def spawn(household, calls):
+            household.add(len(calls))
+            for call in calls:
+                submit(household, *call)
+
+        def fetch(household, kind, call, **ids):
+            try:
+                resp = call()
+            except (NotSentError, TransportError) as e:
+                emit(dict(ids, record='error', household_id=household.household_id, call=kind, error=str(e)))
+                return None
+            if not resp.ok:
+                emit(dict(ids, record='error', household_id=household.household_id, call=kind, status=resp.status,
+                          error=resp.error))
+                return None
+            return resp.json()
+
+        def household_tree(household):
+            household_id = household.household_id
+            data = fetch(household, 'household', lambda: self.client.get_household(household_id))
+            if data is not None:
+                emit(dict(data, record='household', household_id=household_id))
+            lists = fetch(household, 'lists', lambda: self.client.get_lists(household_id))
+            if lists:
+                for item in lists:
+                    emit(dict(item, record='list', household_id=household_id))
+                spawn(household, [(stock_list, item['id']) for item in lists])
+
+        def stock_list(household, list_id):
+            household_id = household.household_id
+            stock = fetch(household, 'stock', lambda: self.client.get_stock(household_id, list_id), list_id=list_id)
+            if stock:
+                for item in stock:
+                    emit(dict(item, record='stock', household_id=household_id, list_id=list_id))
+                if self.transactions:
+                    spawn(household, [(stock_transactions, list_id, item['id']) for item in stock])
+
+        def stock_transactions(household, list_id, stock_id):
+            household_id = household.household_id
+            history = fetch(household, 'transactions',
+                            lambda: self.client.get_transactions(household_id, stock_id, list_id),
+                            list_id=list_id, stock_id=stock_id)
+            for item in history or ():
+                emit(dict(item, record='transaction', household_id=household_id, list_id=list_id,
+                          stock_id=stock_id))
+
+        failed = []
+
+        def take():
+            # a household slot, or False once the export was abandoned
+            while not slots.acquire(timeout=0.1):
+                if stop.is_set():
+                    return False
+            return not stop.is_set()
+
+        def feed():
+            try:
+                for household_id in household_ids:
+                    if not take():
+                        return
+                    submit(_Household(household_id, slots), household_tree)
+                # every slot coming back means every household tree has finished
+                for _ in range(self.max_households):
+                    if not take():
+                        return
+            except Exception as e:
+                # the household ids couldn't be read to the end: the export is incomplete and fails with it
+                failed.append(e)
+            finally:
+                emit(_done)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        try:
+            while True:
+                record = records.get()
+                if record is _done:
+                    break
+                self.counts[record['record']] = self.counts.get(record['record'], 0) + 1
+                write(record)
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        if failed:
+            raise failed[0]
+        return self.counts
+
+
+def export(client, household_ids, fp, format='ndjson', **kwargs):
+    writer = WRITERS[format](fp)
+    return Exporter(client, **kwargs).export(household_ids, writer.write)
+
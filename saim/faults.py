@@ -0,0 +1,205 @@
+import fnmatch
+import json
+import math
+import random
+import threading
+import time
+
+# faults and latency for the stand-in (saim.standin), per route, so benchmarks and tests can see how the client copes
+# with a slow or failing api:
+#
+#   faults = FaultInjector([Rule('GET /households/*', latency={'dist': 'lognormal', 'median': 0.05, 'sigma': 0.8}),
+#                           Rule('POST *', errors=0.1, status=503)])
+#   with StandinServer(faults=faults) as server: ...
+#
+# or a scripted scenario, phases that follow each other in time (a phase without a duration lasts until the end):
+#
+#   {"seed": 7,
+#    "phases": [{"duration": 10, "rules": []},
+#               {"duration": 20, "rules": [{"route": "*", "burst": [5, 50], "status": 503}]},
+#               {"rules": [{"route": "GET *", "drip": 1.0, "drip_interval": 0.01}]}]}
+#
+#   python -m saim.standin 8080 --faults scenario.json
+#
+# a rule with a capacity models a server that can only work on so many requests at once: its latency is how long a
+# request holds one of `capacity` slots, requests beyond that wait for one (so latency grows with the load), and with
+# a queue set, those that find `queue` others already waiting are turned away with shed_status (429 by default)
+#
+# a route is 'METHOD path-pattern' with shell wildcards, matched against the request path below /saim/v1, or '*'
+
+
+def sampler(spec, rng):
+    # seconds of latency per request: a number, a callable(rng), or {'dist': ..., parameters}:
+    #   fixed(seconds), uniform(low, high), normal(mean, stdev), lognormal(median, sigma), exponential(mean)
+    if spec is None:
+        return None
+    if callable(spec):
+        return lambda: spec(rng)
+    if isinstance(spec, (int, float)):
+        return lambda: spec
+    spec = dict(spec)
+    dist = spec.pop('dist')
+    if dist == 'fixed':
+        return lambda: spec['seconds']
+    if dist == 'uniform':
+        return lambda: rng.uniform(spec['low'], spec['high'])
+    if dist == 'normal':
+        return lambda: max(rng.gauss(spec['mean'], spec['stdev']), 0.0)
+    if dist == 'lognormal':
+        mu = math.log(spec['median'])
+        return lambda: rng.lognormvariate(mu, spec['sigma'])
+    if dist == 'exponential':
+        return lambda: rng.expovariate(1.0 / spec['mean'])
+    raise ValueError('unknown latency distribution: ' + dist)
+
+
+class Plan:
+    # what the handler does to one request
+    __slots__ = ('delay', 'drop', 'status', 'truncate', 'drip', 'slots')
+
+    def __init__(self):
+        self.delay = 0.0
+        self.slots = None
+        self.drop = False
+        self.status = None
+        self.truncate = None
+        self.drip = None
+
+
+class Rule:
+    # every fault is a probability per request, except burst=(length, every): `length` failures at the start of every
+    # `every` requests matching the rule
+    def __init__(self, route='*', latency=None, drop=0.0, truncate=0.0, truncate_at=0.5, errors=0.0, status=503,
+                 burst=None, drip=0.0, drip_chunk=64, drip_interval=0.05, capacity=None, queue=None, shed_status=429):
+        self.route = route
+        self.method, _, self.pattern = route.partition(' ') if route != '*' else ('*', '', '*')
+        self.latency = latency
+        self.drop = drop
+        self.truncate = truncate
+        self.truncate_at = truncate_at
+        self.errors = errors
+        self.status = status
+        self.burst = burst
+        self.drip = drip
+        self.drip_chunk = drip_chunk
+        self.drip_interval = drip_interval
+        self.capacity = capacity
+        self.queue = queue
+        self.shed_status = shed_status
+        self.matched = 0
+        self.shed = 0
+        self._latency = None
+        self._slots = threading.Semaphore(capacity) if capacity else None
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def matches(self, method, path):
+        return (self.method == '*' or self.method == method) and fnmatch.fnmatchcase(path, self.pattern)
+
+    def apply(self, plan, rng):
+        # called with the injector's lock held
+        if self._latency is None and self.latency is not None:
+            self._latency = sampler(self.latency, rng)
+        count = self.matched
+        self.matched += 1
+        if self._latency is not None:
+            plan.delay += self._latency()
+        if self.drop and rng.random() < self.drop:
+            plan.drop = True
+        if (self.burst and count % self.burst[1] < self.burst[0]) or (self.errors and rng.random() < self.errors):
+            plan.status = self.status
+        if self.truncate and rng.random() < self.truncate:
+            plan.truncate = self.truncate_at
+        if self.drip and rng.random() < self.drip:
+            plan.drip = (self.drip_chunk, self.drip_interval)
+        if self._slots is not None and plan.slots is None:
+            plan.slots = self
+
+    def enter(self):
+        # takes a slot, waiting for one if need be; False when the queue is full and the request is shed
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self.queue is not None and self._waiting >= self.queue:
+                self.shed += 1
+                return False
+            self._waiting += 1
+        self._slots.acquire()
+        with self._lock:
+            self._waiting -= 1
+        return True
+
+    def leave(self):
+        self._slots.release()
+
+
+class FaultInjector:
+    def __init__(self, rules=(), seed=None, phases=None, clock=time.monotonic):
+        # phases: [(duration or None, [Rule, ...]), ...]; rules alone is a single phase without end
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.phases = list(phases) if phases is not None else [(None, list(rules))]
+        self._started = None
+        self._lock = threading.Lock()
+        self.counts = {'requests': 0, 'delayed': 0, 'dropped': 0, 'errors': 0, 'truncated': 0, 'dripped': 0}
+
+    @classmethod
+    def from_scenario(cls, scenario, clock=time.monotonic):
+        # a scenario dict (see above), or the path of a json file holding one
+        if isinstance(scenario, str):
+            with open(scenario, encoding='utf-8') as f:
+                scenario = json.load(f)
+        phases = [(phase.get('duration'), [Rule(**rule) for rule in phase.get('rules', [])])
+                  for phase in scenario['phases']]
+        return cls(seed=scenario.get('seed'), phases=phases, clock=clock)
+
+    def set_rules(self, rules):
+        # replaces the scenario with one open-ended phase
+        with self._lock:
+            self.phases = [(None, list(rules))]
+            self._started = None
+
+    def restart(self):
+        # the scenario's clock starts again with the next request
+        with self._lock:
+            self._started = None
+
+    def phase(self):
+        # index of the phase in effect
+        with self._lock:
+            return self._phase(self.clock())[0]
+
+    def _phase(self, now):
+        if self._started is None:
+            self._started = now
+        elapsed = now - self._started
+        for index, (duration, rules) in enumerate(self.phases):
+            if duration is None or elapsed < duration:
+                return index, rules
+            elapsed -= duration
+        return len(self.phases), []
+
+    def plan(self, method, path):
+        plan = Plan()
+        with self._lock:
+            _, rules = self._phase(self.clock())
+            for rule in rules:
+                if rule.matches(method, path):
+                    rule.apply(plan, self.rng)
+            counts = self.counts
+            counts['requests'] += 1
+            counts['delayed'] += plan.delay > 0
+            counts['dropped'] += plan.drop
+            counts['errors'] += plan.status is not None
+            counts['truncated'] += plan.truncate is not None
+            counts['dripped'] += plan.drip is not None
+        return plan
+
+
+_TITLES = {429: 'Too Many Requests', 503: 'Service Unavailable'}
+
+
+def error_body(status):
+    # injected errors don't come from the api itself but from whatever sits in front of it
+    return json.dumps({'error': {'error_title': _TITLES.get(status, 'Server Error'),
+                                 'error_message': 'Injected fault.', 'control_code': str(status)}}).encode()
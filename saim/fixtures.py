@@ -0,0 +1,261 @@
+import collections
+import json
+import os
+import socket
+import threading
+
+from saim.errors import SaimError
+
+# a pool of pre-created sandbox households for the unittests, so a run doesn't start by creating a household and every
+# test doesn't depend on test_1_post_households having run first
+#
+#   python -m saim.fixtures provision pool.json --size 8     create (or top up) the pool
+#   python -m saim.fixtures reset pool.json                  put every household not leased back to the seed state
+#   SAIM_FIXTURE_POOL=pool.json python tests/unittests_plus.py
+#
+# the seed is what the unittests expect to find: the household from test_1_post_households and the two stock items
+# from test_post_households_stock_list. a household is put back to the seed when its lease is released, so the next
+# run doesn't inherit what destructive tests left behind; one whose worker died without releasing it stays leased
+# until reset. transaction histories can't be removed through the api and just grow
+
+SEED_HOUSEHOLD = {
+    'first_name': 'John',
+    'last_name': 'Doe',
+    'address': 'Cardboard Box #3',
+    'email': 'homeless@nowhere.com',
+    'primary_phone': '(123) 456-7890'
+}
+
+SEED_STOCK = [
+    {'id': '1310035849',
+     'title': 'a title',
+     'on_hand': 3,
+     'on_order': 0,
+     'min': 2,
+     'max': 5},
+    {'id': '1470432411',
+     'title': 'any old title',
+     'on_hand': 8,
+     'on_order': 0,
+     'min': 4,
+     'max': 10}
+]
+
+
+class PoolError(SaimError):
+    pass
+
+
+class Lease:
+    def __init__(self, pool, household_id):
+        self.pool = pool
+        self.household_id = household_id
+
+    def release(self):
+        if self.household_id is not None:
+            self.pool.release(self.household_id)
+            self.household_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class HouseholdPool:
+    # the pool's household ids live in a json state file; lease() hands out a free one in O(1) from an in-process
+    # deque and additionally takes a lock file (linked into place, so it never exists half written), so test workers
+    # in other processes never get the same household at the same time. the lock file names its owner (pid and host)
+    # so reset() can tell a live lease from one left behind by a worker that died
+    def __init__(self, client, state_path, seed_household=SEED_HOUSEHOLD, seed_stock=SEED_STOCK, max_workers=8):
+        self.client = client
+        self.state_path = state_path
+        self.seed_household = seed_household
+        self.seed_stock = seed_stock
+        self.max_workers = max_workers
+        self.household_ids = []
+        self._free = collections.deque()
+        self._lock = threading.Lock()
+        if os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as f:
+                self.household_ids = json.load(f)['households']
+            self._free.extend(self.household_ids)
+
+    def _save(self):
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'base_url': self.client.base_url, 'households': self.household_ids}, f, indent=1)
+        os.replace(tmp, self.state_path)
+
+    def _lock_path(self, household_id):
+        return '%s.%s.lock' % (self.state_path, household_id)
+
+    def _take(self, household_id):
+        # True if this process now holds the household's lock file
+        path = self._lock_path(household_id)
+        tmp = '%s.%d.%d' % (path, os.getpid(), threading.get_ident())
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'pid': os.getpid(), 'host': socket.gethostname()}, f)
+        try:
+            os.link(tmp, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp)
+
+    def _leased(self, household_id):
+        # True while the household's lock file belongs to a live process; pids on other hosts can't be checked and
+        # count as live
+        try:
+            with open(self._lock_path(household_id), encoding='utf-8') as f:
+                owner = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if owner.get('host') != socket.gethostname() or os.name == 'nt':
+            # (os.kill on windows would terminate the process)
+            return True
+        try:
+            os.kill(owner['pid'], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _claim(self, household_id):
+        # for reset(): takes the household's lock, breaking it if its owner is gone; False if it is in use
+        if self._take(household_id):
+            return True
+        if self._leased(household_id):
+            return False
+        try:
+            os.remove(self._lock_path(household_id))
+        except FileNotFoundError:
+            pass
+        return self._take(household_id)
+
+    def _check(self, resp):
+        if not resp.ok:
+            raise PoolError('%s: %s' % (resp.status, resp.error))
+        return resp
+
+    def _create(self, n):
+        household_id = self._check(self.client.post_household(self.seed_household)).json()['id']
+        self._check(self.client.post_stock(household_id, self.seed_stock))
+        return household_id
+
+    def provision(self, size):
+        # creates households concurrently until the pool holds `size` of them
+        missing = size - len(self.household_ids)
+        created = []
+        errors = []
+        for n, household_id, error in self.client.map(self._create, range(max(missing, 0)), self.max_workers):
+            if error is not None:
+                errors.append(error)
+            else:
+                created.append(household_id)
+        with self._lock:
+            self.household_ids.extend(created)
+            self._free.extend(created)
+            self._save()
+        if errors:
+            raise PoolError('%d of %d households could not be created: %s' % (len(errors), missing, errors[0]))
+        return created
+
+    def _reset_one(self, household_id):
+        self._check(self.client.put_household(household_id, self.seed_household))
+        seed_ids = {item['id'] for item in self.seed_stock}
+        stock = self._check(self.client.get_stock(household_id)).json()
+        for item in stock:
+            if item['id'] not in seed_ids:
+                self._check(self.client.delete_stock_item(household_id, item['id']))
+        self._check(self.client.post_stock(household_id, self.seed_stock))
+        return household_id
+
+    def reset(self):
+        # puts every household that isn't leased back to the seed: household fields, the seed stock items and nothing
+        # else on the main list. each is locked while it is reset; the leases of crashed workers are taken over,
+        # households in use by a live worker are left alone. returns the ids of the households reset
+        idle = [household_id for household_id in self.household_ids if self._claim(household_id)]
+        done = []
+        errors = []
+        for household_id, _, error in self.client.map(self._reset_one, idle, self.max_workers):
+            if error is not None:
+                errors.append((household_id, error))
+                continue
+            done.append(household_id)
+            try:
+                os.remove(self._lock_path(household_id))
+            except FileNotFoundError:
+                pass
+        if errors:
+            raise PoolError('%d households could not be reset, first: %s %s' % (len(errors), *errors[0]))
+        return done
+
+    def lease(self):
+        with self._lock:
+            for _ in range(len(self._free)):
+                household_id = self._free.popleft()
+                if not self._take(household_id):
+                    # leased by another process; keep it in rotation for later
+                    self._free.append(household_id)
+                    continue
+                return Lease(self, household_id)
+        raise PoolError('no free household in the pool (provision more, or reset to clear stale leases)')
+
+    def release(self, household_id):
+        # puts the household back to the seed first; if that fails it stays leased, until reset() takes it over once
+        # this process is gone
+        self._reset_one(household_id)
+        try:
+            os.remove(self._lock_path(household_id))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._free.append(household_id)
+
+
+def lease_from_env(base_url, api_key):
+    # for the unittests: a lease on a pool household if SAIM_FIXTURE_POOL names a pool state file, else None
+    state_path = os.environ.get('SAIM_FIXTURE_POOL')
+    if not state_path:
+        return None
+    import atexit
+    from saim.client import Client
+
+    pool = HouseholdPool(Client(api_key, base_url, 'pooled'), state_path)
+    if not pool.household_ids:
+        pool.provision(int(os.environ.get('SAIM_FIXTURE_POOL_SIZE', '4')))
+    lease = pool.lease()
+    atexit.register(lease.release)
+    return lease
+
+
+def main(argv=None):
+    import argparse
+    from saim.client import BASE_URL, Client
+
+    parser = argparse.ArgumentParser(prog='python -m saim.fixtures')
+    parser.add_argument('command', choices=['provision', 'reset', 'status'])
+    parser.add_argument('state', help='pool state file')
+    parser.add_argument('--size', type=int, default=4, help='households to provision')
+    parser.add_argument('--api-key', default=os.environ.get('SAIM_API_KEY', ''))
+    parser.add_argument('--base-url', default=os.environ.get('SAIM_BASE_URL', BASE_URL))
+    args = parser.parse_args(argv)
+
+    with Client(args.api_key, args.base_url, 'pooled') as client:
+        pool = HouseholdPool(client, args.state)
+        if args.command == 'provision':
+            print('created %d households' % len(pool.provision(args.size)))
+        elif args.command == 'reset':
+            print('reset %d households' % len(pool.reset()))
+        leased = [h for h in pool.household_ids if pool._leased(h)]
+        print('%d households, %d leased' % (len(pool.household_ids), len(leased)))
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
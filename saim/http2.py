@@ -0,0 +1,45 @@
+import time
+
+from saim.errors import TransportError
+from saim.transport import Response
+
+# optional: pip install saim-python-sdk[http2]
+try:
+    import h2  # noqa: F401 (httpx only speaks http/2 when h2 is installed)
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def available():
+    return httpx is not None
+
+
+class Http2Transport:
+    # concurrent requests from any number of threads share one multiplexed connection per host instead of one
+    # connection each
+    #
+    # https hosts negotiate http/2 through alpn and silently get pooled http/1.1 when the server doesn't offer it;
+    # plain http only speaks http/2 with prior_knowledge=True (the server must accept h2c), and otherwise http/1.1
+    def __init__(self, prior_knowledge=False, max_connections=100, verify=True):
+        if httpx is None:
+            raise ImportError('Http2Transport needs httpx[http2]')
+        self._client = httpx.Client(http2=True, http1=not prior_knowledge, verify=verify,
+                                    limits=httpx.Limits(max_connections=max_connections,
+                                                        max_keepalive_connections=max_connections))
+
+    def send(self, request, timeout=None):
+        body = request.body
+        if isinstance(body, memoryview):
+            # httpx would iterate a memoryview as ints
+            body = body.tobytes()
+        start = time.perf_counter()
+        try:
+            resp = self._client.request(request.method, request.url, content=body, headers=request.headers,
+                                        timeout=timeout)
+        except httpx.TransportError as e:
+            raise TransportError(str(e)) from e
+        return Response(resp.status_code, resp.content, dict(resp.headers), time.perf_counter() - start)
+
+    def close(self):
+        self._client.close()
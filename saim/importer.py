@@ -0,0 +1,211 @@
+import csv
+import json
+import os
+import threading
+
+from saim.concurrency import bounded_map
+from saim.errors import TransportError
+from saim.validation import (HOUSEHOLD_FIELDS, STOCK_FIELDS, STOCK_INT_FIELDS, error_envelope, validate_household,
+                             validate_stock_item)
+
+
+class MalformedRow(ValueError):
+    # what read_rows yields instead of the dict for a line that isn't a json object, so only that row fails
+    pass
+
+
+def read_rows(path, format=None):
+    # yields (row number, dict) from a csv file (empty cells dropped) or an ndjson file (numbered by line)
+    format = format or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, encoding='utf-8', newline='') as f:
+        if format == 'csv':
+            for n, row in enumerate(csv.DictReader(f), 1):
+                yield n, {k: v for k, v in row.items() if k and v not in ('', None)}
+        else:
+            for n, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = MalformedRow('malformed json: %s' % e)
+                if not isinstance(row, (dict, MalformedRow)):
+                    row = MalformedRow('not a json object')
+                yield n, row
+
+
+def load_results(path):
+    # the last result written for every row of a results file
+    results = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    result = json.loads(line)
+                    results[result['row']] = result
+    return results
+
+
+def load_keys(path):
+    # key -> new household id, from the results file of a household import
+    return {result['key']: result['id'] for result in load_results(path).values()
+            if result['state'] == 'ok' and result.get('id')}
+
+
+class Checkpoint:
+    # two append-only files: <results> holds one line per finished row (the last line for a row wins) and
+    # <results>.submitted holds the rows whose request has been sent. a row that was sent but has no result was in
+    # flight when the import stopped, so whether it got created is unknown
+    def __init__(self, results_path):
+        self.results_path = results_path
+        self.submitted_path = results_path + '.submitted'
+        self.results = load_results(results_path)
+        self.submitted = set()
+        if os.path.exists(self.submitted_path):
+            with open(self.submitted_path, encoding='utf-8') as f:
+                self.submitted = {int(line) for line in f if line.strip()}
+        self._results = open(results_path, 'a', encoding='utf-8')
+        self._submitted = open(self.submitted_path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._results.close()
+        self._submitted.close()
+
+    def mark_submitted(self, rows):
+        with self._lock:
+            self._submitted.write(''.join('%d\n' % row for row in rows))
+            self._submitted.flush()
+            self.submitted.update(rows)
+
+    def record(self, result):
+        with self._lock:
+            self._results.write(json.dumps(result) + '\n')
+            self._results.flush()
+            self.results[result['row']] = result
+
+
+class Importer:
+    # submits rows with bounded concurrency, writing every row's outcome to a results file as it completes
+    #
+    # rows already imported by an earlier run of the same results file are skipped, as are rows that failed
+    # (unless retry_failed) and rows whose outcome is unknown because the run was interrupted or the connection
+    # failed mid-request (unless retry_unknown, which risks creating them twice)
+    def __init__(self, client, results_path, max_workers=8, retry_failed=False, retry_unknown=False):
+        self.client = client
+        self.results_path = results_path
+        self.max_workers = max_workers
+        self.retry_failed = retry_failed
+        self.retry_unknown = retry_unknown
+        self.counts = {}
+
+    def _pending(self, checkpoint, rows):
+        for n, row in rows:
+            if isinstance(row, MalformedRow):
+                self._record(checkpoint, {'row': n, 'key': str(n), 'state': 'failed', 'status': None,
+                                          'error': str(row)})
+                continue
+            previous = checkpoint.results.get(n)
+            if previous is None and n in checkpoint.submitted:
+                previous = {'row': n, 'key': row.get('key', str(n)), 'state': 'unknown', 'status': None,
+                            'error': 'interrupted while in flight, not resubmitted'}
+                self._record(checkpoint, previous)
+            if previous is not None:
+                state = previous['state']
+                if state == 'ok' or (state == 'failed' and not self.retry_failed) or \
+                        (state == 'unknown' and not self.retry_unknown):
+                    self.counts['skipped'] = self.counts.get('skipped', 0) + 1
+                    continue
+            yield n, row
+
+    def _record(self, checkpoint, result):
+        checkpoint.record(result)
+        self.counts[result['state']] = self.counts.get(result['state'], 0) + 1
+
+    def _run(self, units, send, result_id=None):
+        # units are (rows, payload) with rows a list of (row number, key); send(payload) makes the one call
+        checkpoint = Checkpoint(self.results_path)
+        try:
+            def call(unit):
+                rows, payload = unit
+                checkpoint.mark_submitted([n for n, key in rows])
+                return send(payload)
+
+            for (rows, payload), resp, error in bounded_map(call, units(checkpoint), self.max_workers,
+                                                            ordered=False):
+                for n, key in rows:
+                    result = {'row': n, 'key': key}
+                    if error is not None:
+                        result.update(state='unknown' if isinstance(error, TransportError) else 'failed',
+                                      status=None, error=str(error))
+                    elif resp.ok:
+                        result.update(state='ok', status=resp.status)
+                        if result_id:
+                            # created either way; a body without an id only means the row can't be referred to
+                            try:
+                                result['id'] = result_id(resp, n, key)
+                            except (ValueError, AttributeError, TypeError):
+                                result.update(id=None, error='no id in the response')
+                    else:
+                        result.update(state='failed', status=resp.status, error=resp.error)
+                    self._record(checkpoint, result)
+        finally:
+            checkpoint.close()
+        return self.counts
+
+    def _invalid(self, checkpoint, n, key, errors):
+        self._record(checkpoint, {'row': n, 'key': key, 'state': 'failed', 'status': None,
+                                  'error': error_envelope(errors)})
+
+    def import_households(self, rows):
+        # rows are household dicts, optionally with a 'key' column that identifies them in the results (and lets a
+        # later stock import refer to them through household_key); POST /households for each
+        def units(checkpoint):
+            for n, row in self._pending(checkpoint, rows):
+                key = str(row.get('key', n))
+                household = {field: row[field] for field in HOUSEHOLD_FIELDS if field in row}
+                errors = validate_household(household)
+                if errors:
+                    self._invalid(checkpoint, n, key, errors)
+                    continue
+                yield [(n, key)], household
+
+        return self._run(units, self.client.post_household, lambda resp, n, key: resp.json().get('id'))
+
+    def import_stock(self, rows, household_keys=None, batch_size=100):
+        # rows are stock items plus household_id (or household_key, resolved through household_keys) and an
+        # optional list_id; consecutive rows for the same household and list go out as one POST .../stock
+        household_keys = household_keys or {}
+
+        def units(checkpoint):
+            batch, target = [], None
+            for n, row in self._pending(checkpoint, rows):
+                key = str(row.get('key', n))
+                household_id = row.get('household_id') or household_keys.get(row.get('household_key'))
+                item = {field: row[field] for field in STOCK_FIELDS if field in row}
+                for field in STOCK_INT_FIELDS:
+                    if isinstance(item.get(field), str) and item[field].lstrip('-').isdigit():
+                        item[field] = int(item[field])
+                errors = validate_stock_item(item)
+                if not household_id:
+                    errors.setdefault('household_id', []).append('required field' if not row.get('household_key')
+                                                                 else 'unknown household_key')
+                if errors:
+                    self._invalid(checkpoint, n, key, errors)
+                    continue
+
+                row_target = (household_id, row.get('list_id', 'main'))
+                if batch and (row_target != target or len(batch) >= batch_size):
+                    yield [(n_, key_) for n_, key_, item_ in batch], (target, [item_ for n_, key_, item_ in batch])
+                    batch = []
+                batch.append((n, key, item))
+                target = row_target
+            if batch:
+                yield [(n_, key_) for n_, key_, item_ in batch], (target, [item_ for n_, key_, item_ in batch])
+
+        def send(payload):
+            (household_id, list_id), items = payload
+            return self.client.post_stock(household_id, items, list_id)
+
+        return self._run(units, send)
@@ -0,0 +1,222 @@
+import json
+
+from saim.client import STOCK, STOCK_ITEM, TRANSACTIONS
+from saim.validation import TRANSACTION_TYPES
+
+# a local view of on_hand derived from the transaction histories:
+#
+#   ledger = Ledger()
+#   drifts = ledger.reconcile(client, household_id)     # fetch, ingest what's new, compare with the stock items
+#
+# every item keeps a cursor (how many of its transactions were applied) and the last transaction applied, so a
+# history fetched again only costs the transactions after the cursor. the api has no 'since' parameter, so the
+# response itself is still the whole history; everything after that is O(new transactions)
+
+
+class Drift:
+    __slots__ = ('key', 'on_hand', 'expected')
+
+    def __init__(self, key, on_hand, expected):
+        self.key = key
+        self.on_hand = on_hand
+        self.expected = expected
+
+    @property
+    def drift(self):
+        return self.on_hand - self.expected
+
+    def __repr__(self):
+        return 'Drift(%s on_hand=%s expected=%s)' % ('/'.join(self.key), self.on_hand, self.expected)
+
+
+class _Entry:
+    __slots__ = ('opening', 'balance', 'count', 'last', 'added', 'removed')
+
+    def __init__(self, opening=0):
+        self.opening = opening
+        self.balance = opening
+        self.count = 0
+        self.last = None
+        self.added = 0
+        self.removed = 0
+
+    def apply(self, transactions):
+        for transaction in transactions:
+            sign = TRANSACTION_TYPES.get(transaction.get('type'))
+            if sign is None:
+                raise ValueError('unknown transaction type: %r' % transaction.get('type'))
+            quantity = transaction.get('quantity', 0)
+            self.balance += sign * quantity
+            if sign > 0:
+                self.added += quantity
+            else:
+                self.removed += quantity
+        self.count += len(transactions)
+        if transactions:
+            self.last = transactions[-1]
+
+    def follows(self, history):
+        # whether history is what this entry applied so far plus (maybe) more
+        return self.count <= len(history) and (not self.count or history[self.count - 1] == self.last)
+
+    def copy(self):
+        entry = _Entry()
+        for field in self.__slots__:
+            setattr(entry, field, getattr(self, field))
+        return entry
+
+
+class Ledger:
+    # keys are (household_id, list_id, stock_id)
+    def __init__(self):
+        self._entries = {}
+        self.replays = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def open(self, key, opening=0):
+        # starts (or restarts) an item at an opening balance: the on_hand it had before its first transaction
+        self._entries[key] = _Entry(opening)
+
+    def forget(self, key):
+        self._entries.pop(key, None)
+
+    def append(self, key, transactions):
+        # a batch of transactions known to be new, e.g. the ones this process just posted
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+        entry.apply(list(transactions))
+
+    def ingest(self, key, history):
+        # the full history as returned by GET .../transactions; applies the part after the cursor and returns it.
+        # histories are append-only, so the transaction at the cursor must be the one applied last; if it isn't (the
+        # item was deleted and created again) the item is replayed from its opening balance
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry()
+        if not entry.follows(history):
+            self.replays += 1
+            entry = self._entries[key] = _Entry(entry.opening)
+        new = history[entry.count:]
+        entry.apply(new)
+        return new
+
+    def balance(self, key):
+        return self._entries[key].balance
+
+    def totals(self, key):
+        entry = self._entries[key]
+        return {'opening': entry.opening, 'added': entry.added, 'removed': entry.removed, 'balance': entry.balance,
+                'transactions': entry.count}
+
+    def check(self, key, on_hand):
+        # a Drift when the server's on_hand isn't what the transactions add up to, else None
+        expected = self._entries[key].balance
+        if on_hand != expected:
+            return Drift(key, on_hand, expected)
+        return None
+
+    def reconcile(self, client, household_id, list_id='main', max_workers=8, attempts=3):
+        # fetches the stock list and every item's history (concurrently), ingests them and returns the drifts.
+        # an item seen for the first time is opened at on_hand minus its history, so drift is what changed
+        # afterwards without a transaction: a PUT of on_hand, a re-POST of the item, or a lost transaction
+        #
+        # the list is read before the histories, so a transaction posted in between looks like drift (or skews an
+        # opening). a first sighting or a mismatch is read again, the item between two reads of its history, until
+        # both reads have the same number of transactions; one that doesn't settle within `attempts` is left alone
+        # until the next reconcile. nothing is applied unless every fetch succeeded
+        params = {'household_id': household_id, 'list_id': list_id}
+        items = {item['id']: item for item in client.request_json('GET', STOCK, params)}
+
+        def fetch(stock_id):
+            return client.request_json('GET', TRANSACTIONS, dict(params, stock_id=stock_id))
+
+        def settle(stock_id):
+            for _ in range(attempts):
+                before = fetch(stock_id)
+                item = client.request_json('GET', STOCK_ITEM, dict(params, stock_id=stock_id))
+                history = fetch(stock_id)
+                if len(history) == len(before):
+                    return item.get('on_hand', 0), history
+            return None
+
+        histories = {}
+        for stock_id, history, error in client.map(fetch, list(items), max_workers):
+            if error is not None:
+                raise error
+            histories[stock_id] = (items[stock_id].get('on_hand', 0), history)
+
+        def stage(stock_id, history):
+            # the entry the item would have after this history (applied to a copy) and whether it was replayed
+            entry = self._entries.get((household_id, list_id, stock_id))
+            if entry is None:
+                entry = _Entry()
+            elif entry.follows(history):
+                entry = entry.copy()
+            else:
+                entry = _Entry(entry.opening)
+                entry.apply(history)
+                return entry, True
+            entry.apply(history[entry.count:])
+            return entry, False
+
+        staged = {}
+        suspects = []
+        for stock_id, (on_hand, history) in histories.items():
+            staged[stock_id] = stage(stock_id, history)
+            if (household_id, list_id, stock_id) not in self._entries or staged[stock_id][0].balance != on_hand:
+                suspects.append(stock_id)
+        for stock_id, settled, error in client.map(settle, suspects, max_workers):
+            if error is not None:
+                raise error
+            if settled is None:
+                del staged[stock_id]
+            else:
+                histories[stock_id] = settled
+                staged[stock_id] = stage(stock_id, settled[1])
+
+        drifts = []
+        for stock_id, (entry, replayed) in staged.items():
+            key = (household_id, list_id, stock_id)
+            on_hand = histories[stock_id][0]
+            if key not in self._entries:
+                entry.opening = on_hand - entry.balance
+                entry.balance = on_hand
+            elif entry.balance != on_hand:
+                drifts.append(Drift(key, on_hand, entry.balance))
+            self.replays += replayed
+            self._entries[key] = entry
+        for key in [k for k in self._entries if k[:2] == (household_id, list_id) and k[2] not in items]:
+            del self._entries[key]
+        return drifts
+
+    def to_dict(self):
+        # keys are json lists, since ids may contain any character
+        return {json.dumps(key): {'opening': e.opening, 'balance': e.balance, 'count': e.count, 'last': e.last,
+                                  'added': e.added, 'removed': e.removed}
+                for key, e in self._entries.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        ledger = cls()
+        for name, state in data.items():
+            entry = _Entry()
+            for field, value in state.items():
+                setattr(entry, field, value)
+            # files saved before keys were json lists joined them with '|'
+            ledger._entries[tuple(json.loads(name) if name.startswith('[') else name.split('|'))] = entry
+        return ledger
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
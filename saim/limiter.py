@@ -0,0 +1,172 @@
+import threading
+import time
+
+from saim.client import template_for
+from saim.errors import NotSentError, TransportError
+
+# holds the requests in flight to each endpoint to a limit that follows how the api copes, instead of a fixed worker
+# count that either leaves the api idle or piles onto it when it slows down:
+#
+#   client = Client(api_key, transport='pooled', limiter=True)         # or limiter=AdaptiveLimiter(initial=4, ...)
+#   client.map(client.get_household, household_ids, max_workers=64)     # the limits decide how many run at once
+#   client.limiter.stats()                                              # {'GET /households/{household_id}': {...}}
+#
+# additive increase, multiplicative decrease, per endpoint template. a request that finds its endpoint at the limit
+# waits for a slot (for as long as it takes, or slot_timeout seconds and then NotSentError). an answer that came back
+# while at least half the limit was in use raises the limit by 1/limit, so by one per limit's worth of answers. an
+# overload answer (429, 502, 503, 504), no answer at all, or a smoothed latency above tolerance * the endpoint's latency
+# without load (+ slack, for the jitter of fast endpoints) cuts it by backoff. requests that were already in flight when
+# the limit was cut don't cut it again: they all saw the same overload, and the latency gets a limit's worth of answers
+# to come down before it counts again. the latency without load is the lowest of the last window or two of answers, so a
+# lasting slowdown becomes the new normal instead of pinning the limit at min_limit
+
+OVERLOADED = (429, 502, 503, 504)
+
+
+class Limit:
+    # the limit of one endpoint
+    def __init__(self, method, template, initial, min_limit, max_limit, backoff, tolerance, slack, window, smoothing):
+        self.method = method
+        self.template = template
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.slack = slack
+        self.window = window
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.waiting = 0
+        self.latency = None
+        self.baseline = None
+        self.increases = 0
+        self.decreases = 0
+        self.overloads = 0
+        self._samples = 0
+        self._window_min = float('inf')
+        self._previous_min = float('inf')
+        self._cut_at = 0.0
+        self._settling = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        # takes a slot and returns when (perf_counter), or None when none came free within timeout seconds
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                self.waiting += 1
+                try:
+                    if not self._cond.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                        return None
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            return time.perf_counter()
+
+    def release(self, started, latency=None, overloaded=False):
+        # gives back the slot taken at started; latency None is no signal either way (the request failed on our side)
+        with self._cond:
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            if overloaded:
+                self.overloads += 1
+                self._cut(started)
+            elif latency is not None:
+                self._sample(latency)
+                if self._settling:
+                    self._settling -= 1
+                elif self.latency > self.tolerance * self.baseline + self.slack:
+                    self._cut(started)
+                elif in_flight * 2 >= self.limit and self.limit < self.max_limit:
+                    self.limit = min(self.limit + 1.0 / self.limit, float(self.max_limit))
+                    self.increases += 1
+            free = int(self.limit) - self.in_flight
+            if free > 0:
+                self._cond.notify(free)
+
+    def _sample(self, latency):
+        self._samples += 1
+        self._window_min = min(self._window_min, latency)
+        if self._samples % self.window == 0:
+            self._previous_min, self._window_min = self._window_min, float('inf')
+        self.baseline = min(self._previous_min, self._window_min)
+        self.latency = latency if self.latency is None else self.latency + self.smoothing * (latency - self.latency)
+
+    def _cut(self, started):
+        if started < self._cut_at:
+            return
+        self.limit = max(self.limit * self.backoff, float(self.min_limit))
+        self.decreases += 1
+        self._cut_at = time.perf_counter()
+        # the queues built up at the old limit take a while to drain
+        self._settling = int(self.limit)
+
+    def to_dict(self):
+        with self._cond:
+            return {'limit': int(self.limit), 'in_flight': self.in_flight, 'waiting': self.waiting,
+                    'latency': self.latency, 'baseline': self.baseline, 'increases': self.increases,
+                    'decreases': self.decreases, 'overloads': self.overloads}
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial=8, min_limit=1, max_limit=64, backoff=0.7, tolerance=2.0, slack=0.005, window=200,
+                 smoothing=0.2, slot_timeout=None):
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.slack = slack
+        self.window = window
+        self.smoothing = smoothing
+        # separate from the request timeout: with many more workers than the limit, waiting is the normal case
+        self.slot_timeout = slot_timeout
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def limit_for(self, method, template):
+        key = (method, template)
+        limit = self._limits.get(key)
+        if limit is None:
+            with self._lock:
+                limit = self._limits.get(key)
+                if limit is None:
+                    limit = self._limits[key] = Limit(method, template, self.initial, self.min_limit, self.max_limit,
+                                                      self.backoff, self.tolerance, self.slack, self.window,
+                                                      self.smoothing)
+        return limit
+
+    def limits(self):
+        # [Limit, ...] of the endpoints seen so far
+        with self._lock:
+            return list(self._limits.values())
+
+    def stats(self):
+        return {limit.method + ' ' + limit.template: limit.to_dict() for limit in self.limits()}
+
+
+class LimitingTransport:
+    # wraps another transport and holds each endpoint to its limiter's limit
+    def __init__(self, transport, limiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    def send(self, request, timeout=None):
+        limit = self.limiter.limit_for(request.method, request.template or template_for(request.url))
+        started = limit.acquire(self.limiter.slot_timeout)
+        if started is None:
+            raise NotSentError('no slot for %s %s within %ss (limit %d)' % (
+                limit.method, limit.template, self.limiter.slot_timeout, int(limit.limit)))
+        try:
+            resp = self.transport.send(request, timeout)
+        except TransportError:
+            limit.release(started, overloaded=True)
+            raise
+        except BaseException:
+            limit.release(started)
+            raise
+        limit.release(started, time.perf_counter() - started, resp.status in OVERLOADED)
+        return resp
+
+    def close(self):
+        self.transport.close()
@@ -0,0 +1,403 @@
+import bisect
+import http.server
+import threading
+import time
+
+from saim.client import template_for
+from saim.errors import TransportError
+
+# client metrics in the prometheus text format:
+#
+#   client = Client(api_key, transport='pooled', metrics=True)       # or metrics=Registry() to share one
+#   server = MetricsServer(client.metrics, port=9464).start()          # GET http://127.0.0.1:9464/metrics
+#   client.metrics.render()                                           # the same text without the server
+#
+# per endpoint template: requests by status and control_code, transport errors, latency histograms and requests in
+# flight; read when scraped: the connection pool (opened, closed, idle, in use, retried), the entity cache (hits,
+# misses, hit ratio, bytes, evictions), the contract checks and the adaptive concurrency limits.
+#
+# recording takes no lock: every thread counts into its own shard, and a scrape adds the shards up. a thread's shard
+# is folded into a common one once the thread is gone
+#
+# clients sharing a registry add up: their samples are summed, a pool, cache or limiter they share is read once, and
+# the ratios are worked out from the sums. a client's readings stop when it is closed; its counters keep their last
+# values
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Shard:
+    __slots__ = ('thread', 'values', 'histograms')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.values = {}
+        self.histograms = {}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Registry:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._families = {}
+        self._collectors = {}
+        self._derived = {}
+        self._shards = []
+        self._retired = _Shard(None)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    #
+    # families
+    #
+    def _declare(self, kind, name, help, labels):
+        family = (kind, help, tuple(labels))
+        existing = self._families.setdefault(name, family)
+        if existing[0] != kind or existing[2] != family[2]:
+            raise ValueError('%s is already registered as a %s with labels %s' % (name, existing[0], existing[2]))
+        return name
+
+    def counter(self, name, help, labels=()):
+        return self._declare('counter', name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._declare('gauge', name, help, labels)
+
+    def histogram(self, name, help, labels=()):
+        return self._declare('histogram', name, help, labels)
+
+    def register(self, collector, owner=None, source=None):
+        # collector() -> iterable of (name, label values, value) of declared counters and gauges, read at scrape time.
+        # source is what it reads: a source registered again (by another owner) is still read once
+        with self._lock:
+            owners = self._collectors.setdefault(collector if source is None else source, (collector, []))[1]
+            owners.append(owner)
+
+    def unregister(self, owner):
+        # drops the collectors owner registered that no other owner shares; their counters keep their last reading
+        with self._lock:
+            gone = []
+            for key, (collector, owners) in list(self._collectors.items()):
+                if any(o is owner for o in owners):
+                    owners[:] = [o for o in owners if o is not owner]
+                    if not owners:
+                        del self._collectors[key]
+                        gone.append(collector)
+        for collector in gone:
+            samples = [(name, tuple(labels), value) for name, labels, value in collector()
+                       if self._families[name][0] == 'counter']
+            with self._lock:
+                values = self._retired.values
+                for name, labels, value in samples:
+                    values[(name, labels)] = values.get((name, labels), 0) + value
+
+    def derive(self, name, fn):
+        # a gauge worked out at scrape time from the summed samples: fn({(name, labels): value}) -> value, or None
+        # to leave it out
+        with self._lock:
+            self._derived[name] = fn
+
+    #
+    # recording
+    #
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, labels=(), value=1):
+        # counters, and gauges with a negative value; labels are the label values in declared order
+        values = self._shard().values
+        key = (name, labels)
+        values[key] = values.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        counts = histograms.get(key)
+        if counts is None:
+            # one count per bucket, one for +Inf, then the sum
+            counts = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    #
+    # scraping
+    #
+    @staticmethod
+    def _merge(into, shard):
+        # dict() and list() of another thread's dicts and lists are single steps under the gil
+        for key, value in dict(shard.values).items():
+            into.values[key] = into.values.get(key, 0) + value
+        for key, counts in dict(shard.histograms).items():
+            merged = into.histograms.get(key)
+            if merged is None:
+                into.histograms[key] = list(counts)
+            else:
+                into.histograms[key] = [a + b for a, b in zip(merged, counts)]
+
+    def collect(self):
+        # everything recorded so far as one shard
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = live
+            collectors = [collector for collector, _ in self._collectors.values()]
+            derived = list(self._derived.items())
+        total = _Shard(None)
+        self._merge(total, self._retired)
+        for shard in live:
+            self._merge(total, shard)
+        for collector in collectors:
+            for name, labels, value in collector():
+                key = (name, tuple(labels))
+                total.values[key] = total.values.get(key, 0) + value
+        for name, fn in derived:
+            value = fn(total.values)
+            if value is not None:
+                total.values[(name, ())] = value
+        return total
+
+    def value(self, name, labels=()):
+        return self.collect().values.get((name, tuple(labels)), 0)
+
+    def render(self):
+        total = self.collect()
+        by_family = {}
+        for (name, labels), value in total.values.items():
+            by_family.setdefault(name, []).append((labels, value))
+        for (name, labels), counts in total.histograms.items():
+            by_family.setdefault(name, []).append((labels, counts))
+
+        lines = []
+        for name in sorted(by_family):
+            kind, help, label_names = self._families[name]
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for labels, value in sorted(by_family[name], key=lambda entry: entry[0]):
+                if kind != 'histogram':
+                    lines.append('%s%s %s' % (name, _labels(label_names, labels), _number(value)))
+                    continue
+                cumulative = 0
+                for le, count in zip(self.buckets + (float('inf'),), value):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (name, _labels(label_names, labels, 'le="%s"' % _number(le)),
+                                                     cumulative))
+                lines.append('%s_sum%s %s' % (name, _labels(label_names, labels), _number(value[-1])))
+                lines.append('%s_count%s %d' % (name, _labels(label_names, labels), cumulative))
+        return '\n'.join(lines) + '\n'
+
+
+#
+# the client's metrics
+#
+REQUESTS = 'saim_requests_total'
+ERRORS = 'saim_transport_errors_total'
+DURATION = 'saim_request_duration_seconds'
+IN_FLIGHT = 'saim_requests_in_flight'
+
+
+def declare(registry):
+    endpoint = ('method', 'endpoint')
+    registry.counter(REQUESTS, 'Responses by endpoint template, http status and SAIM control_code.',
+                     endpoint + ('status', 'control_code'))
+    registry.counter(ERRORS, 'Requests that got no response (connection failures, timeouts).', endpoint)
+    registry.histogram(DURATION, 'Time from sending a request to having its whole response, in seconds.', endpoint)
+    registry.gauge(IN_FLIGHT, 'Requests sent and not yet answered.', endpoint)
+    registry.counter('saim_pool_connections_opened_total', 'Connections the pool opened.')
+    registry.counter('saim_pool_connections_closed_total', 'Connections the pool closed.')
+    registry.counter('saim_pool_connections_reused_total', 'Requests sent on an idle pooled connection.')
+    registry.counter('saim_pool_retries_total', 'Requests resent after a pooled connection turned out closed.')
+    registry.gauge('saim_pool_connections', 'Pooled connections by state.', ('state',))
+    registry.gauge('saim_pool_utilization', 'Connections in use over connections open.')
+    registry.counter('saim_cache_hits_total', 'Entity cache hits.')
+    registry.counter('saim_cache_misses_total', 'Entity cache misses.')
+    registry.counter('saim_cache_evictions_total', 'Entity cache entries evicted to stay within max_bytes.')
+    registry.counter('saim_cache_invalidations_total', 'Entity cache entries dropped by writes.')
+    registry.gauge('saim_cache_hit_ratio', 'Entity cache hits over lookups.')
+    registry.gauge('saim_cache_bytes', 'Estimated bytes held by the entity cache.')
+    registry.counter('saim_contract_checks_total', 'Responses checked against their contract.')
+    registry.counter('saim_contract_violations_total', 'Responses that broke their contract.')
+    registry.gauge('saim_concurrency_limit', 'Requests the adaptive limiter lets in flight at once.', endpoint)
+    registry.gauge('saim_concurrency_waiting', 'Requests waiting for a slot under the adaptive limit.', endpoint)
+    registry.counter('saim_concurrency_decreases_total', 'Times the adaptive limit was cut.', endpoint)
+    registry.derive('saim_pool_utilization', _utilization)
+    registry.derive('saim_cache_hit_ratio', _hit_ratio)
+    return registry
+
+
+def _utilization(values):
+    in_use = values.get(('saim_pool_connections', ('in_use',)))
+    if in_use is None:
+        return None
+    open_ = in_use + values.get(('saim_pool_connections', ('idle',)), 0)
+    return in_use / open_ if open_ else 0.0
+
+
+def _hit_ratio(values):
+    hits = values.get(('saim_cache_hits_total', ()))
+    if hits is None:
+        return None
+    lookups = hits + values.get(('saim_cache_misses_total', ()), 0)
+    return hits / lookups if lookups else 0.0
+
+
+class MetricsTransport:
+    # wraps another transport and records every request it sends
+    def __init__(self, transport, registry):
+        self.transport = transport
+        self.registry = declare(registry)
+
+    def send(self, request, timeout=None):
+        registry = self.registry
+        labels = (request.method, request.template or template_for(request.url))
+        registry.inc(IN_FLIGHT, labels)
+        start = time.perf_counter()
+        try:
+            resp = self.transport.send(request, timeout)
+        except TransportError:
+            registry.inc(ERRORS, labels)
+            raise
+        finally:
+            registry.observe(DURATION, labels, time.perf_counter() - start)
+            registry.inc(IN_FLIGHT, labels, -1)
+        control_code = ''
+        if resp.status >= 400:
+            try:
+                error = resp.error
+            except ValueError:
+                error = None
+            if isinstance(error, dict):
+                control_code = str(error.get('control_code', ''))
+        registry.inc(REQUESTS, labels + (str(resp.status), control_code))
+        return resp
+
+    def close(self):
+        self.transport.close()
+
+
+def instrument(client, registry):
+    # scrape-time readings of whatever the client has: a connection pool, an entity cache, contract checks, limits.
+    # registered for the client, so closing it unregisters them
+    transport, pool, checker = client.transport, None, None
+    while transport is not None:
+        if pool is None and hasattr(transport, 'stats') and hasattr(transport, 'retries'):
+            pool = transport
+        if checker is None and hasattr(transport, 'violations'):
+            checker = transport
+        transport = getattr(transport, 'transport', None)
+
+    if pool is not None:
+        def pool_stats():
+            stats = pool.stats()
+            return [('saim_pool_connections_opened_total', (), stats['opened']),
+                    ('saim_pool_connections_closed_total', (), stats['closed']),
+                    ('saim_pool_connections_reused_total', (), stats['reused']),
+                    ('saim_pool_retries_total', (), stats['retries']),
+                    ('saim_pool_connections', ('idle',), stats['idle']),
+                    ('saim_pool_connections', ('in_use',), stats['in_use'])]
+        registry.register(pool_stats, client, pool)
+
+    if client.cache is not None:
+        cache = client.cache
+
+        def cache_stats():
+            stats = cache.stats()
+            return [('saim_cache_hits_total', (), stats['hits']), ('saim_cache_misses_total', (), stats['misses']),
+                    ('saim_cache_evictions_total', (), stats['evictions']),
+                    ('saim_cache_invalidations_total', (), stats['invalidations']),
+                    ('saim_cache_bytes', (), stats['bytes'])]
+        registry.register(cache_stats, client, cache)
+
+    if checker is not None:
+        registry.register(lambda: [('saim_contract_checks_total', (), checker.checked),
+                                   ('saim_contract_violations_total', (), checker.violations)], client, checker)
+
+    if client.limiter is not None:
+        limiter = client.limiter
+
+        def limits():
+            samples = []
+            for limit in limiter.limits():
+                labels = (limit.method, limit.template)
+                samples += [('saim_concurrency_limit', labels, int(limit.limit)),
+                            ('saim_concurrency_waiting', labels, limit.waiting),
+                            ('saim_concurrency_decreases_total', labels, limit.decreases)]
+            return samples
+        registry.register(limits, client, limiter)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    # the registry for a prometheus scraper. binds to localhost unless told otherwise
+    def __init__(self, registry, host='127.0.0.1', port=9464):
+        handler = type('BoundHandler', (_Handler,), {'registry': registry})
+        self.httpd = _HTTPServer((host, port), handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://%s:%d/metrics' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
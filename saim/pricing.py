@@ -0,0 +1,168 @@
+from saim.client import PRODUCTS, STOCK
+
+# optional: pip install saim-python-sdk[analytics]
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# what restocking many households costs, priced from the product catalog:
+#
+#   stock, prices = collect(client, household_ids)       # or StockColumns.from_lists / PriceTable.from_products
+#   cart = restock(stock, prices)
+#   cart.totals()                                        # {'households': ..., 'items': ..., 'units': ..., 'cost': ...}
+#   cart.per_household()['1001']                         # {'items': 2, 'units': 7, 'cost': 311.85, 'unpriced': 0}
+#   for line in cart.lines(): ...                        # one per item to restock
+#
+# an item is restocked once what it has and has coming (on_hand + on_order) is below its min, up to its max (or its
+# min, if max is missing or lower). stock ids are product ids; items the catalog has no price for are counted as
+# unpriced and cost nothing. stock lists and the catalog are flattened once into columns; pricing is a searchsorted
+# of the distinct stock ids into the sorted product ids, gathered out to the items, and the totals are bincounts, in
+# whole cents so they add up exactly. flattening is a python pass over the items; everything after it is numpy, so
+# pricing the same stock against another catalog, or again after a price change, is a fraction of the first time
+
+CENTS = 100
+
+
+def available():
+    return np is not None
+
+
+def _require():
+    if np is None:
+        raise ImportError('saim.pricing needs numpy')
+
+
+class PriceTable:
+    # product ids and prices as columns sorted by id. a product listed twice keeps its first price
+    def __init__(self, ids, prices):
+        _require()
+        ids = np.asarray(ids, dtype=str)
+        cents = np.rint(np.asarray(prices, dtype=np.float64) * CENTS).astype(np.int64)
+        order = np.argsort(ids, kind='stable')
+        self.ids = ids[order]
+        self.cents = cents[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_products(cls, products):
+        # the products as GET /products returns them; those without a price are left out
+        priced = [product for product in products if product.get('price') is not None]
+        return cls([product['id'] for product in priced], [product['price'] for product in priced])
+
+    def lookup(self, ids):
+        # (cents, found) per id; cents is 0 where the id isn't in the table
+        ids = np.asarray(ids, dtype=str)
+        if not len(self.ids):
+            return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+        index = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        found = self.ids[index] == ids
+        return np.where(found, self.cents[index], 0), found
+
+
+class StockColumns:
+    # the items of many stock lists as columns: item i belongs to household_ids[household[i]] and is the product
+    # products[product[i]], so pricing looks up every distinct product once however many lists hold it
+    def __init__(self, household_ids, household, products, product, on_hand, on_order, minimum, maximum):
+        _require()
+        self.household_ids = list(household_ids)
+        self.household = np.asarray(household, dtype=np.int64)
+        self.products = np.asarray(products, dtype=str)
+        self.product = np.asarray(product, dtype=np.int64)
+        self.on_hand = np.asarray(on_hand, dtype=np.int64)
+        self.on_order = np.asarray(on_order, dtype=np.int64)
+        self.minimum = np.asarray(minimum, dtype=np.int64)
+        self.maximum = np.asarray(maximum, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.product)
+
+    @classmethod
+    def from_lists(cls, stock_lists):
+        # {household_id: [item, ...]}, the items as GET .../stock returns them; missing counts are 0
+        _require()
+        lengths = [len(items) for items in stock_lists.values()]
+        flat = [item for items in stock_lists.values() for item in items]
+        codes = {}
+        product = [codes.setdefault(item['id'], len(codes)) for item in flat]
+
+        def column(field):
+            return np.array([item.get(field) or 0 for item in flat], dtype=np.int64)
+
+        household = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+        return cls(stock_lists, household, list(codes), product, column('on_hand'), column('on_order'),
+                   column('min'), column('max'))
+
+
+class Cart:
+    # quantity[i] units of stock item i at unit_cents[i] each; priced[i] is False where the catalog has no price
+    def __init__(self, stock, quantity, unit_cents, priced):
+        self.stock = stock
+        self.quantity = quantity
+        self.unit_cents = unit_cents
+        self.priced = priced
+        self.cost_cents = quantity * unit_cents
+
+    def _sum(self, weights):
+        # per household
+        sums = np.bincount(self.stock.household, weights=weights, minlength=len(self.stock.household_ids))
+        return np.rint(sums).astype(np.int64)
+
+    def per_household(self):
+        # {household_id: {'items', 'units', 'cost', 'unpriced'}} for every household, also those with nothing to buy
+        needed = self.quantity > 0
+        items = self._sum(needed)
+        units = self._sum(self.quantity)
+        cents = self._sum(self.cost_cents)
+        unpriced = self._sum(needed & ~self.priced)
+        return {household_id: {'items': int(items[n]), 'units': int(units[n]), 'cost': int(cents[n]) / CENTS,
+                               'unpriced': int(unpriced[n])}
+                for n, household_id in enumerate(self.stock.household_ids)}
+
+    def totals(self):
+        needed = self.quantity > 0
+        return {'households': int(np.unique(self.stock.household[needed]).size), 'items': int(needed.sum()),
+                'units': int(self.quantity.sum()), 'cost': int(self.cost_cents.sum()) / CENTS,
+                'unpriced': int((needed & ~self.priced).sum())}
+
+    def lines(self):
+        # a dict per item to restock, in stock order
+        stock = self.stock
+        for i in np.flatnonzero(self.quantity):
+            yield {'household_id': stock.household_ids[stock.household[i]],
+                   'stock_id': str(stock.products[stock.product[i]]),
+                   'quantity': int(self.quantity[i]),
+                   'price': int(self.unit_cents[i]) / CENTS if self.priced[i] else None,
+                   'cost': int(self.cost_cents[i]) / CENTS}
+
+
+def restock_quantities(on_hand, on_order, minimum, maximum):
+    # units to order per item: up to max (at least min) once on_hand + on_order is below min, else 0
+    _require()
+    position = np.asarray(on_hand, dtype=np.int64) + np.asarray(on_order, dtype=np.int64)
+    minimum = np.asarray(minimum, dtype=np.int64)
+    target = np.maximum(np.asarray(maximum, dtype=np.int64), minimum)
+    return np.where(position < minimum, target - position, 0)
+
+
+def restock(stock, prices):
+    quantity = restock_quantities(stock.on_hand, stock.on_order, stock.minimum, stock.maximum)
+    cents, priced = prices.lookup(stock.products)
+    return Cart(stock, quantity, cents[stock.product], priced[stock.product])
+
+
+def collect(client, household_ids, list_id='main', max_workers=8):
+    # fetches the households' stock lists and the catalog; returns (stock, prices)
+    _require()
+
+    def fetch_stock(household_id):
+        return client.request_json('GET', STOCK, {'household_id': household_id, 'list_id': list_id})
+
+    stock_lists = {}
+    for household_id, items, error in client.map(fetch_stock, household_ids, max_workers):
+        if error is not None:
+            raise error
+        stock_lists[household_id] = items
+    return StockColumns.from_lists(stock_lists), PriceTable.from_products(client.request_json('GET', PRODUCTS))
@@ -0,0 +1,202 @@
+import contextlib
+import functools
+import json
+import platform
+import sys
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+# profiling mode for the unittests: every test's wall time split into
+#   build          json.dumps of the request body and building the urllib Request
+#   network        urlopen and reading the response body
+#   decode_assert  everything else: json.loads of the response (also reported on its own as json_decode), the
+#                  assertions and the test's own code
+# run with SAIM_PROFILE=<artifact.json> python tests/unittests_plus.py, or
+#   python -m saim.profiling tests.unittests_plus [--top N] [--output profile.json]
+#   python -m saim.profiling --compare old.json new.json
+
+
+class _Phases:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.times = {'build': 0.0, 'network': 0.0, 'json_decode': 0.0}
+        self.requests = 0
+        self._active = False
+
+    def timed(self, phase, fn):
+        # only the outermost instrumented call is counted, so e.g. a cassette's json.loads inside urlopen stays network
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if self._active:
+                return fn(*args, **kwargs)
+            self._active = True
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.times[phase] += time.perf_counter() - start
+                self._active = False
+        return wrapper
+
+
+@contextlib.contextmanager
+def instrument(phases):
+    urlopen = urllib.request.urlopen
+    request_init = urllib.request.Request.__init__
+    dumps, loads = json.dumps, json.loads
+
+    def timed_read(resp):
+        resp.read = phases.timed('network', resp.read)
+        return resp
+
+    def timed_urlopen(*args, **kwargs):
+        phases.requests += 1
+        try:
+            return timed_read(urlopen(*args, **kwargs))
+        except urllib.error.HTTPError as e:
+            timed_read(e)
+            raise
+
+    urllib.request.urlopen = phases.timed('network', timed_urlopen)
+    urllib.request.Request.__init__ = phases.timed('build', request_init)
+    json.dumps = phases.timed('build', dumps)
+    json.loads = phases.timed('json_decode', loads)
+    try:
+        yield phases
+    finally:
+        urllib.request.urlopen = urlopen
+        urllib.request.Request.__init__ = request_init
+        json.dumps, json.loads = dumps, loads
+
+
+def test_name(test):
+    return '%s.%s' % (type(test).__name__, getattr(test, '_testMethodName', str(test)))
+
+
+class ProfilingTestResult(unittest.TextTestResult):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.phases = _Phases()
+        self.profiles = []
+        self._instrument = None
+
+    def startTest(self, test):
+        self.phases.reset()
+        self._outcome = 'ok'
+        self._instrument = instrument(self.phases)
+        self._instrument.__enter__()
+        self._start = time.perf_counter()
+        super().startTest(test)
+
+    def stopTest(self, test):
+        total = time.perf_counter() - self._start
+        self._instrument.__exit__(None, None, None)
+        times = self.phases.times
+        self.profiles.append({
+            'test': test_name(test),
+            'outcome': self._outcome,
+            'total': total,
+            'build': times['build'],
+            'network': times['network'],
+            'decode_assert': max(total - times['build'] - times['network'], 0.0),
+            'json_decode': times['json_decode'],
+            'requests': self.phases.requests
+        })
+        super().stopTest(test)
+
+    def addFailure(self, test, err):
+        self._outcome = 'failure'
+        super().addFailure(test, err)
+
+    def addError(self, test, err):
+        self._outcome = 'error'
+        super().addError(test, err)
+
+    def addSkip(self, test, reason):
+        self._outcome = 'skipped'
+        super().addSkip(test, reason)
+
+
+def report(profiles, top=10, stream=sys.stderr):
+    stream.write('\nslowest %d tests (seconds)\n' % min(top, len(profiles)))
+    stream.write('%9s %9s %9s %9s  %s\n' % ('total', 'build', 'network', 'dec+asrt', 'test'))
+    for profile in sorted(profiles, key=lambda p: p['total'], reverse=True)[:top]:
+        stream.write('%9.4f %9.4f %9.4f %9.4f  %s\n' % (profile['total'], profile['build'], profile['network'],
+                                                        profile['decode_assert'], profile['test']))
+    totals = {phase: sum(p[phase] for p in profiles) for phase in ('total', 'build', 'network', 'decode_assert')}
+    stream.write('%9.4f %9.4f %9.4f %9.4f  all %d tests\n' % (totals['total'], totals['build'], totals['network'],
+                                                              totals['decode_assert'], len(profiles)))
+
+
+def write_artifact(profiles, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'python': platform.python_version(),
+                   'total': sum(p['total'] for p in profiles),
+                   'tests': profiles}, f, indent=1)
+
+
+class ProfilingTestRunner(unittest.TextTestRunner):
+    resultclass = ProfilingTestResult
+
+    def __init__(self, *args, top=10, artifact=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.top = top
+        self.artifact = artifact
+
+    def run(self, test):
+        result = super().run(test)
+        report(result.profiles, self.top, self.stream)
+        if self.artifact:
+            write_artifact(result.profiles, self.artifact)
+            self.stream.write('profile written to %s\n' % self.artifact)
+        return result
+
+
+def compare(old_path, new_path, threshold=0.2, stream=sys.stdout):
+    # per test change in total and network time between two artifacts; returns the tests that got slower by more
+    # than threshold (a fraction)
+    with open(old_path, encoding='utf-8') as f:
+        old = {p['test']: p for p in json.load(f)['tests']}
+    with open(new_path, encoding='utf-8') as f:
+        new = {p['test']: p for p in json.load(f)['tests']}
+
+    slower = []
+    stream.write('%9s %9s %8s %9s  %s\n' % ('old', 'new', 'change', 'network', 'test'))
+    for name in sorted(old.keys() & new.keys(), key=lambda n: new[n]['total'] - old[n]['total'], reverse=True):
+        before, after = old[name]['total'], new[name]['total']
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > threshold:
+            slower.append(name)
+            flag = '  <- slower'
+        stream.write('%9.4f %9.4f %+7.0f%% %+9.4f  %s%s\n' % (before, after, change * 100,
+                                                            new[name]['network'] - old[name]['network'], name, flag))
+    for name in sorted(new.keys() - old.keys()):
+        stream.write('%9s %9.4f %8s %9s  %s (new)\n' % ('', new[name]['total'], '', '', name))
+    return slower
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m saim.profiling')
+    parser.add_argument('tests', nargs='*', help='test modules, classes or methods, e.g. tests.unittests_plus')
+    parser.add_argument('--top', type=int, default=10, help='how many of the slowest tests to list')
+    parser.add_argument('--output', '-o', default='profile.json', help='json artifact to write')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two artifacts instead')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown flagged by --compare')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(args.compare[0], args.compare[1], args.threshold) else 0
+    suite = unittest.defaultTestLoader.loadTestsFromNames(args.tests)
+    result = ProfilingTestRunner(verbosity=2, top=args.top, artifact=args.output).run(suite)
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import collections
+import concurrent.futures
+import json
+import queue
+import socketserver
+import threading
+import time
+import urllib.parse
+
+from saim.client import PRODUCTS
+from saim.errors import TransportError
+from saim.validation import TRANSACTION_TYPES
+
+# barcode scans in, transactions out:
+#
+#   index = BarcodeIndex.load(client)                    # barcode -> stock id, from the barcode_url of every product
+#   ingestor = ScanIngestor(client, index).start()
+#   ingestor.submit({'household_id': '1001', 'barcode': '1207714220', 'type': 'remove'})
+#   with ScanServer(ingestor, port=7070): ...            # or one json scan per line over tcp
+#   ingestor.stats()                                     # counts and ingest-to-commit latency percentiles
+#
+# a scan is {'household_id', 'barcode', 'type' (add by default), 'quantity' (1 by default), 'list_id' (main)}.
+# scans are collected into micro-batches, closed after max_batch scans or max_delay seconds after the first one came
+# in; the scans of a batch for the same item and type become one transaction with the quantities summed, and the
+# transactions are posted max_workers at a time. a scanner firing the same item repeatedly costs one call per batch
+# instead of one per scan
+
+MAX_BATCH = 500
+MAX_DELAY = 0.05
+QUEUE_SIZE = 100000
+LATENCY_WINDOW = 10000
+PERCENTILES = (50, 90, 99, 99.9)
+
+_STOP = object()
+
+
+def barcode_of(product):
+    # the code= of the product's barcode_url, falling back to the product id
+    query = urllib.parse.urlsplit(product.get('barcode_url') or '').query
+    codes = urllib.parse.parse_qs(query).get('code')
+    return codes[0] if codes else product['id']
+
+
+class BarcodeIndex:
+    # barcode -> stock id. stock items are products on a list, so a product's id is the stock id of its item
+    def __init__(self, mapping=None):
+        self._ids = dict(mapping or {})
+
+    @classmethod
+    def from_products(cls, products):
+        return cls({barcode_of(product): product['id'] for product in products})
+
+    @classmethod
+    def load(cls, client):
+        return cls.from_products(client.request_json('GET', PRODUCTS))
+
+    def add(self, barcode, stock_id):
+        self._ids[barcode] = stock_id
+
+    def resolve(self, barcode):
+        return self._ids.get(barcode)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class Latencies:
+    # the most recent `window` latencies, for percentiles that follow the current load
+    def __init__(self, window=LATENCY_WINDOW):
+        self._values = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, seconds, times=1):
+        with self._lock:
+            self._values.extend([seconds] * times)
+            self.count += times
+
+    def percentiles(self, percentiles=PERCENTILES):
+        with self._lock:
+            values = sorted(self._values)
+        if not values:
+            return {}
+        # nearest rank
+        result = {'p%g' % p: values[min(len(values) - 1, max(0, int(len(values) * p / 100.0 + 0.5) - 1))]
+                  for p in percentiles}
+        result['max'] = values[-1]
+        return result
+
+
+class ScanIngestor:
+    def __init__(self, client, index, max_batch=MAX_BATCH, max_delay=MAX_DELAY, max_workers=8,
+                 queue_size=QUEUE_SIZE, clock=time.monotonic):
+        self.client = client
+        self.index = index
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_workers = max_workers
+        self.clock = clock
+        self.latencies = Latencies()
+        self.counts = collections.Counter()
+        self._queue = queue.Queue(queue_size)
+        # transactions in flight; once it is used up the batcher waits, the queue fills and submit() pushes back
+        self._slots = threading.BoundedSemaphore(2 * max_workers)
+        self._executor = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+
+    def start(self):
+        self._executor = concurrent.futures.ThreadPoolExecutor(self.max_workers)
+        self._thread = threading.Thread(target=self._run, name='scan-batcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, scan, block=True, timeout=None):
+        # False when the queue stayed full (the scan is counted as rejected)
+        with self._lock:
+            self._pending += 1
+        try:
+            self._queue.put((self.clock(), scan), block, timeout)
+        except queue.Full:
+            self._done('rejected')
+            return False
+        self._count('accepted')
+        return True
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+
+    def _done(self, state, n=1):
+        with self._lock:
+            self.counts[state] += n
+            self._pending -= n
+            if not self._pending:
+                self._idle.notify_all()
+
+    def flush(self, timeout=None):
+        # waits until every scan submitted so far is committed, failed or dropped; False on timeout
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def close(self, timeout=None):
+        # posts what is queued, then stops
+        if self._thread is not None:
+            self._queue.put((self.clock(), _STOP))
+            self._thread.join(timeout)
+            self._executor.shutdown(wait=True)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _run(self):
+        while True:
+            ingested, scan = self._queue.get()
+            if scan is _STOP:
+                return
+            batch = [(ingested, scan)]
+            deadline = ingested + self.max_delay
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - self.clock()
+                try:
+                    item = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item[1] is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _parse(self, scan):
+        # (household_id, list_id, stock_id, type, quantity) or the state the scan ends in
+        try:
+            household_id, barcode = str(scan['household_id']), str(scan['barcode'])
+            kind = scan.get('type', 'add')
+            quantity = scan.get('quantity', 1)
+        except (KeyError, TypeError, AttributeError):
+            return 'invalid'
+        if type(kind) is not str or kind not in TRANSACTION_TYPES or type(quantity) is not int or quantity < 1:
+            return 'invalid'
+        stock_id = self.index.resolve(barcode)
+        if stock_id is None:
+            return 'unknown_barcode'
+        return household_id, scan.get('list_id', 'main'), stock_id, kind, quantity
+
+    def _dispatch(self, batch):
+        groups = {}
+        for ingested, scan in batch:
+            parsed = self._parse(scan)
+            if isinstance(parsed, str):
+                self._done(parsed)
+                continue
+            group = groups.get(parsed[:4])
+            if group is None:
+                group = groups[parsed[:4]] = [0, []]
+            group[0] += parsed[4]
+            group[1].append(ingested)
+        self._count('batches')
+        for key, (quantity, ingested) in groups.items():
+            self._slots.acquire()
+            self._executor.submit(self._post, key, quantity, ingested)
+
+    def _post(self, key, quantity, ingested):
+        household_id, list_id, stock_id, kind = key
+        try:
+            resp = self.client.post_transaction(household_id, stock_id, {'type': kind, 'quantity': quantity},
+                                                list_id)
+        except TransportError:
+            state = 'unknown'
+        except Exception:
+            state = 'failed'
+        else:
+            state = 'committed' if resp.ok else 'failed'
+        finally:
+            self._slots.release()
+        if state == 'committed':
+            now = self.clock()
+            for t in ingested:
+                self.latencies.add(now - t)
+        self._count('transactions')
+        if state == 'committed':
+            self._count('transactions_committed')
+        self._done(state, len(ingested))
+
+    def stats(self):
+        # counts per outcome, how well batching folds scans into calls, and ingest-to-commit latency in seconds.
+        # scans_per_transaction is committed scans over committed transactions, what a successful call carries
+        with self._lock:
+            counts = dict(self.counts)
+        committed = counts.get('transactions_committed', 0)
+        return dict(counts, queued=self._queue.qsize(),
+                    scans_per_transaction=counts.get('committed', 0) / committed if committed else 0.0,
+                    latency=self.latencies.percentiles())
+
+
+class _ScanHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        ingestor = self.server.ingestor
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                scan = json.loads(line)
+            except ValueError:
+                ingestor._count('invalid')
+                continue
+            ingestor.submit(scan)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class ScanServer:
+    # newline delimited json scans over tcp, one connection per scanner or gateway. nothing is written back; when
+    # the ingestor falls behind, reads stop and tcp pushes back on the sender
+    def __init__(self, ingestor, host='127.0.0.1', port=0):
+        self.server = _TCPServer((host, port), _ScanHandler)
+        self.server.ingestor = ingestor
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.server.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
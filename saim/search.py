@@ -0,0 +1,158 @@
+import bisect
+import heapq
+import math
+import re
+
+from saim.client import PRODUCTS
+
+# title hits count for more than description hits when ranking
+FIELD_WEIGHTS = {'title': 2.0, 'description': 1.0}
+
+_token_re = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return _token_re.findall(text.casefold())
+
+
+class ProductIndex:
+    # in-process inverted index over the product dicts returned by GET /products
+    #
+    # postings map token -> {product_id: weight}; the sorted vocabulary makes prefix lookups a bisect instead of a
+    # scan, and each product remembers its own tokens so that updating or removing it only touches those postings
+    def __init__(self, products=None, fields=FIELD_WEIGHTS):
+        self.fields = dict(fields)
+        self.products = {}
+        self._postings = {}
+        self._vocab = []
+        self._doc_tokens = {}
+        if products:
+            self.update_many(products)
+
+    @classmethod
+    def from_client(cls, client, **kwargs):
+        return cls(client.request_json('GET', PRODUCTS), **kwargs)
+
+    def __len__(self):
+        return len(self.products)
+
+    def __contains__(self, product_id):
+        return product_id in self.products
+
+    def _weights(self, product):
+        weights = {}
+        for field, field_weight in self.fields.items():
+            for token in tokenize(product.get(field)):
+                weights[token] = weights.get(token, 0.0) + field_weight
+        return weights
+
+    def update(self, product):
+        # adds a new product or re-indexes a changed one; only the tokens that actually changed are touched
+        product_id = product['id']
+        new = self._weights(product)
+        old = self._doc_tokens.get(product_id, {})
+
+        for token in old.keys() - new.keys():
+            self._unpost(token, product_id)
+        for token, weight in new.items():
+            if old.get(token) == weight:
+                continue
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                bisect.insort(self._vocab, token)
+            postings[product_id] = weight
+
+        self._doc_tokens[product_id] = new
+        self.products[product_id] = product
+
+    def update_many(self, products):
+        # bulk loads are much faster if the vocabulary is sorted once at the end rather than insorted per token
+        vocab = set(self._vocab)
+        for product in products:
+            product_id = product['id']
+            new = self._weights(product)
+            for token in self._doc_tokens.get(product_id, {}).keys() - new.keys():
+                self._unpost(token, product_id, vocab)
+            for token, weight in new.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    vocab.add(token)
+                postings[product_id] = weight
+            self._doc_tokens[product_id] = new
+            self.products[product_id] = product
+        self._vocab = sorted(vocab)
+
+    def remove(self, product_id):
+        for token in self._doc_tokens.pop(product_id, {}):
+            self._unpost(token, product_id)
+        return self.products.pop(product_id, None)
+
+    def _unpost(self, token, product_id, vocab=None):
+        postings = self._postings[token]
+        postings.pop(product_id, None)
+        if not postings:
+            del self._postings[token]
+            if vocab is not None:
+                vocab.discard(token)
+            else:
+                i = bisect.bisect_left(self._vocab, token)
+                del self._vocab[i]
+
+    def expand(self, prefix):
+        # all indexed tokens starting with prefix
+        i = bisect.bisect_left(self._vocab, prefix)
+        j = bisect.bisect_left(self._vocab, prefix + '\U0010ffff')
+        return self._vocab[i:j]
+
+    def _idf(self, token):
+        return math.log(1.0 + len(self.products) / len(self._postings[token]))
+
+    def _term_scores(self, term, prefix):
+        tokens = self.expand(term) if prefix else ([term] if term in self._postings else [])
+        if len(tokens) == 1:
+            idf = self._idf(tokens[0])
+            return {product_id: weight * idf for product_id, weight in self._postings[tokens[0]].items()}
+
+        # a prefix that expands to several words scores a product by its best matching word
+        scores = {}
+        for token in tokens:
+            idf = self._idf(token)
+            for product_id, weight in self._postings[token].items():
+                score = weight * idf
+                if score > scores.get(product_id, 0.0):
+                    scores[product_id] = score
+        return scores
+
+    def search(self, query, limit=10, prefix=True):
+        # every query word has to match (the last one as a prefix, so this also works for type-ahead); returns
+        # [(product, score), ...] best first
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        last = terms[-1]
+        per_term = []
+        for term in dict.fromkeys(terms):
+            scores = self._term_scores(term, prefix and term == last)
+            if not scores:
+                return []
+            per_term.append(scores)
+        per_term.sort(key=len)
+
+        totals = per_term[0]
+        for scores in per_term[1:]:
+            totals = {product_id: score + scores[product_id]
+                      for product_id, score in totals.items() if product_id in scores}
+            if not totals:
+                return []
+
+        rank = lambda kv: (kv[1], kv[0])
+        if limit:
+            best = heapq.nlargest(limit, totals.items(), key=rank)
+        else:
+            best = sorted(totals.items(), key=rank, reverse=True)
+        return [(self.products[product_id], score) for product_id, score in best]
@@ -0,0 +1,95 @@
+import json
+import threading
+
+# request bodies for large arrays (stock items, transactions) without the full-size copies of
+# json.dumps(items).encode(): that builds the whole body as a str, then again as bytes, and the encoder's own chunks
+# before either. here the array is encoded a batch of items at a time straight into a bytearray that is kept and
+# reused, so the only full-size thing is the buffer itself, and it is sent as a memoryview of that buffer:
+#
+#   body = writer().dump(items)                        # memoryview, valid until this thread's next dump()
+#   body = writer().chunks(items, 64 * 1024)           # or streamed with Transfer-Encoding: chunked as it is built
+#
+# Client.post_stock uses dump() for lists, and chunks() with chunked=True
+
+BATCH = 256
+CHUNK_SIZE = 64 * 1024
+
+
+class JsonArrayWriter:
+    def __init__(self, capacity=CHUNK_SIZE, batch=BATCH):
+        self.buffer = bytearray(capacity)
+        self.batch = batch
+        self._encode = json.JSONEncoder(separators=(',', ':')).encode
+
+    def _batches(self, items):
+        # the json of `batch` items at a time, without the surrounding brackets
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == self.batch:
+                yield self._encode(batch)[1:-1].encode()
+                batch = []
+        if batch:
+            yield self._encode(batch)[1:-1].encode()
+
+    def _write(self, buffer, pos, data):
+        end = pos + len(data)
+        try:
+            buffer[pos:end] = data
+        except BufferError:
+            # a body from an earlier dump() is still referenced and pins the buffer's size; leave that one to it
+            grown = bytearray(max(end, 2 * len(buffer)))
+            grown[:pos] = memoryview(buffer)[:pos]
+            grown[pos:end] = data
+            buffer = self.buffer = grown
+        return buffer, end
+
+    def dump(self, items):
+        buffer, pos = self.buffer, 0
+        buffer, pos = self._write(buffer, pos, b'[')
+        first = True
+        for data in self._batches(items):
+            if not first:
+                buffer, pos = self._write(buffer, pos, b',')
+            buffer, pos = self._write(buffer, pos, data)
+            first = False
+        buffer, pos = self._write(buffer, pos, b']')
+        return memoryview(buffer)[:pos]
+
+    def chunks(self, items, chunk_size=CHUNK_SIZE):
+        # yields the body in pieces of about chunk_size as soon as each is encoded; every piece is its own bytes object,
+        # since http clients may still hold the previous one while asking for the next
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        pos = 0
+        separator = b'['
+        for data in self._batches(items):
+            for piece in (separator, data):
+                if pos + len(piece) > chunk_size and pos:
+                    yield bytes(view[:pos])
+                    pos = 0
+                if len(piece) > chunk_size:
+                    yield piece
+                    continue
+                view[pos:pos + len(piece)] = piece
+                pos += len(piece)
+            separator = b','
+        if separator == b'[':
+            yield b'[]'
+            return
+        if pos + 1 > chunk_size:
+            yield bytes(view[:pos])
+            pos = 0
+        view[pos:pos + 1] = b']'
+        yield bytes(view[:pos + 1])
+
+
+_local = threading.local()
+
+
+def writer():
+    # one writer (and buffer) per thread, so concurrent posts don't share a buffer
+    w = getattr(_local, 'writer', None)
+    if w is None:
+        w = _local.writer = JsonArrayWriter()
+    return w
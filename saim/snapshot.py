@@ -0,0 +1,159 @@
+import concurrent.futures
+import threading
+import time
+
+from saim.client import HOUSEHOLD, LISTS, STOCK, TRANSACTIONS
+from saim.errors import NotSentError, TransportError
+from saim.tracing import NO_SPAN, propagate
+
+# everything about one household in one call:
+#
+#   snap = snapshot(client, household_id)
+#   snap.household, snap.lists['main']['stock']['1310035849']['transactions'], snap.calls
+#
+# the calls form a tree: the household and its lists (both only need the household id), the stock of every list once
+# the lists are in, the transactions of every item once its list's stock is in. every call is issued the moment its
+# parent resolves, so a snapshot takes about three round trips however many calls it makes
+
+
+class Call:
+    __slots__ = ('name', 'params', 'depth', 'start', 'elapsed', 'status', 'error')
+
+    def __init__(self, name, params, depth):
+        self.name = name
+        self.params = params
+        self.depth = depth
+        self.start = 0.0
+        self.elapsed = 0.0
+        self.status = None
+        self.error = None
+
+    def to_dict(self):
+        return {'call': self.name, 'params': self.params, 'depth': self.depth, 'start': self.start,
+                'elapsed': self.elapsed, 'status': self.status, 'error': self.error}
+
+
+class Snapshot:
+    def __init__(self, household_id):
+        self.household_id = household_id
+        self.household = None
+        self.lists = {}
+        self.calls = []
+        self.elapsed = 0.0
+
+    @property
+    def errors(self):
+        return [call for call in self.calls if call.error is not None]
+
+    @property
+    def round_trips(self):
+        # the depth of the deepest call, what the snapshot cost in sequential waits
+        return max((call.depth for call in self.calls), default=0)
+
+    def to_dict(self):
+        return {'household_id': self.household_id, 'household': self.household, 'lists': self.lists,
+                'elapsed': self.elapsed, 'round_trips': self.round_trips,
+                'calls': [call.to_dict() for call in self.calls]}
+
+
+class _Tree:
+    # counts calls submitted but not finished; done is set when the last one finishes
+    def __init__(self):
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.done = threading.Event()
+
+    def add(self):
+        with self._lock:
+            self._pending += 1
+
+    def finish(self):
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self.done.set()
+
+
+def snapshot(client, household_id, transactions=True, max_workers=16, executor=None):
+    snap = Snapshot(household_id)
+    tree = _Tree()
+    lock = threading.Lock()
+    own_executor = executor is None
+    executor = executor or concurrent.futures.ThreadPoolExecutor(max_workers)
+    start = time.perf_counter()
+
+    def submit(name, template, params, depth, then):
+        call = Call(name, params, depth)
+        with lock:
+            snap.calls.append(call)
+        tree.add()
+        executor.submit(propagate(run), call, template, then)
+
+    def run(call, template, then):
+        try:
+            call.start = time.perf_counter() - start
+            try:
+                resp = client.request('GET', template, call.params)
+            except (NotSentError, TransportError) as e:
+                call.error = str(e)
+                return
+            finally:
+                call.elapsed = time.perf_counter() - start - call.start
+            call.status = resp.status
+            if not resp.ok:
+                call.error = resp.error
+                return
+            then(call, resp.json())
+        except Exception as e:
+            call.error = '%s: %s' % (type(e).__name__, e)
+        finally:
+            tree.finish()
+
+    def got_household(call, data):
+        snap.household = data
+
+    def got_lists(call, lists):
+        for item in lists:
+            stock_list = dict(item, stock={})
+            with lock:
+                snap.lists[item['id']] = stock_list
+            submit('stock', STOCK, {'household_id': household_id, 'list_id': item['id']}, call.depth + 1,
+                   lambda call, stock, stock_list=stock_list: got_stock(call, stock, stock_list))
+
+    def got_stock(call, stock, stock_list):
+        list_id = call.params['list_id']
+        for item in stock:
+            entry = stock_list['stock'][item['id']] = dict(item)
+            if transactions:
+                entry['transactions'] = None
+                submit('transactions', TRANSACTIONS,
+                       {'household_id': household_id, 'list_id': list_id, 'stock_id': item['id']}, call.depth + 1,
+                       lambda call, history, entry=entry: entry.__setitem__('transactions', history))
+
+    # with a tracer, one span over the whole snapshot with every call below it
+    span = client.tracer.span('snapshot', {'household_id': household_id}) if client.tracer is not None else NO_SPAN
+    try:
+        with span:
+            # the root level can't finish before both are submitted
+            tree.add()
+            submit('household', HOUSEHOLD, {'household_id': household_id}, 1, got_household)
+            submit('lists', LISTS, {'household_id': household_id}, 1, got_lists)
+            tree.finish()
+            tree.done.wait()
+            span.set('calls', len(snap.calls))
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False)
+    snap.elapsed = time.perf_counter() - start
+    snap.calls.sort(key=lambda call: call.start)
+    return snap
+
+
+def snapshots(client, household_ids, transactions=True, max_workers=16, max_households=4):
+    # (household_id, Snapshot) for many households, max_households at a time sharing one pool of max_workers
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        for household_id, snap, error in client.map(
+                lambda h: snapshot(client, h, transactions, executor=executor), household_ids, max_households):
+            if error is not None:
+                raise error
+            yield household_id, snap
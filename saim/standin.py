@@ -0,0 +1,396 @@
+import datetime
+import hashlib
+import http.server
+import itertools
+import json
+import threading
+import time
+import urllib.parse
+
+from saim.client import (HOUSEHOLD, HOUSEHOLDS, LISTS, PRODUCT, PRODUCTS, STOCK, STOCK_ITEM, STOCK_LIST, TRANSACTIONS,
+                         parse_path)
+from saim.validation import (TRANSACTION_TYPES, error_envelope, validate_household, validate_product_id,
+                             validate_stock_item, validate_transaction)
+
+# a local, in-memory stand-in for the SAIM API that answers like the sandbox does in tests/unittests_plus.py, for
+# benchmarks and offline tests. run it with `python -m saim.standin [port]`
+
+PRODUCTS_CATALOG = [
+    {
+        'doc_type': 'product',
+        'description': ("Gillette's No. 1 on sensitive skin. 5 blade ProGlide system + 1 precision trimmer. 1. "
+                        "Incredible comfort - even if you shave every day. Thinner, finer blades glide effortlessly"
+                        " through hair with less tug and pull (first 4 blades vs...."),
+        'barcode_url': ('https://www.barcodesinc.com/generator/image.php?code=1207714220&style=197&type=C128B&'
+                        'width=180&height=50&xres=1&font=3'),
+        'image_url': 'http://edge.shop.com/ccimg.shop.com/250000/251800/251872/products/1239856626.jpg',
+        'price': 44.55,
+        'title': 'Gillette Proglide Manual Razor Blade Refills for Men, 8 Count',
+        'id': '1207714220'
+    }
+]
+
+PREFIX = '/saim/v1'
+
+UPDATE_SUCCESSFUL = {'message': 'Update successful.'}
+DELETE_SUCCESSFUL = {'message': 'Delete successful.'}
+
+
+def unauthorized():
+    return 401, {'error': {'error_title': 'Unauthorized',
+                           'error_message': 'Not authorized to access data.  Please check the URI for correctness.',
+                           'control_code': '7010'}}
+
+
+def not_found(household_id, control_code):
+    return 404, {'error': {'error_title': 'Data Error',
+                           'error_message': ('Entity not found within [' + household_id +
+                                             '].  Please check URI/request data.'),
+                           'control_code': control_code}}
+
+
+def invalid(errors):
+    return 400, {'error': error_envelope(errors)}
+
+
+class Backend:
+    # the api itself: handle() takes a method, path and decoded json body and returns (status, json body)
+    def __init__(self, products=PRODUCTS_CATALOG):
+        self.households = {}
+        self.products = {product['id']: product for product in products}
+        self._ids = itertools.count(1001)
+        self._lock = threading.Lock()
+
+    def handle(self, method, path, body=None):
+        template, params = parse_path(path)
+        params = {k: urllib.parse.unquote(v) for k, v in params.items()}
+        route = self.routes.get((method, template))
+        if route is None:
+            return 404, {'error': {'error_title': 'Not Found', 'error_message': 'No such resource.',
+                                   'control_code': '404'}}
+        with self._lock:
+            return route(self, body=body, **params)
+
+    def _household(self, household_id):
+        return self.households.get(household_id)
+
+    def _list(self, household_id, list_id):
+        household = self.households[household_id]
+        return household['lists'].get(list_id)
+
+    #
+    # households
+    #
+    def post_households(self, body):
+        errors = validate_household(body or {})
+        if errors:
+            return invalid(errors)
+        household_id = str(next(self._ids))
+        self.households[household_id] = {
+            'data': dict(body, id=household_id),
+            'lists': {'main': {'description': 'default', 'id': 'main', 'stock': {}, 'history': {}}}
+        }
+        return 201, {'id': household_id}
+
+    def get_household(self, household_id, body=None):
+        household = self._household(household_id)
+        if household is None:
+            return unauthorized()
+        return 200, dict(household['data'])
+
+    def put_household(self, household_id, body):
+        household = self._household(household_id)
+        if household is None:
+            return unauthorized()
+        errors = validate_household(body or {}, partial=True)
+        if errors:
+            return invalid(errors)
+        household['data'].update(body, id=household_id)
+        return 200, UPDATE_SUCCESSFUL
+
+    def get_lists(self, household_id, body=None):
+        household = self._household(household_id)
+        if household is None:
+            return unauthorized()
+        return 200, [{'description': item['description'], 'id': item['id']} for item in household['lists'].values()]
+
+    #
+    # stock
+    #
+    def get_stock(self, household_id, list_id, body=None):
+        if self._household(household_id) is None:
+            return unauthorized()
+        stock_list = self._list(household_id, list_id)
+        if stock_list is None:
+            return not_found(household_id, '1111')
+        return 200, [dict(item) for item in stock_list['stock'].values()]
+
+    def post_stock(self, household_id, list_id, body):
+        if self._household(household_id) is None:
+            return unauthorized()
+        stock_list = self._list(household_id, list_id)
+        if stock_list is None:
+            return not_found(household_id, '1111')
+        items = body if isinstance(body, list) else [body or {}]
+        errors = {}
+        for item in items:
+            for field, messages in validate_stock_item(item).items():
+                errors.setdefault(field, [])
+                errors[field].extend(m for m in messages if m not in errors[field])
+        if errors:
+            return invalid(errors)
+        for item in items:
+            stock_list['stock'].setdefault(item['id'], {'on_hand': 0, 'on_order': 0}).update(item)
+            stock_list['history'].setdefault(item['id'], [])
+        return 200, UPDATE_SUCCESSFUL
+
+    def _stock_item(self, household_id, list_id, stock_id):
+        if self._household(household_id) is None:
+            return None, unauthorized()
+        stock_list = self._list(household_id, list_id)
+        if stock_list is None:
+            return None, not_found(household_id, '1111')
+        item = stock_list['stock'].get(stock_id)
+        if item is None:
+            return None, not_found(household_id, '1081')
+        return item, None
+
+    def get_stock_item(self, household_id, list_id, stock_id, body=None):
+        item, error = self._stock_item(household_id, list_id, stock_id)
+        if error:
+            return error
+        return 200, dict(item)
+
+    def put_stock_item(self, household_id, list_id, stock_id, body):
+        item, error = self._stock_item(household_id, list_id, stock_id)
+        if error:
+            return error
+        errors = validate_stock_item(body or {}, partial=True)
+        if errors:
+            return invalid(errors)
+        item.update(body, id=stock_id)
+        return 200, UPDATE_SUCCESSFUL
+
+    def delete_stock_item(self, household_id, list_id, stock_id, body=None):
+        item, error = self._stock_item(household_id, list_id, stock_id)
+        if error:
+            return error
+        stock_list = self._list(household_id, list_id)
+        del stock_list['stock'][stock_id]
+        del stock_list['history'][stock_id]
+        return 200, DELETE_SUCCESSFUL
+
+    #
+    # transactions
+    #
+    def post_transaction(self, household_id, list_id, stock_id, body):
+        item, error = self._stock_item(household_id, list_id, stock_id)
+        if error:
+            return error
+        errors = validate_transaction(body or {})
+        if errors:
+            return invalid(errors)
+        if body['type'] not in TRANSACTION_TYPES:
+            return 422, {'error': {'error_message': '[' + str(body['type']) + '] is not valid.',
+                                   'error_title': 'Invalid Transaction Type',
+                                   'control_code': '1'}}
+        quantity = body.get('quantity', 0)
+        item['on_hand'] = item.get('on_hand', 0) + TRANSACTION_TYPES[body['type']] * quantity
+        date = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        self._list(household_id, list_id)['history'][stock_id].append({'type': body['type'], 'quantity': quantity,
+                                                                       'date': date})
+        return 200, UPDATE_SUCCESSFUL
+
+    def get_transactions(self, household_id, list_id, stock_id, body=None):
+        item, error = self._stock_item(household_id, list_id, stock_id)
+        if error:
+            return error
+        return 200, list(self._list(household_id, list_id)['history'][stock_id])
+
+    #
+    # products
+    #
+    def get_products(self, body=None):
+        return 200, list(self.products.values())
+
+    def get_product(self, product_id, body=None):
+        errors = validate_product_id(product_id)
+        if errors:
+            return invalid(errors)
+        product = self.products.get(product_id)
+        if product is None:
+            return 404, {'error': {'error_title': 'Data Error',
+                                   'error_message': 'Entity not found.  Please check URI/request data.',
+                                   'control_code': '1111'}}
+        return 200, {k: v for k, v in product.items() if k != 'doc_type'}
+
+    routes = {
+        ('POST', HOUSEHOLDS): post_households,
+        ('GET', HOUSEHOLD): get_household,
+        ('PUT', HOUSEHOLD): put_household,
+        ('GET', LISTS): get_lists,
+        ('GET', STOCK_LIST): get_stock,
+        ('GET', STOCK): get_stock,
+        ('POST', STOCK): post_stock,
+        ('GET', STOCK_ITEM): get_stock_item,
+        ('PUT', STOCK_ITEM): put_stock_item,
+        ('DELETE', STOCK_ITEM): delete_stock_item,
+        ('POST', TRANSACTIONS): post_transaction,
+        ('GET', TRANSACTIONS): get_transactions,
+        ('GET', PRODUCTS): get_products,
+        ('GET', PRODUCT): get_product
+    }
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # keep-alive http/1.1, so pooled clients can reuse their connections. headers and body go out in separate writes;
+    # with nagle on, the body of every response on a kept-alive connection waits for the client's delayed ack
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    backend = None
+    faults = None
+    plan = None
+
+    def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if size == 0:
+                # trailers, up to the empty line
+                while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def _handle(self):
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            raw = self._read_chunked()
+        else:
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+
+        # injected faults (see saim.faults): latency first (spent holding a slot on routes with a capacity), then
+        # either no answer at all or an error instead of the api's
+        if self.faults is not None:
+            path = urllib.parse.urlsplit(self.path).path
+            self.plan = plan = self.faults.plan(self.command, path[len(PREFIX):] if path.startswith(PREFIX) else path)
+            if plan.slots is not None and not plan.slots.enter():
+                from saim.faults import error_body
+                self.respond(plan.slots.shed_status, error_body(plan.slots.shed_status))
+                return
+            try:
+                if plan.delay:
+                    time.sleep(plan.delay)
+            finally:
+                if plan.slots is not None:
+                    plan.slots.leave()
+            if plan.drop:
+                self.close_connection = True
+                return
+            if plan.status is not None:
+                from saim.faults import error_body
+                self.respond(plan.status, error_body(plan.status))
+                return
+
+        try:
+            body = json.loads(raw.decode()) if raw else None
+        except ValueError:
+            status, data = 400, {'error': {'error_title': 'Invalid request data.',
+                                           'error_message': 'Malformed json.', 'control_code': '7020'}}
+        else:
+            status, data = self.backend.handle(self.command, self.path, body)
+        payload = json.dumps(data).encode()
+
+        # conditional GETs: an etag on every successful GET, and 304 without a body when it still matches
+        if self.command == 'GET' and status == 200:
+            etag = '"%s"' % hashlib.blake2b(payload, digest_size=16).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                self.respond(304, b'', {'ETag': etag})
+            else:
+                self.respond(status, payload, {'ETag': etag})
+            return
+        self.respond(status, payload)
+
+    def respond(self, status, payload, headers=None):
+        self.send_response(status)
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        plan = self.plan
+        if plan is None or (plan.truncate is None and plan.drip is None):
+            self.wfile.write(payload)
+            return
+        if plan.truncate is not None:
+            # the full Content-Length went out, the body stops short and the connection closes
+            payload = payload[:int(len(payload) * plan.truncate)]
+            self.close_connection = True
+        if plan.drip is None:
+            self.wfile.write(payload)
+            return
+        chunk, interval = plan.drip
+        for start in range(0, len(payload), chunk):
+            self.wfile.write(payload[start:start + chunk])
+            time.sleep(interval)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    # the default listen backlog of 5 drops connections under the bursts benchmarks throw at it
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StandinServer:
+    # faults is a saim.faults.FaultInjector for a slow or failing stand-in
+    def __init__(self, host='127.0.0.1', port=0, backend=None, handler=Handler, faults=None):
+        self.backend = backend if backend is not None else Backend()
+        self.faults = faults
+        handler = type('BoundHandler', (handler,), {'backend': self.backend, 'faults': faults})
+        self.httpd = _HTTPServer((host, port), handler)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://%s:%d%s' % (host, port, PREFIX)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m saim.standin')
+    parser.add_argument('port', type=int, nargs='?', default=8080)
+    parser.add_argument('--faults', help='fault scenario json (see saim.faults)')
+    args = parser.parse_args()
+    faults = None
+    if args.faults:
+        from saim.faults import FaultInjector
+        faults = FaultInjector.from_scenario(args.faults)
+    server = StandinServer(port=args.port, faults=faults)
+    print('SAIM stand-in listening on ' + server.base_url)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
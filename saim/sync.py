@@ -0,0 +1,252 @@
+import bisect
+import collections
+import hashlib
+import multiprocessing
+import os
+import queue
+import time
+
+from saim.client import BASE_URL, STOCK
+from saim.concurrency import bounded_map
+from saim.errors import ApiError
+
+# syncing many households across processes, so json decoding isn't serialised behind one GIL:
+#
+#   with SyncPool(api_key, workers=4) as pool:
+#       report = pool.sync(household_ids)
+#       report.results[household_id], report.metrics
+#
+# households are assigned to workers on a consistent hash ring. a household keeps going to the same worker from one
+# sync to the next, so the worker's state (the etags and payloads of the default task) stays useful, and adding or
+# removing a worker only moves the households that hash to it. every worker has its own pooled client and runs its
+# share on a thread pool; results and per-worker metrics come back to the parent over a queue
+
+RESULT_CHUNK = 64
+
+
+class HashRing:
+    # every node sits at `replicas` points on the ring; a key belongs to the first node point at or after its hash
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas = replicas
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+
+    def __len__(self):
+        return len(set(self._owners))
+
+    def add(self, node):
+        for n in range(self.replicas):
+            point = self._hash('%s#%d' % (node, n))
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node):
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def node_for(self, key):
+        if not self._points:
+            raise LookupError('the ring is empty')
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def partition(self, keys):
+        parts = collections.defaultdict(list)
+        for key in keys:
+            parts[self.node_for(key)].append(key)
+        return parts
+
+
+class WorkerState:
+    # lives as long as its worker process: `cache` is for the task, `stats` counters end up in the metrics
+    def __init__(self, name):
+        self.name = name
+        self.cache = {}
+        self.stats = collections.Counter()
+
+
+def sync_stock(client, household_id, state):
+    # the default task: the household's main stock list, with a conditional GET against the last copy this worker saw
+    cached = state.cache.get(household_id)
+    headers = {'If-None-Match': cached[0]} if cached else None
+    resp = client.request('GET', STOCK, {'household_id': household_id, 'list_id': 'main'}, headers=headers)
+    if resp.status == 304:
+        state.stats['not_modified'] += 1
+        return cached[1]
+    if not resp.ok:
+        raise ApiError(resp.status, resp.error)
+    items = resp.json()
+    etag = {k.lower(): v for k, v in resp.headers.items()}.get('etag')
+    if etag:
+        state.cache[household_id] = (etag, items)
+    return items
+
+
+def _worker(name, api_key, base_url, transport, threads, task, inbox, outbox):
+    from saim.client import Client
+
+    state = WorkerState(name)
+    with Client(api_key, base_url, transport) as client:
+        while True:
+            message = inbox.get()
+            if message is None:
+                return
+            sync_id, household_ids = message
+            start, cpu = time.perf_counter(), time.process_time()
+            state.stats.clear()
+            chunk = []
+            for household_id, result, error in bounded_map(lambda h: task(client, h, state), household_ids, threads,
+                                                           ordered=False):
+                if error is not None:
+                    state.stats['errors'] += 1
+                    chunk.append((household_id, None, '%s: %s' % (type(error).__name__, error)))
+                else:
+                    chunk.append((household_id, result, None))
+                if len(chunk) >= RESULT_CHUNK:
+                    outbox.put(('results', sync_id, name, chunk))
+                    chunk = []
+            if chunk:
+                outbox.put(('results', sync_id, name, chunk))
+            metrics = dict(state.stats, households=len(household_ids), seconds=time.perf_counter() - start,
+                           cpu_seconds=time.process_time() - cpu, pid=os.getpid())
+            outbox.put(('done', sync_id, name, metrics))
+
+
+class SyncReport:
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+        self.metrics = {}
+        self.assignment = {}
+        self.reassigned = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        return (len(self.results) + len(self.errors)) / self.elapsed if self.elapsed else 0.0
+
+    def totals(self):
+        totals = collections.Counter()
+        for metrics in self.metrics.values():
+            totals.update({k: v for k, v in metrics.items() if k != 'pid'})
+        return dict(totals)
+
+
+class SyncPool:
+    # task(client, household_id, state) runs in the workers and must be importable there (a module-level function);
+    # what it returns is pickled back to the parent, so return only what the parent needs
+    def __init__(self, api_key, base_url=BASE_URL, workers=None, task=sync_stock, threads=8, transport='pooled',
+                 replicas=64, context=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.task = task
+        self.threads = threads
+        self.transport = transport
+        self.ring = HashRing(replicas=replicas)
+        self._context = context or multiprocessing.get_context()
+        self._outbox = self._context.Queue()
+        self._workers = {}
+        self._names = 0
+        self._syncs = 0
+        for _ in range(workers or os.cpu_count() or 1):
+            self.add_worker()
+
+    @property
+    def workers(self):
+        return list(self._workers)
+
+    def add_worker(self):
+        self._names += 1
+        name = 'worker-%d' % self._names
+        inbox = self._context.Queue()
+        process = self._context.Process(target=_worker, name=name, daemon=True,
+                                        args=(name, self.api_key, self.base_url, self.transport, self.threads,
+                                              self.task, inbox, self._outbox))
+        process.start()
+        self._workers[name] = (process, inbox)
+        self.ring.add(name)
+        return name
+
+    def remove_worker(self, name):
+        process, inbox = self._workers.pop(name)
+        self.ring.remove(name)
+        if process.is_alive():
+            inbox.put(None)
+            process.join(5)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+
+    def _dispatch(self, sync_id, household_ids, outstanding, report):
+        for name, ids in self.ring.partition(household_ids).items():
+            self._workers[name][1].put((sync_id, ids))
+            outstanding[name] = outstanding.get(name, set()) | set(ids)
+            report.assignment.setdefault(name, []).extend(ids)
+
+    def sync(self, household_ids, timeout=None):
+        # every household is synced by exactly one worker; the households of a worker that dies during the sync are
+        # handed to the remaining workers (and the dead worker is taken out of the ring)
+        self._syncs += 1
+        sync_id = self._syncs
+        report = SyncReport()
+        outstanding = {}
+        start = time.perf_counter()
+        self._dispatch(sync_id, list(dict.fromkeys(household_ids)), outstanding, report)
+
+        while outstanding:
+            if timeout is not None and time.perf_counter() - start > timeout:
+                raise TimeoutError('%d households not synced after %ss'
+                                   % (sum(len(ids) for ids in outstanding.values()), timeout))
+            try:
+                kind, message_sync, name, body = self._outbox.get(timeout=0.2)
+            except queue.Empty:
+                self._reap(sync_id, outstanding, report)
+                continue
+            if message_sync != sync_id or name not in outstanding:
+                continue
+            if kind == 'results':
+                for household_id, result, error in body:
+                    outstanding[name].discard(household_id)
+                    if error is None:
+                        report.results[household_id] = result
+                    else:
+                        report.errors[household_id] = error
+            elif kind == 'done':
+                # a worker that took over a dead one's households reports once per batch
+                metrics = report.metrics.setdefault(name, {'pid': body['pid']})
+                for key, value in body.items():
+                    if key != 'pid':
+                        metrics[key] = metrics.get(key, 0) + value
+                if not outstanding[name]:
+                    del outstanding[name]
+
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def _reap(self, sync_id, outstanding, report):
+        dead = [name for name in outstanding if not self._workers[name][0].is_alive()]
+        for name in dead:
+            household_ids = outstanding.pop(name)
+            self.remove_worker(name)
+            if not self._workers:
+                raise RuntimeError('every sync worker died')
+            report.reassigned += len(household_ids)
+            self._dispatch(sync_id, list(household_ids), outstanding, report)
+
+    def close(self):
+        for name in list(self._workers):
+            self.remove_worker(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,298 @@
+import atexit
+import contextvars
+import copy
+import functools
+import json
+import random
+import re
+import threading
+import time
+
+# spans for every client call and every http attempt under it, with the W3C trace context passed on to the server:
+#
+#   tracer = Tracer(FileExporter('spans.ndjson'), sample_rate=0.1)
+#   client = Client(api_key, transport='pooled', tracer=tracer)
+#   with tracer.span('checkout', {'household_id': household_id}):
+#       snapshot(client, household_id)                       # every call below becomes a child span
+#
+#   python -m saim.tracing spans.ndjson                      # each trace as a timeline, the critical path starred
+#
+# a call through the client is a span named after its endpoint ('GET /households/{household_id}'); each http attempt
+# it took is a child span ('HTTP GET') that sends its own traceparent header, so a request the pooled transport
+# resent on a fresh connection shows up as two attempts. spans started on the pool threads of client.map, snapshot()
+# and the count reconciler are children of the span that started the fan-out.
+#
+# whether a trace is recorded is decided once, at its root, with probability sample_rate (or taken from an incoming
+# traceparent); spans of unsampled traces still carry ids for the traceparent header but are never exported
+
+_current = contextvars.ContextVar('saim_span', default=None)
+_TRACEPARENT = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+
+def parse_traceparent(value):
+    # (trace_id, parent span id, sampled) or None when value isn't a valid traceparent
+    match = _TRACEPARENT.match((value or '').strip().lower())
+    if not match:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == 'ff' or trace_id == '0' * 32 or span_id == '0' * 16:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def current_span():
+    return _current.get()
+
+
+class Span:
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'sampled', 'attributes', 'start', 'duration',
+                 'error', '_t0', '_token')
+
+    def __init__(self, tracer, trace_id, span_id, parent_id, name, sampled, attributes=None):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.attributes = dict(attributes) if attributes and sampled else {}
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+        self._t0 = time.perf_counter()
+        self._token = None
+
+    @property
+    def traceparent(self):
+        return '00-%s-%s-%s' % (self.trace_id, self.span_id, '01' if self.sampled else '00')
+
+    def set(self, key, value):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def end(self, error=None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._t0
+        if error is not None:
+            self.error = error if isinstance(error, str) else '%s: %s' % (type(error).__name__, error)
+        if self.sampled:
+            self.tracer.exporter.export(self)
+
+    def __enter__(self):
+        # the current span of this context until the with block ends
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.end(exc)
+
+    def to_dict(self):
+        return {'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id, 'name': self.name,
+                'start': self.start, 'duration': self.duration, 'attributes': self.attributes, 'error': self.error}
+
+
+class _NoSpan:
+    # what untraced code paths get, so they don't need to check for a tracer
+    traceparent = None
+
+    def set(self, key, value):
+        pass
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate=1.0, seed=None):
+        self.exporter = exporter if exporter is not None else Collector()
+        self.sample_rate = sample_rate
+        self._random = random.Random(seed)
+
+    def span(self, name, attributes=None, parent=None, traceparent=None):
+        # a child of parent, of the trace in traceparent, or of the current span; a new trace when there is none.
+        # use it in a with block to make it the current span, or end() it yourself
+        if parent is None and traceparent is not None:
+            remote = parse_traceparent(traceparent)
+            if remote is not None:
+                return Span(self, remote[0], '%016x' % self._random.getrandbits(64), remote[1], name, remote[2],
+                            attributes)
+        if parent is None:
+            parent = _current.get()
+        if parent is None:
+            trace_id = '%032x' % self._random.getrandbits(128)
+            sampled = self.sample_rate >= 1.0 or self._random.random() < self.sample_rate
+            return Span(self, trace_id, '%016x' % self._random.getrandbits(64), None, name, sampled, attributes)
+        return Span(self, parent.trace_id, '%016x' % self._random.getrandbits(64), parent.span_id, name,
+                    parent.sampled, attributes)
+
+    def attempt(self, request, attempt=1):
+        # the span of one http attempt and the request to send for it, carrying that span's traceparent
+        span = self.span('HTTP ' + request.method, {'http.url': request.url, 'attempt': attempt})
+        request = copy.copy(request)
+        request.headers = dict(request.headers, traceparent=span.traceparent)
+        return span, request
+
+    def close(self):
+        close = getattr(self.exporter, 'close', None)
+        if close is not None:
+            close()
+
+
+class TracingTransport:
+    # a span per send for transports that don't trace their own attempts (the pooled transport does, retries included)
+    def __init__(self, transport, tracer):
+        self.transport = transport
+        self.tracer = tracer
+
+    def send(self, request, timeout=None):
+        span, request = self.tracer.attempt(request)
+        try:
+            resp = self.transport.send(request, timeout)
+        except Exception as e:
+            span.end(e)
+            raise
+        span.set('http.status_code', resp.status)
+        span.end()
+        return resp
+
+    def close(self):
+        self.transport.close()
+
+
+def propagate(fn):
+    # fn bound to a copy of the caller's context, for handing to another thread: spans it starts there keep the
+    # caller's span as their parent. a copy can only run once at a time, so call this per task
+    if _current.get() is None:
+        return fn
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+#
+# exporters
+#
+class Collector:
+    # keeps finished spans in memory: the collector stub for tests and interactive use
+    def __init__(self, max_spans=100000):
+        self.max_spans = max_spans
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        with self._lock:
+            if len(self._spans) < self.max_spans:
+                self._spans.append(span.to_dict())
+
+    def spans(self, trace_id=None):
+        with self._lock:
+            return [span for span in self._spans if trace_id is None or span['trace_id'] == trace_id]
+
+    def clear(self):
+        with self._lock:
+            del self._spans[:]
+
+    def render(self, trace_id=None):
+        return render(self.spans(trace_id))
+
+
+class FileExporter:
+    # one json line per span, appended to path; buffered, flushed by close() and at exit
+    def __init__(self, path):
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def export(self, span):
+        line = json.dumps(span.to_dict()) + '\n'
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+#
+# reading traces
+#
+def critical_path(spans):
+    # span ids from each root down through the child that finished last, the one its parent was waiting for
+    children = {}
+    ids = {span['span_id'] for span in spans}
+    for span in spans:
+        children.setdefault(span['parent_id'] if span['parent_id'] in ids else None, []).append(span)
+    path = set()
+    level = children.get(None, [])
+    for root in level:
+        span = root
+        while span is not None:
+            path.add(span['span_id'])
+            below = children.get(span['span_id'])
+            span = max(below, key=lambda s: s['start'] + s['duration']) if below else None
+    return path
+
+
+def render(spans):
+    # every trace as an indented timeline: offset from the trace's start, duration, name, attributes; the critical
+    # path is marked with *
+    by_trace = {}
+    for span in spans:
+        by_trace.setdefault(span['trace_id'], []).append(span)
+    lines = []
+    for trace_id, trace in sorted(by_trace.items(), key=lambda entry: min(s['start'] for s in entry[1])):
+        ids = {span['span_id'] for span in trace}
+        children = {}
+        for span in trace:
+            children.setdefault(span['parent_id'] if span['parent_id'] in ids else None, []).append(span)
+        path = critical_path(trace)
+        origin = min(span['start'] for span in trace)
+        lines.append('trace %s, %d spans' % (trace_id, len(trace)))
+
+        def walk(span, depth):
+            attributes = ' '.join('%s=%s' % item for item in sorted(span['attributes'].items()))
+            lines.append('%s %9.1f ms %9.1f ms  %s%s %s%s' % (
+                '*' if span['span_id'] in path else ' ', (span['start'] - origin) * 1000, span['duration'] * 1000,
+                '  ' * depth, span['name'], attributes, ' error=' + span['error'] if span['error'] else ''))
+            for child in sorted(children.get(span['span_id'], []), key=lambda s: s['start']):
+                walk(child, depth + 1)
+
+        for root in sorted(children.get(None, []), key=lambda s: s['start']):
+            walk(root, 0)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m saim.tracing', description='Print traces as timelines.')
+    parser.add_argument('file', help='spans written by FileExporter')
+    parser.add_argument('--trace', help='only this trace id')
+    parser.add_argument('--slowest', type=int, help='only the N traces with the longest root span')
+    args = parser.parse_args()
+    spans = [span for span in load(args.file) if args.trace is None or span['trace_id'] == args.trace]
+    if args.slowest:
+        roots = sorted((span for span in spans if span['parent_id'] is None), key=lambda s: -s['duration'])
+        keep = {span['trace_id'] for span in roots[:args.slowest]}
+        spans = [span for span in spans if span['trace_id'] in keep]
+    print(render(spans))
@@ -0,0 +1,268 @@
+import collections
+import http.client
+import json
+import select
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import warnings
+
+from saim.errors import TransportError
+from saim.tracing import NO_SPAN
+
+
+class Request:
+    # template is the endpoint with placeholders (e.g. '/households/{household_id}/lists'), kept next to the
+    # concrete url so that anything looking at traffic can group it per endpoint. body is None, bytes-like (bytes, or a
+    # memoryview for bulk bodies, see saim.serialize) or an iterator of bytes to send chunked
+    def __init__(self, method, url, template, body=None, headers=None):
+        self.method = method
+        self.url = url
+        self.template = template
+        self.body = body
+        self.headers = headers or {}
+
+
+class Response:
+    def __init__(self, status, payload, headers=None, elapsed=0.0):
+        self.status = status
+        self.payload = payload
+        self.headers = headers or {}
+        self.elapsed = elapsed
+        self._data = None
+        self._decoded = False
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    def json(self):
+        if not self._decoded:
+            self._data = json.loads(self.payload.decode()) if self.payload else None
+            self._decoded = True
+        return self._data
+
+    @property
+    def error(self):
+        # the SAIM error envelope, or None for successful responses
+        if self.ok:
+            return None
+        data = self.json()
+        if isinstance(data, dict):
+            return data.get('error')
+        return None
+
+
+class UrllibTransport:
+    # the same urllib call the unittests make, wrapped so the client can swap it out; it keeps its own opener so
+    # that handlers installed globally with urllib.request.install_opener (see saim.cassette) don't loop back here
+    def __init__(self):
+        self._opener = urllib.request.build_opener()
+
+    def send(self, request, timeout=None):
+        req = urllib.request.Request(request.url,
+                                     data=request.body,
+                                     headers=request.headers,
+                                     method=request.method)
+        start = time.perf_counter()
+        try:
+            resp = self._opener.open(req, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            resp = e
+        except urllib.error.URLError as e:
+            raise TransportError(str(e.reason)) from e
+        except OSError as e:
+            raise TransportError(str(e)) from e
+
+        with resp:
+            try:
+                payload = resp.read()
+            except (OSError, http.client.HTTPException) as e:
+                # the connection went away mid-body (IncompleteRead and friends)
+                raise TransportError(str(e)) from e
+        return Response(resp.getcode(), payload, dict(resp.headers.items()), time.perf_counter() - start)
+
+    def close(self):
+        pass
+
+
+IDEMPOTENT = frozenset(('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'))
+
+
+class PooledTransport:
+    # http/1.1 keep-alive: idle connections are kept per (scheme, host, port) and reused, so a burst of calls to the
+    # same host doesn't pay a tcp (and tls) handshake each
+    #
+    # an idle connection the server has meanwhile closed is noticed when it is taken from the pool and replaced. one
+    # that closes anyway fails on first use: the request is sent again once on a fresh connection if it never got out
+    # whole, or if its method is idempotent. a POST whose answer never came may have been carried out, so it isn't
+    # resent (that would create the household, stock or transaction twice); it fails with a TransportError
+    #
+    # dns is an optional saim.dnscache.DnsCache that new connections resolve their host through; tracer an optional
+    # saim.tracing.Tracer that gets a span per attempt
+    def __init__(self, max_idle_per_host=16, ssl_context=None, dns=None, tracer=None):
+        self.max_idle_per_host = max_idle_per_host
+        self.ssl_context = ssl_context
+        self.dns = dns
+        self.tracer = tracer
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.closed = 0
+        self.reused = 0
+        self.retries = 0
+
+    def stats(self):
+        # connections opened and closed over the pool's life, idle now and in use (checked out by a request) now
+        with self._lock:
+            idle = sum(len(conns) for conns in self._idle.values())
+            return {'opened': self.opened, 'closed': self.closed, 'reused': self.reused, 'retries': self.retries,
+                    'idle': idle, 'in_use': self.opened - self.closed - idle,
+                    'max_idle_per_host': self.max_idle_per_host}
+
+    def _discard(self, conn):
+        conn.close()
+        with self._lock:
+            self.closed += 1
+
+    def _connect(self, key, timeout):
+        with self._lock:
+            self.opened += 1
+        scheme, host, port = key
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=timeout, context=self.ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        if self.dns is not None:
+            conn._create_connection = self.dns.create_connection
+        return conn
+
+    @staticmethod
+    def _key(url):
+        parts = urllib.parse.urlsplit(url)
+        return parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80)
+
+    def warm(self, url, connections=4, timeout=None):
+        # resolves the host of url (into the dns cache, if the pool has one), then opens `connections` connections
+        # (tcp and tls handshakes included) to it, concurrently, and parks them as idle for the requests to come.
+        # returns {'connections', 'connect_seconds' (one per connection), 'dns_seconds'}
+        key = self._key(url)
+        connections = min(connections, self.max_idle_per_host)
+        dns_seconds = 0.0
+        if self.dns is not None:
+            start = time.perf_counter()
+            self.dns.resolve(key[1], key[2])
+            dns_seconds = time.perf_counter() - start
+
+        def open_one(_):
+            start = time.perf_counter()
+            conn = self._connect(key, timeout)
+            try:
+                conn.connect()
+            except BaseException:
+                self._discard(conn)
+                raise
+            return conn, time.perf_counter() - start
+
+        from saim.concurrency import bounded_map
+        timings = []
+        for _, result, error in bounded_map(open_one, range(connections), max(connections, 1)):
+            if error is not None:
+                raise TransportError(str(error)) from error
+            conn, seconds = result
+            self._release(key, conn)
+            timings.append(seconds)
+        return {'connections': len(timings), 'connect_seconds': timings, 'dns_seconds': dns_seconds}
+
+    def _acquire(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+            self.reused += conn is not None
+        if conn is None:
+            return self._connect(key, timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            try:
+                # an idle keep-alive connection has nothing to read: if it does, the server closed it
+                if select.select([conn.sock], [], [], 0)[0]:
+                    raise ConnectionResetError('closed while idle')
+                conn.sock.settimeout(timeout)
+            except (OSError, ValueError):
+                self._discard(conn)
+                return self._connect(key, timeout), False
+        return conn, True
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, collections.deque())
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+            self.closed += 1
+        conn.close()
+
+    def send(self, request, timeout=None):
+        parts = urllib.parse.urlsplit(request.url)
+        key = self._key(request.url)
+        target = parts.path + ('?' + parts.query if parts.query else '')
+
+        for attempt in (1, 2):
+            span, sent = (NO_SPAN, request) if self.tracer is None else self.tracer.attempt(request, attempt)
+            conn, reused = self._acquire(key, timeout)
+            span.set('net.reused', reused)
+            start = time.perf_counter()
+            delivered = False
+            try:
+                conn.request(request.method, target, body=request.body, headers=sent.headers)
+                delivered = True
+                resp = conn.getresponse()
+                payload = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                self._discard(conn)
+                span.end(e)
+                # a streamed body was used up by the first attempt and can't be sent again
+                safe = not delivered or request.method in IDEMPOTENT
+                if safe and reused and attempt == 1 and not hasattr(request.body, '__next__'):
+                    with self._lock:
+                        self.retries += 1
+                    continue
+                raise TransportError(str(e)) from e
+            except (OSError, http.client.HTTPException) as e:
+                self._discard(conn)
+                span.end(e)
+                raise TransportError(str(e)) from e
+
+            if resp.will_close:
+                self._discard(conn)
+            else:
+                self._release(key, conn)
+            span.set('http.status_code', resp.status)
+            span.end()
+            return Response(resp.status, payload, dict(resp.getheaders()), time.perf_counter() - start)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+            self.closed += sum(len(conns) for conns in idle.values())
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+def make_transport(kind='urllib', **kwargs):
+    # 'urllib' (a new connection per call, like the unittests), 'pooled' (http/1.1 keep-alive) or 'http2'
+    # (multiplexed, falling back to 'pooled' when the optional http2 dependencies aren't installed)
+    if kind == 'urllib':
+        return UrllibTransport()
+    if kind == 'pooled':
+        return PooledTransport(**kwargs)
+    if kind == 'http2':
+        from saim import http2
+        if http2.available():
+            return http2.Http2Transport(**kwargs)
+        warnings.warn('http2 transport needs httpx[http2] (pip install saim-python-sdk[http2]); using pooled http/1.1')
+        return PooledTransport()
+    raise ValueError('unknown transport: ' + kind)
@@ -0,0 +1,64 @@
+import re
+
+# the checks the SAIM API is known to make, returning errors shaped like its 7020 'Invalid request data.' envelope:
+# {'address': ['required field'], 'email': ["value does not match regex '...'"]}
+
+EMAIL_REGEX = '^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\\.[a-zA-Z0-9-.]+$'
+_email_re = re.compile(EMAIL_REGEX)
+
+HOUSEHOLD_FIELDS = ('first_name', 'last_name', 'address', 'email', 'primary_phone')
+STOCK_FIELDS = ('id', 'title', 'on_hand', 'on_order', 'min', 'max')
+STOCK_INT_FIELDS = ('on_hand', 'on_order', 'min', 'max')
+
+# transaction types and their effect on on_hand
+TRANSACTION_TYPES = {'add': 1, 'remove': -1}
+
+
+def _add(errors, field, message):
+    errors.setdefault(field, []).append(message)
+
+
+def validate_household(household, partial=False):
+    # partial=True for PUT bodies, where any subset of the fields may be sent
+    errors = {}
+    if not partial and not household.get('address'):
+        _add(errors, 'address', 'required field')
+    email = household.get('email')
+    if email is not None and not _email_re.match(email):
+        _add(errors, 'email', "value does not match regex '%s'" % EMAIL_REGEX)
+    return errors
+
+
+def validate_stock_item(item, partial=False):
+    errors = {}
+    if not partial:
+        for field in ('id', 'min'):
+            if item.get(field) in (None, ''):
+                _add(errors, field, 'required field')
+    for field in STOCK_INT_FIELDS:
+        value = item.get(field)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+            _add(errors, field, 'must be of integer type')
+    return errors
+
+
+def validate_transaction(transaction):
+    errors = {}
+    if not transaction.get('type'):
+        _add(errors, 'type', 'required field')
+    quantity = transaction.get('quantity')
+    if quantity is not None and (not isinstance(quantity, int) or isinstance(quantity, bool)):
+        _add(errors, 'quantity', 'must be of integer type')
+    return errors
+
+
+def validate_product_id(product_id):
+    errors = {}
+    if len(str(product_id)) > 100:
+        _add(errors, 'product_id', 'max length is 100')
+    return errors
+
+
+def error_envelope(errors):
+    # what the server would have answered, so local and remote validation failures look the same to callers
+    return {'error_message': errors, 'error_title': 'Invalid request data.', 'control_code': '7020'}
@@ -0,0 +1,36 @@
+import statistics
+import time
+
+from saim.client import BASE_URL, PRODUCTS, Client
+
+# how much a warm-up buys: the first request of a fresh client, with and without Client.warm_up(), next to the
+# latency of a client that has been running for a while
+#
+#   saim warmup --connections 4
+
+
+def _timed(client, template, params):
+    start = time.perf_counter()
+    resp = client.request('GET', template, params)
+    return time.perf_counter() - start, resp.status
+
+
+def measure(api_key, base_url=BASE_URL, transport='pooled', connections=4, requests=20, template=PRODUCTS,
+            params=None):
+    report = {'url': base_url + template.format(**(params or {}))}
+
+    with Client(api_key, base_url, transport) as client:
+        seconds, status = _timed(client, template, params)
+        report['cold'] = {'first_request': seconds, 'status': status}
+
+    with Client(api_key, base_url, transport) as client:
+        start = time.perf_counter()
+        warm = client.warm_up(connections)
+        warm['seconds'] = time.perf_counter() - start
+        seconds, status = _timed(client, template, params)
+        report['warm_up'] = warm
+        report['warm'] = {'first_request': seconds, 'status': status}
+
+        steady = sorted(_timed(client, template, params)[0] for _ in range(requests))
+        report['steady'] = {'median': statistics.median(steady), 'max': steady[-1], 'requests': requests}
+    return report
@@ -0,0 +1,206 @@
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+
+from saim.client import STOCK
+from saim.concurrency import bounded_map
+
+WATCHED_FIELDS = ('on_hand', 'on_order', 'min', 'max', 'title')
+
+
+class Delta:
+    # one change to one stock item: kind is 'added', 'removed' or 'changed'; changes maps field -> (old, new)
+    __slots__ = ('household_id', 'list_id', 'stock_id', 'kind', 'item', 'changes')
+
+    def __init__(self, household_id, list_id, stock_id, kind, item, changes=None):
+        self.household_id = household_id
+        self.list_id = list_id
+        self.stock_id = stock_id
+        self.kind = kind
+        self.item = item
+        self.changes = changes or {}
+
+    def __repr__(self):
+        return 'Delta(%s/%s/%s %s %r)' % (self.household_id, self.list_id, self.stock_id, self.kind, self.changes)
+
+
+def diff(household_id, list_id, old, new, fields=WATCHED_FIELDS):
+    # old and new are {stock_id: item}
+    deltas = []
+    for stock_id, item in new.items():
+        before = old.get(stock_id)
+        if before is None:
+            deltas.append(Delta(household_id, list_id, stock_id, 'added', item))
+            continue
+        changes = {field: (before.get(field), item.get(field)) for field in fields
+                   if before.get(field) != item.get(field)}
+        if changes:
+            deltas.append(Delta(household_id, list_id, stock_id, 'changed', item, changes))
+    for stock_id in old.keys() - new.keys():
+        deltas.append(Delta(household_id, list_id, stock_id, 'removed', old[stock_id]))
+    return deltas
+
+
+class _Watch:
+    def __init__(self, household_id, list_id, interval):
+        self.household_id = household_id
+        self.list_id = list_id
+        self.interval = interval
+        self.items = None
+        self.etag = None
+        self.last_modified = None
+        self.digest = None
+        self.polls = 0
+        self.changes = 0
+        self.not_modified = 0
+        self.unchanged = 0
+        self.errors = 0
+        # the heap entry this watch is due under; any other entry for its key is stale
+        self.scheduled = None
+
+
+class StockWatcher:
+    # polls GET .../lists/{list}/stock for many households and tells subscribers what changed per item
+    #
+    # a poll is cheap when nothing changed: with an ETag/Last-Modified from the server the next poll is a
+    # conditional GET answered with 304 and no body; without them the payload is hashed and only decoded and diffed
+    # when the hash moved. every household has its own interval: halved (down to min_interval) when it changed,
+    # stretched by `backoff` (up to max_interval) when it didn't, so busy households are polled often and quiet ones
+    # rarely
+    #
+    # the due times are a heap of (time, generation, key); unwatch leaves its entries in place and every push gets a
+    # new generation, so entries that aren't the watch's current one are dropped when they come up
+    def __init__(self, client, min_interval=1.0, max_interval=300.0, backoff=1.5, max_workers=8,
+                 fields=WATCHED_FIELDS, clock=time.monotonic):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self.fields = fields
+        self.clock = clock
+        self._watches = {}
+        self._due = []
+        self._generations = itertools.count()
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def watch(self, household_id, list_id='main'):
+        key = (household_id, list_id)
+        with self._lock:
+            if key not in self._watches:
+                watch = self._watches[key] = _Watch(household_id, list_id, self.min_interval)
+                self._schedule(watch, self.clock())
+
+    def unwatch(self, household_id, list_id='main'):
+        with self._lock:
+            self._watches.pop((household_id, list_id), None)
+
+    def _schedule(self, watch, when):
+        # with the lock held
+        watch.scheduled = next(self._generations)
+        heapq.heappush(self._due, (when, watch.scheduled, (watch.household_id, watch.list_id)))
+
+    def subscribe(self, callback, household_id=None):
+        # callback(deltas) with the deltas of one poll of one household, optionally only for one household
+        self._subscribers.append((callback, household_id))
+
+    def stats(self, household_id, list_id='main'):
+        watch = self._watches[(household_id, list_id)]
+        return {'interval': watch.interval, 'polls': watch.polls, 'changes': watch.changes,
+                'not_modified': watch.not_modified, 'unchanged': watch.unchanged, 'errors': watch.errors}
+
+    def _poll(self, watch):
+        headers = {}
+        if watch.etag:
+            headers['If-None-Match'] = watch.etag
+        if watch.last_modified:
+            headers['If-Modified-Since'] = watch.last_modified
+        resp = self.client.request('GET', STOCK, {'household_id': watch.household_id, 'list_id': watch.list_id},
+                                   headers=headers)
+        watch.polls += 1
+        if resp.status == 304:
+            watch.not_modified += 1
+            return None
+        if not resp.ok:
+            return None
+
+        response_headers = {k.lower(): v for k, v in resp.headers.items()}
+        digest = hashlib.blake2b(resp.payload, digest_size=16).digest()
+        if digest == watch.digest:
+            watch.etag = response_headers.get('etag')
+            watch.last_modified = response_headers.get('last-modified')
+            watch.unchanged += 1
+            return None
+
+        # decoded before any of the watch changes, so a payload that doesn't decode is fetched again next time
+        items = {item['id']: item for item in resp.json()}
+        watch.etag = response_headers.get('etag')
+        watch.last_modified = response_headers.get('last-modified')
+        watch.digest = digest
+        first = watch.items is None
+        deltas = [] if first else diff(watch.household_id, watch.list_id, watch.items, items, self.fields)
+        watch.items = items
+        return deltas
+
+    def _reschedule(self, watch, changed):
+        if changed:
+            watch.changes += 1
+            watch.interval = max(self.min_interval, watch.interval / 2)
+        else:
+            watch.interval = min(self.max_interval, watch.interval * self.backoff)
+        with self._lock:
+            # unless it was unwatched (and maybe watched again) while it was polled
+            if self._watches.get((watch.household_id, watch.list_id)) is watch:
+                self._schedule(watch, self.clock() + watch.interval)
+
+    def _publish(self, watch, deltas):
+        # a subscriber that raises doesn't keep the deltas from the others
+        for callback, household_id in self._subscribers:
+            if household_id is None or household_id == watch.household_id:
+                try:
+                    callback(deltas)
+                except Exception:
+                    watch.errors += 1
+
+    def poll_due(self):
+        # polls every household whose time has come (concurrently) and returns how long until the next one is due
+        now = self.clock()
+        due = []
+        with self._lock:
+            while self._due and self._due[0][0] <= now:
+                _, generation, key = heapq.heappop(self._due)
+                watch = self._watches.get(key)
+                if watch is not None and watch.scheduled == generation:
+                    due.append(watch)
+
+        # a poll that fails, whatever the reason, counts as unchanged and the watch stays scheduled
+        for watch, deltas, error in bounded_map(self._poll, due, self.max_workers, ordered=False):
+            if error is not None:
+                watch.errors += 1
+                deltas = None
+            if deltas:
+                self._publish(watch, deltas)
+            self._reschedule(watch, bool(deltas))
+
+        with self._lock:
+            return max(self._due[0][0] - self.clock(), 0.0) if self._due else self.max_interval
+
+    def run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.poll_due())
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -1,9 +1,19 @@
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name='saim-python-sdk',
     version='1.0.0',
-    packages=['tests'],
+    packages=['saim', 'tests'],
+    extras_require={
+        'http2': ['httpx[http2]'],
+        'analytics': ['numpy'],
+        'dns': ['dnspython']
+    },
+    entry_points={
+        'console_scripts': [
+            'saim = saim.cli:main'
+        ]
+    },
     url='',
     license='',
     author='SAIM Python Group',
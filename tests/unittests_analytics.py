@@ -0,0 +1,67 @@
+import unittest
+
+from saim import Client, analytics
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.standin import StandinServer
+
+if analytics.available():
+    import numpy as np
+
+
+def transaction(type, quantity, day):
+    date = (np.datetime64('2021-04-01') + np.timedelta64(int(day * 86400), 's')).astype(str) + '.000000Z'
+    return {'type': type, 'quantity': quantity, 'date': date}
+
+
+@unittest.skipUnless(analytics.available(), 'needs numpy')
+class TestForecast(unittest.TestCase):
+    def setUp(self):
+        self.now = float(np.datetime64('2021-04-29', 's').astype('int64')) / analytics.DAY
+        self.series = analytics.TransactionSeries.from_histories(['a', 'b', 'c'], [
+            # 2 a day for the last 10 days, and an old removal outside the window
+            [transaction('remove', 2, 27.5 - n) for n in range(10)] + [transaction('remove', 50, 1)],
+            # only additions
+            [transaction('add', 5, 20)],
+            []
+        ])
+
+    def test_rates(self):
+        rate = analytics.rates(self.series, self.now, window=10)
+        np.testing.assert_allclose(rate, [2, 0, 0])
+
+    def test_days_until_below_min(self):
+        result = analytics.forecast(self.series, [10, 5, 1], [4, 2, 2], now=self.now, window=10)
+        np.testing.assert_allclose(result['days_left'], [3, np.inf, 0])
+        self.assertEqual(analytics.at_risk(self.series, result['days_left'], 7), [('c', 0.0), ('a', 3.0)])
+
+    def test_rolling_rates(self):
+        rolling = analytics.rolling_rates(self.series, self.now, days=5, window=2)
+        self.assertEqual(rolling.shape, (3, 5))
+        np.testing.assert_allclose(rolling[0], [2, 2, 2, 2, 2])
+        np.testing.assert_allclose(rolling[1:], 0)
+
+    def test_halflife(self):
+        # a constant rate comes out the same however it is weighted
+        rate = analytics.rates(self.series, self.now, window=10, halflife=3)
+        self.assertAlmostEqual(rate[0], 2, delta=0.2)
+
+
+@unittest.skipUnless(analytics.available(), 'needs numpy')
+class TestCollect(unittest.TestCase):
+    def test_collect(self):
+        with StandinServer() as server, Client('key', server.base_url, 'pooled') as client:
+            household_id = client.post_household(SEED_HOUSEHOLD).json()['id']
+            client.post_stock(household_id, SEED_STOCK)
+            client.post_transaction(household_id, '1470432411', {'type': 'remove', 'quantity': 7})
+
+            series, on_hand, minimum = analytics.collect(client, [household_id])
+            rate = analytics.rates(series, analytics.now_days() + 0.01, window=7)
+
+        self.assertEqual(series.keys, [(household_id, 'main', '1310035849'), (household_id, 'main', '1470432411')])
+        np.testing.assert_allclose(on_hand, [3, 1])
+        np.testing.assert_allclose(minimum, [2, 4])
+        np.testing.assert_allclose(rate, [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,121 @@
+import unittest
+
+from saim import Client
+from saim.cache import EntityCache
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.standin import Handler, StandinServer
+
+
+class CountingHandler(Handler):
+    requests = []
+
+    def respond(self, status, payload, headers=None):
+        CountingHandler.requests.append((self.command, self.path))
+        super().respond(status, payload, headers)
+
+
+class TestEntityCache(unittest.TestCase):
+    def test_bounded_by_bytes(self):
+        cache = EntityCache(max_bytes=1000)
+        for n in range(5):
+            cache.put(('t', str(n), None, None), 200, b'x' * 200, {})
+        self.assertLessEqual(cache.bytes, 1000)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 3)
+
+        # least recently used goes first
+        cache.get(('t', '3', None, None))
+        cache.put(('t', '5', None, None), 200, b'x' * 200, {})
+        self.assertIsNotNone(cache.get(('t', '3', None, None)))
+        self.assertIsNone(cache.get(('t', '4', None, None)))
+
+    def test_invalidated_while_in_flight(self):
+        cache = EntityCache()
+        key = ('t', '1', None, None)
+        version = cache.version(key)
+        cache.invalidate(key)
+        cache.put(key, 200, b'{}', {}, version)
+        self.assertIsNone(cache.get(key))
+
+    def test_ttl(self):
+        now = [0]
+        cache = EntityCache(ttl=10, clock=lambda: now[0])
+        cache.put(('t', '1', None, None), 200, b'{}', {})
+        now[0] = 11
+        self.assertIsNone(cache.get(('t', '1', None, None)))
+        self.assertEqual(cache.bytes, 0)
+
+
+class TestCachingClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer(handler=CountingHandler).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.client = Client('key', self.server.base_url, 'pooled', cache=1024 * 1024)
+        self.household_id = self.client.post_household(SEED_HOUSEHOLD).json()['id']
+        self.client.post_stock(self.household_id, SEED_STOCK)
+        del CountingHandler.requests[:]
+
+    def tearDown(self):
+        self.client.close()
+
+    def gets(self):
+        return len([r for r in CountingHandler.requests if r[0] == 'GET'])
+
+    def test_reuse_and_invalidation(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get_household(self.household_id).json()['last_name'], 'Doe')
+            self.assertEqual(self.client.get_stock_item(self.household_id, '1310035849').json()['on_hand'], 3)
+        self.assertEqual(self.gets(), 2)
+
+        self.client.put_household(self.household_id, {'last_name': 'Smith'})
+        self.client.post_transaction(self.household_id, '1310035849', {'type': 'add', 'quantity': 2})
+        self.assertEqual(self.client.get_household(self.household_id).json()['last_name'], 'Smith')
+        self.assertEqual(self.client.get_stock_item(self.household_id, '1310035849').json()['on_hand'], 5)
+        self.assertEqual(self.gets(), 4)
+
+        self.client.post_stock(self.household_id, [dict(SEED_STOCK[0], on_hand=1)])
+        self.assertEqual(self.client.get_stock_item(self.household_id, '1310035849').json()['on_hand'], 1)
+
+        self.client.delete_stock_item(self.household_id, '1310035849')
+        self.assertEqual(self.client.get_stock_item(self.household_id, '1310035849').status, 404)
+
+        stats = self.client.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (4, 6))
+        self.assertGreater(stats['bytes'], 0)
+        self.assertAlmostEqual(stats['hit_ratio'], 0.4)
+
+    def test_shared_between_clients(self):
+        cache = self.client.cache
+        other_key = Client('other key', self.server.base_url, 'pooled', cache=cache)
+        with StandinServer() as other_server, other_key, \
+                Client('key', other_server.base_url, 'pooled', cache=cache) as other_api:
+            # households up to the same id as this test's on the other api
+            while other_api.post_household(dict(SEED_HOUSEHOLD, last_name='Staging')).json()['id'] != self.household_id:
+                pass
+            del CountingHandler.requests[:]
+            for _ in range(2):
+                self.assertEqual(self.client.get_household(self.household_id).json()['last_name'], 'Doe')
+                self.assertEqual(other_key.get_household(self.household_id).json()['last_name'], 'Doe')
+                # the same household id on another api
+                self.assertEqual(other_api.get_household(self.household_id).json()['last_name'], 'Staging')
+            # one read per key on this api
+            self.assertEqual(self.gets(), 2)
+            self.assertEqual(len(cache), 3)
+
+            # a write through one client drops the household for the others too
+            self.client.put_household(self.household_id, {'last_name': 'Smith'})
+            self.assertEqual(other_key.get_household(self.household_id).json()['last_name'], 'Smith')
+
+    def test_cached_responses_are_not_shared(self):
+        self.client.get_household(self.household_id).json()['last_name'] = 'changed'
+        self.assertEqual(self.client.get_household(self.household_id).json()['last_name'], 'Doe')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
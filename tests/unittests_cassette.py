@@ -0,0 +1,106 @@
+import http.server
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+from saim import Client
+from saim.cassette import Cassette, CassetteError, RecordingTransport, ReplayTransport, install
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    hits = 0
+
+    def do_GET(self):
+        Handler.hits += 1
+        if self.path.endswith('/bad_id'):
+            self.reply(401, {'error': {'error_title': 'Unauthorized', 'control_code': '7010'}})
+        else:
+            self.reply(200, {'id': self.path.rsplit('/', 1)[-1], 'hits': Handler.hits})
+
+    def do_POST(self):
+        Handler.hits += 1
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.reply(201, {'id': '1001'})
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestCassette(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = 'http://127.0.0.1:%d/saim/v1' % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+        urllib.request.install_opener(None)
+
+    def record(self):
+        client = Client('key', self.base_url, transport=RecordingTransport(Cassette(self.path)))
+        with client:
+            client.post_household({'first_name': 'John', 'last_name': 'Doe'})
+            client.get_household('1001')
+            client.get_household('1001')
+            client.get_household('bad_id')
+
+    def test_record_and_replay(self):
+        self.record()
+        recorded = Cassette.load(self.path).interactions
+
+        self.assertEqual([i['template'] for i in recorded],
+                         ['/households', '/households/{household_id}', '/households/{household_id}',
+                          '/households/{household_id}'])
+
+        hits = Handler.hits
+        client = Client('key', self.base_url, transport=ReplayTransport(Cassette.load(self.path)))
+
+        # body key order doesn't matter for matching
+        self.assertEqual(client.post_household({'last_name': 'Doe', 'first_name': 'John'}).status, 201)
+        first = client.get_household('1001').json()
+        second = client.get_household('1001').json()
+        self.assertEqual(second['hits'], first['hits'] + 1)
+        self.assertEqual(client.get_household('bad_id').error['control_code'], '7010')
+        self.assertEqual(Handler.hits, hits)
+
+        with self.assertRaises(CassetteError):
+            client.get_household('never_recorded')
+
+    def test_replay_through_urlopen(self):
+        self.record()
+        install(self.path, 'replay')
+
+        req = urllib.request.Request(self.base_url + '/households/bad_id', headers={'api_key': 'key'})
+        try:
+            resp = urllib.request.urlopen(req)
+        except urllib.error.URLError as e:
+            resp = e
+
+        self.assertEqual(resp.getcode(), 401)
+        self.assertEqual(json.loads(resp.read().decode())['error']['control_code'], '7010')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
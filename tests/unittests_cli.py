@@ -0,0 +1,70 @@
+import contextlib
+import io
+import json
+import subprocess
+import sys
+import unittest
+
+from saim.cli import build_parser, main
+from saim.standin import Handler, StandinServer
+
+
+class ProxyErrors(Handler):
+    # an html page for household 1002 and an empty 502 for 1003, like a proxy in front of the api would
+    def respond(self, status, payload, headers=None):
+        if self.path.endswith('/1002'):
+            status, payload = 503, b'<html><body>Service Unavailable</body></html>'
+        elif self.path.endswith('/1003'):
+            status, payload = 502, b''
+        super().respond(status, payload, headers)
+
+
+class TestCli(unittest.TestCase):
+    def test_help_does_not_import_client(self):
+        code = ('import sys, saim.cli; saim.cli.build_parser(); '
+                'print(sorted(m for m in sys.modules if m.startswith(("saim.", "urllib.request", "ssl"))))')
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+
+        self.assertEqual(out.strip(), "['saim.cli']")
+
+    def test_parse_bulk_command(self):
+        args = build_parser().parse_args(['--workers', '4', 'stock', 'get-many', '1001', '1310035849', '1470432411',
+                                          '--list', 'main'])
+
+        self.assertEqual(args.workers, 4)
+        self.assertEqual(args.stock_ids, ['1310035849', '1470432411'])
+        self.assertEqual(args.func.__name__, 'stock_get_many')
+
+    def test_parse_transaction(self):
+        args = build_parser().parse_args(['transactions', 'add', '1001', '1310035849', 'add', '10'])
+
+        self.assertEqual((args.type, args.quantity, args.list_id), ('add', 10, 'main'))
+
+    def test_missing_command(self):
+        with self.assertRaises(SystemExit):
+            build_parser().parse_args(['stock'])
+
+    def test_body_that_is_not_json(self):
+        with StandinServer(handler=ProxyErrors) as server:
+            def run(*argv):
+                out, err = io.StringIO(), io.StringIO()
+                with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+                    code = main(['--api-key', 'key', '--base-url', server.base_url] + list(argv))
+                return code, out.getvalue(), err.getvalue()
+
+            code, out, err = run('households', 'get', '1002')
+            self.assertEqual((code, out), (1, ''))
+            self.assertEqual(err, 'HTTP 503: <html><body>Service Unavailable</body></html>\n')
+            self.assertEqual(run('households', 'get', '1003'), (1, '', 'HTTP 502: (no body)\n'))
+
+            code, out, _ = run('households', 'get-many', '1001', '1002', '1003')
+            records = [json.loads(line) for line in out.splitlines()]
+            self.assertEqual(code, 1)
+            self.assertEqual([record.get('status') for record in records], [401, 503, 502])
+            self.assertEqual(records[0]['body']['error']['control_code'], '7010')
+            self.assertEqual(records[1]['raw'], '<html><body>Service Unavailable</body></html>')
+            self.assertIsNone(records[2]['body'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,87 @@
+import unittest
+
+from saim import Client
+from saim.client import HOUSEHOLD, HOUSEHOLDS, PRODUCT, STOCK, STOCK_ITEM, TRANSACTIONS
+from saim.contracts import ContractCheckingTransport, ContractError, check, validate
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.standin import PRODUCTS_CATALOG, StandinServer
+from saim.transport import make_transport
+
+
+class TestContracts(unittest.TestCase):
+    # responses as tests/unittests_plus.py expects them
+    def test_expected_responses(self):
+        self.assertEqual(validate('GET', HOUSEHOLD, 200, dict(SEED_HOUSEHOLD, id='1001')), [])
+        self.assertEqual(validate('GET', STOCK, 200, SEED_STOCK), [])
+        self.assertEqual(validate('GET', PRODUCT, 200, PRODUCTS_CATALOG[0]), [])
+        self.assertEqual(validate('POST', HOUSEHOLDS, 400, {'error': {
+            'error_message': {'address': ['required field'], 'email': ["value does not match regex '...'"]},
+            'error_title': 'Invalid request data.', 'control_code': '7020'}}), [])
+        self.assertEqual(validate('GET', HOUSEHOLD, 401, {'error': {
+            'error_title': 'Unauthorized',
+            'error_message': 'Not authorized to access data.  Please check the URI for correctness.',
+            'control_code': '7010'}}), [])
+        self.assertEqual(validate('GET', STOCK_ITEM, 404, {'error': {
+            'error_title': 'Data Error',
+            'error_message': 'Entity not found within [1001].  Please check URI/request data.',
+            'control_code': '1081'}}), [])
+        self.assertEqual(validate('POST', TRANSACTIONS, 422, {'error': {
+            'error_message': '[invalid] is not valid.', 'error_title': 'Invalid Transaction Type',
+            'control_code': '1'}}), [])
+        self.assertEqual(validate('PUT', '/households/1001/lists/main/stock/1', 200, {'message': 'Update successful.'}),
+                         [])
+
+    def test_violations(self):
+        self.assertEqual(validate('GET', STOCK_ITEM, 200, {'id': '1', 'on_hand': '3'}),
+                         ['GET %s 200: $.on_hand: expected integer, got str' % STOCK_ITEM])
+        self.assertEqual(validate('GET', HOUSEHOLD, 200, {'address': 'x'}),
+                         ['GET %s 200: $.id: missing' % HOUSEHOLD])
+        self.assertEqual(validate('GET', STOCK, 200, [{'id': '1', 'min': True}]),
+                         ['GET %s 200: $[].min: expected integer, got bool' % STOCK])
+        self.assertEqual(validate('GET', STOCK, 500, []), ['GET %s: unexpected status 500' % STOCK])
+        self.assertTrue(validate('GET', HOUSEHOLD, 401, {'error': {'error_title': 'Unauthorized',
+                                                                   'error_message': 'x', 'control_code': '7020'}}))
+        with self.assertRaises(ContractError):
+            check('PUT', HOUSEHOLD, 200, {'message': 'Delete successful.'})
+
+
+class TestStandinKeepsContracts(unittest.TestCase):
+    # every endpoint and error path of the stand-in, checked on the way through
+    def test_every_response(self):
+        violations = []
+        with StandinServer() as server:
+            transport = ContractCheckingTransport(make_transport('pooled'), sample=1.0,
+                                                  on_violation=lambda req, resp, errors: violations.append(errors))
+            with Client('key', server.base_url, transport) as client:
+                household_id = client.post_household(SEED_HOUSEHOLD).json()['id']
+                client.post_household({'email': 'nope'})
+                client.get_household(household_id)
+                client.get_household('bad_id')
+                client.put_household(household_id, {'last_name': 'Smith'})
+                client.put_household(household_id, {'email': 'nope'})
+                client.get_lists(household_id)
+                client.post_stock(household_id, SEED_STOCK)
+                client.post_stock(household_id, SEED_STOCK, list_id='nope')
+                client.post_stock(household_id, [{'id': '1'}])
+                client.get_stock_list(household_id)
+                client.get_stock(household_id)
+                client.get_stock(household_id, 'nope')
+                client.get_stock_item(household_id, '1310035849')
+                client.get_stock_item(household_id, 'nope')
+                client.put_stock_item(household_id, '1310035849', {'max': 6})
+                client.post_transaction(household_id, '1310035849', {'type': 'add', 'quantity': 1})
+                client.post_transaction(household_id, '1310035849', {'type': 'invalid', 'quantity': 1})
+                client.post_transaction(household_id, '1310035849', {'quantity': 1})
+                client.get_transactions(household_id, '1310035849')
+                client.delete_stock_item(household_id, '1470432411')
+                client.get_products()
+                client.get_product('1207714220')
+                client.get_product('nope')
+                client.get_product('1' * 101)
+
+        self.assertEqual(violations, [])
+        self.assertEqual((transport.checked, transport.violations), (25, 0))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
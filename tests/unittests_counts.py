@@ -0,0 +1,152 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from saim import Client
+from saim.counts import CountReconciler, StageStats, read_counts, stage
+from saim.faults import FaultInjector, Rule
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.standin import StandinServer
+
+
+class TestStage(unittest.TestCase):
+    def test_backpressure(self):
+        # a slow consumer: the stage never runs more than its queue ahead
+        produced = []
+
+        async def source():
+            for n in range(100):
+                produced.append(n)
+                yield [n]
+
+        async def double(item):
+            return [item * 2]
+
+        async def consume():
+            stats = StageStats('double')
+            seen = []
+            async for item in stage(source(), double, stats, workers=2, queue_size=4):
+                await asyncio.sleep(0)
+                self.assertLessEqual(len(produced) - len(seen), 4 + 2 + 2 + 1)
+                seen.append(item)
+            return stats, seen
+
+        stats, seen = asyncio.run(consume())
+        self.assertEqual(sorted(item[0] for item in seen), list(range(100)))
+        self.assertEqual(stats.rows, 100)
+        self.assertLessEqual(stats.max_queued, 4)
+        self.assertGreater(stats.throughput, 0)
+
+    def test_error_and_early_close(self):
+        async def source():
+            for n in range(100):
+                yield [n]
+
+        async def fail(item):
+            if item[0] == 10:
+                raise ValueError('boom')
+            return [item]
+
+        async def run():
+            with self.assertRaisesRegex(ValueError, 'boom'):
+                async for _ in stage(source(), fail, StageStats('fail')):
+                    pass
+            pipeline = stage(source(), fail, StageStats('fail'))
+            async for _ in pipeline:
+                break
+            await pipeline.aclose()
+
+        asyncio.run(asyncio.wait_for(run(), 5))
+
+
+class TestCountReconciler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.faults = FaultInjector()
+        cls.server = StandinServer(faults=cls.faults).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.faults.set_rules([])
+        self.client = Client('key', self.server.base_url, 'pooled')
+        self.households = []
+        for _ in range(3):
+            household_id = self.client.post_household(SEED_HOUSEHOLD).json()['id']
+            self.client.post_stock(household_id, SEED_STOCK)
+            self.households.append(household_id)
+
+    def tearDown(self):
+        self.client.close()
+
+    def on_hand(self, household_id):
+        return {item['id']: item['on_hand'] for item in self.client.get_stock(household_id).json()}
+
+    def test_reconcile(self):
+        a, b, c = self.households
+        rows = list(enumerate([
+            {'household_id': a, 'stock_id': '1310035849', 'count': '7'},
+            {'household_id': a, 'stock_id': '1470432411', 'count': 8},
+            {'household_id': b, 'stock_id': '1310035849', 'count': 0},
+            {'household_id': b, 'stock_id': 'not-on-the-list', 'count': 1},
+            {'household_id': b, 'stock_id': '1470432411', 'count': 'many'},
+            # a second count of the same item in a later batch of the same household wins
+            {'household_id': a, 'stock_id': '1310035849', 'count': 2},
+            {'stock_id': '1470432411', 'count': 1},
+            {'household_id': 'no-such-household', 'stock_id': '1310035849', 'count': 1},
+        ], 1))
+        reconciler = CountReconciler(self.client, household_id=c, batch_size=2)
+        results = reconciler.reconcile(rows)
+
+        states = {(r['household_id'], r['stock_id'], tuple(r['rows'])): r['state'] for r in results}
+        self.assertEqual(states, {
+            (a, '1310035849', (1,)): 'posted',
+            (a, '1470432411', (2,)): 'unchanged',
+            (b, '1310035849', (3,)): 'posted',
+            (b, 'not-on-the-list', (4,)): 'unknown_item',
+            (b, '1470432411', (5,)): 'invalid',
+            (a, '1310035849', (6,)): 'posted',
+            (c, '1470432411', (7,)): 'posted',
+            ('no-such-household', '1310035849', (8,)): 'failed',
+        })
+        self.assertEqual(reconciler.counts, {'posted': 4, 'unchanged': 1, 'unknown_item': 1, 'invalid': 1,
+                                             'failed': 1})
+        self.assertEqual(self.on_hand(a), {'1310035849': 2, '1470432411': 8})
+        self.assertEqual(self.on_hand(b), {'1310035849': 0, '1470432411': 8})
+        self.assertEqual(self.on_hand(c), {'1310035849': 3, '1470432411': 1})
+        history = self.client.get_transactions(a, '1310035849').json()
+        self.assertEqual([(t['type'], t['quantity']) for t in history], [('add', 4), ('remove', 5)])
+
+        for name in ('read', 'fetch', 'diff', 'post'):
+            stats = reconciler.stats[name].to_dict()
+            self.assertEqual(stats['rows'], 8, name)
+            self.assertGreater(stats['throughput'], 0, name)
+
+    def test_count_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'counts.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('household_id,stock_id,count\n')
+            for household_id in self.households:
+                f.write('%s,1310035849,4\n%s,1470432411,9\n' % (household_id, household_id))
+        reconciler = CountReconciler(self.client)
+        results = reconciler.reconcile(read_counts(path))
+        self.assertEqual(reconciler.counts, {'posted': 6})
+        self.assertEqual({r['delta'] for r in results}, {1})
+        for household_id in self.households:
+            self.assertEqual(self.on_hand(household_id), {'1310035849': 4, '1470432411': 9})
+
+    def test_fetches_run_concurrently(self):
+        self.faults.set_rules([Rule('GET *', latency=0.05)])
+        rows = list(enumerate([{'household_id': h, 'stock_id': '1310035849', 'count': 3} for h in self.households]))
+        reconciler = CountReconciler(self.client, fetch_workers=3)
+        self.assertEqual(reconciler.counts, {})
+        reconciler.reconcile(rows)
+        self.assertEqual(reconciler.counts, {'unchanged': 3})
+        self.assertLess(reconciler.stats['fetch'].elapsed, 0.14)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+import threading
+import time
+import unittest
+
+from saim import Client
+from saim.client import HOUSEHOLD, LISTS, STOCK, TRANSACTIONS
+from saim.export import Exporter, export
+from saim.transport import Response
+
+
+class FakeTransport:
+    # every household has a main list with two stock items, each with one transaction; 'bad_id' is unauthorized
+    def send(self, request, timeout=None):
+        parts = request.url.split('/households/')[1].split('/')
+        household_id = parts[0]
+        if household_id == 'bad_id':
+            return self.reply(401, {'error': {'error_title': 'Unauthorized', 'control_code': '7010'}})
+        if request.template == HOUSEHOLD:
+            return self.reply(200, {'id': household_id, 'first_name': 'John', 'last_name': 'Doe'})
+        if request.template == LISTS:
+            return self.reply(200, [{'description': 'default', 'id': 'main'}])
+        if request.template == STOCK:
+            return self.reply(200, [{'id': '1310035849', 'title': 'a title', 'on_hand': 3, 'on_order': 0,
+                                     'min': 2, 'max': 5},
+                                    {'id': '1470432411', 'title': 'any old title', 'on_hand': 8, 'on_order': 0,
+                                     'min': 4, 'max': 10}])
+        if request.template == TRANSACTIONS:
+            return self.reply(200, [{'type': 'add', 'quantity': 10, 'date': '2017-01-01'}])
+        raise AssertionError(request.url)
+
+    def reply(self, status, body):
+        return Response(status, json.dumps(body).encode())
+
+    def close(self):
+        pass
+
+
+class SlowTransport(FakeTransport):
+    def send(self, request, timeout=None):
+        time.sleep(0.02)
+        return super().send(request, timeout)
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.client = Client('key', 'http://saim.test/saim/v1', transport=FakeTransport())
+
+    def test_ndjson(self):
+        out = io.StringIO()
+        counts = export(self.client, ['1001', '1002', 'bad_id'], out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        self.assertEqual(counts, {'household': 2, 'list': 2, 'stock': 4, 'transaction': 4, 'error': 2})
+        self.assertEqual(len(records), 14)
+        self.assertIn({'record': 'transaction', 'household_id': '1002', 'list_id': 'main', 'stock_id': '1470432411',
+                       'type': 'add', 'quantity': 10, 'date': '2017-01-01'}, records)
+        errors = [r for r in records if r['record'] == 'error']
+        self.assertEqual({r['call'] for r in errors}, {'household', 'lists'})
+        self.assertEqual(errors[0]['error']['control_code'], '7010')
+
+    def test_csv(self):
+        out = io.StringIO()
+        export(self.client, ['1001'], out, 'csv', transactions=False)
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+
+        self.assertEqual([row['record'] for row in rows].count('stock'), 2)
+        self.assertEqual(rows[-1]['household_id'], '1001')
+
+    def test_household_ids_are_read_lazily(self):
+        consumed = []
+
+        def household_ids():
+            for n in range(100):
+                consumed.append(n)
+                yield str(1000 + n)
+
+        first = []
+
+        def write(record):
+            if not first:
+                first.append(len(consumed))
+
+        counts = Exporter(self.client, max_households=2, buffer=4).export(household_ids(), write)
+
+        self.assertEqual(counts['household'], 100)
+        self.assertLessEqual(first[0], 3)
+
+    def test_failing_input(self):
+        def household_ids():
+            yield '1001'
+            raise OSError('ids file went away')
+
+        out = io.StringIO()
+        with self.assertRaisesRegex(OSError, 'ids file went away'):
+            export(self.client, household_ids(), out)
+
+    def test_failing_writer(self):
+        consumed = []
+
+        def household_ids():
+            for n in range(100):
+                consumed.append(n)
+                yield str(1000 + n)
+
+        def write(record):
+            if record['record'] == 'stock':
+                raise OSError('disk full')
+
+        # slow enough for calls to be queued when the export is abandoned
+        client = Client('key', 'http://saim.test/saim/v1', transport=SlowTransport())
+        threads = set(threading.enumerate())
+        with self.assertRaisesRegex(OSError, 'disk full'):
+            Exporter(client, max_workers=1, max_households=2, buffer=4).export(household_ids(), write)
+
+        # nothing is left waiting for the household trees that were dropped: the feeder and the workers all end
+        deadline = time.monotonic() + 2
+        while set(threading.enumerate()) - threads and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(set(threading.enumerate()) - threads, set())
+        self.assertLess(len(consumed), 100)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
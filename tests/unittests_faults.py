@@ -0,0 +1,100 @@
+import time
+import unittest
+
+from saim import Client, TransportError
+from saim.faults import FaultInjector, Rule
+from saim.fixtures import SEED_HOUSEHOLD
+from saim.standin import StandinServer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestFaultInjector(unittest.TestCase):
+    def test_routes_and_bursts(self):
+        faults = FaultInjector([Rule('GET /households/*', burst=(2, 5), status=502)])
+        statuses = [faults.plan('GET', '/households/1001').status for _ in range(10)]
+        self.assertEqual(statuses, [502, 502, None, None, None] * 2)
+        self.assertIsNone(faults.plan('PUT', '/households/1001').status)
+        self.assertIsNone(faults.plan('GET', '/products').status)
+        self.assertEqual(faults.counts['errors'], 4)
+
+    def test_latency_distributions(self):
+        faults = FaultInjector([Rule(latency={'dist': 'uniform', 'low': 0.1, 'high': 0.2})], seed=1)
+        delays = [faults.plan('GET', '/products').delay for _ in range(100)]
+        self.assertTrue(all(0.1 <= d <= 0.2 for d in delays))
+        faults.set_rules([Rule(latency={'dist': 'lognormal', 'median': 0.05, 'sigma': 0.5})])
+        delays = sorted(faults.plan('GET', '/products').delay for _ in range(1001))
+        self.assertAlmostEqual(delays[500], 0.05, delta=0.01)
+
+    def test_scenario_phases(self):
+        clock = Clock()
+        faults = FaultInjector.from_scenario({'seed': 1, 'phases': [
+            {'duration': 10, 'rules': []},
+            {'duration': 5, 'rules': [{'route': '*', 'errors': 1.0, 'status': 503}]}]}, clock=clock)
+
+        self.assertIsNone(faults.plan('GET', '/products').status)
+        clock.now = 12
+        self.assertEqual(faults.phase(), 1)
+        self.assertEqual(faults.plan('GET', '/products').status, 503)
+        clock.now = 16
+        self.assertIsNone(faults.plan('GET', '/products').status)
+
+
+class TestFaultyStandin(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.faults = FaultInjector()
+        cls.server = StandinServer(faults=cls.faults).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.faults.set_rules([])
+        self.client = Client('key', self.server.base_url, 'pooled', timeout=5)
+        self.household_id = self.client.post_household(SEED_HOUSEHOLD).json()['id']
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_errors(self):
+        self.faults.set_rules([Rule('GET /households/*', errors=1.0, status=503)])
+        resp = self.client.get_household(self.household_id)
+        self.assertEqual(resp.status, 503)
+        self.assertEqual(resp.error['control_code'], '503')
+        self.assertTrue(self.client.get_products().ok)
+
+    def test_latency_and_drip(self):
+        self.faults.set_rules([Rule('GET *', latency=0.1)])
+        self.assertGreaterEqual(self.client.get_household(self.household_id).elapsed, 0.1)
+
+        self.faults.set_rules([Rule('GET /products', drip=1.0, drip_chunk=100, drip_interval=0.02)])
+        start = time.perf_counter()
+        resp = self.client.get_products()
+        self.assertTrue(resp.ok)
+        self.assertGreater(time.perf_counter() - start, 0.1)
+
+    def test_drop_and_truncate(self):
+        for transport in ('pooled', 'urllib'):
+            with Client('key', self.server.base_url, transport, timeout=5) as client:
+                self.faults.set_rules([Rule('GET *', drop=1.0)])
+                with self.assertRaises(TransportError):
+                    client.get_household(self.household_id)
+
+                self.faults.set_rules([Rule('GET *', truncate=1.0)])
+                with self.assertRaises(TransportError):
+                    client.get_household(self.household_id)
+
+                self.faults.set_rules([])
+                self.assertTrue(client.get_household(self.household_id).ok)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
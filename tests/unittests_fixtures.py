@@ -0,0 +1,103 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from saim import Client
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK, HouseholdPool, PoolError
+from saim.standin import StandinServer
+
+
+class TestHouseholdPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.state = os.path.join(self.dir, 'pool.json')
+        self.client = Client('key', self.server.base_url, 'pooled')
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.dir)
+
+    def test_provision_and_lease(self):
+        pool = HouseholdPool(self.client, self.state)
+        created = pool.provision(3)
+
+        self.assertEqual(len(created), 3)
+        self.assertEqual(pool.provision(3), [])
+        self.assertEqual(self.client.get_stock(created[0]).json(), SEED_STOCK)
+
+        leases = [pool.lease() for _ in range(3)]
+        self.assertEqual(sorted(lease.household_id for lease in leases), sorted(created))
+        with self.assertRaises(PoolError):
+            pool.lease()
+
+        # another process with the same state file sees them as taken
+        other = HouseholdPool(self.client, self.state)
+        with self.assertRaises(PoolError):
+            other.lease()
+
+        released = leases[1].household_id
+        leases[1].release()
+        with other.lease() as lease:
+            self.assertEqual(lease.household_id, released)
+
+    def test_reset(self):
+        pool = HouseholdPool(self.client, self.state)
+        household_id, = pool.provision(1)
+        self.client.put_household(household_id, {'last_name': 'Smith'})
+        self.client.delete_stock_item(household_id, '1470432411')
+        self.client.put_stock_item(household_id, '1310035849', {'max': 15})
+        self.client.post_stock(household_id, [{'id': '999', 'min': 1}])
+
+        pool.reset()
+
+        self.assertEqual(self.client.get_household(household_id).json(), dict(SEED_HOUSEHOLD, id=household_id))
+        self.assertEqual(sorted(self.client.get_stock(household_id).json(), key=lambda item: item['id']), SEED_STOCK)
+
+    def test_release_resets(self):
+        pool = HouseholdPool(self.client, self.state)
+        pool.provision(1)
+        with pool.lease() as lease:
+            household_id = lease.household_id
+            self.client.put_household(household_id, {'last_name': 'Smith'})
+            self.client.delete_stock_item(household_id, '1470432411')
+
+        self.assertEqual(self.client.get_household(household_id).json()['last_name'], 'Doe')
+        self.assertEqual(sorted(self.client.get_stock(household_id).json(), key=lambda item: item['id']), SEED_STOCK)
+        self.assertFalse(os.path.exists(pool._lock_path(household_id)))
+
+    def test_reset_leaves_live_leases(self):
+        pool = HouseholdPool(self.client, self.state)
+        live, crashed, free = pool.provision(3)
+        lease = pool.lease()
+        self.assertEqual(lease.household_id, live)
+        self.client.put_household(live, {'last_name': 'In use'})
+        # a worker that died holding a lease
+        worker = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True)
+        with open(pool._lock_path(crashed), 'w', encoding='utf-8') as f:
+            json.dump({'pid': int(worker.stdout), 'host': socket.gethostname()}, f)
+        self.client.put_household(crashed, {'last_name': 'Crashed'})
+
+        self.assertEqual(sorted(HouseholdPool(self.client, self.state).reset()), sorted([crashed, free]))
+
+        self.assertEqual(self.client.get_household(live).json()['last_name'], 'In use')
+        self.assertEqual(self.client.get_household(crashed).json()['last_name'], 'Doe')
+        self.assertTrue(os.path.exists(pool._lock_path(live)))
+        self.assertFalse(os.path.exists(pool._lock_path(crashed)))
+        lease.release()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from saim import Client
+from saim.client import HOUSEHOLDS, STOCK
+from saim.errors import TransportError
+from saim.importer import Importer, load_keys, load_results, read_rows
+from saim.transport import Response
+
+
+class FakeTransport:
+    def __init__(self, fail_on=()):
+        self.posts = []
+        self.fail_on = fail_on
+        self._lock = threading.Lock()
+
+    def send(self, request, timeout=None):
+        body = json.loads(bytes(request.body).decode())
+        with self._lock:
+            self.posts.append((request.template, request.url, body))
+            n = len(self.posts)
+        if request.template == HOUSEHOLDS:
+            if body['last_name'] in self.fail_on:
+                raise TransportError('connection reset')
+            if body['last_name'] == 'Opaque':
+                return Response(201, b'Created')
+            return Response(201, json.dumps({'id': str(5000 + n)}).encode())
+        if request.template == STOCK:
+            if '/households/bad/' in request.url:
+                return Response(401, json.dumps({'error': {'error_title': 'Unauthorized',
+                                                           'control_code': '7010'}}).encode())
+            return Response(200, b'{"message": "Update successful."}')
+        raise AssertionError(request.url)
+
+    def close(self):
+        pass
+
+
+class TestImporter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.results = os.path.join(self.dir, 'results.ndjson')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def households(self):
+        return self.write('households.csv',
+                          'key,first_name,last_name,address,email,primary_phone\n'
+                          'a,John,Doe,Cardboard Box #3,homeless@nowhere.com,(123) 456-7890\n'
+                          'b,John,Doe,,homeless@nowhere,(123) 456-7890\n'
+                          'c,Jane,Roe,House,jane@roe.com,\n'
+                          'd,Jim,Flaky,House,jim@flaky.com,\n')
+
+    def test_households_and_resume(self):
+        path = self.households()
+        transport = FakeTransport(fail_on=['Flaky'])
+        client = Client('key', 'http://saim.test/saim/v1', transport=transport)
+
+        counts = Importer(client, self.results).import_households(read_rows(path))
+        results = load_results(self.results)
+
+        self.assertEqual(counts, {'ok': 2, 'failed': 1, 'unknown': 1})
+        self.assertEqual(results[2]['error']['control_code'], '7020')
+        self.assertEqual(sorted(results[2]['error']['error_message']), ['address', 'email'])
+        self.assertEqual(results[4]['state'], 'unknown')
+        self.assertEqual(set(load_keys(self.results)), {'a', 'c'})
+
+        # running again creates nothing new, even for the row whose outcome is unknown
+        transport.fail_on = []
+        counts = Importer(client, self.results).import_households(read_rows(path))
+        self.assertEqual(counts, {'skipped': 4})
+        self.assertEqual(len(transport.posts), 3)
+
+        counts = Importer(client, self.results, retry_unknown=True).import_households(read_rows(path))
+        self.assertEqual(counts, {'skipped': 3, 'ok': 1})
+        self.assertEqual(load_results(self.results)[4]['state'], 'ok')
+
+    def test_in_flight_rows_are_not_resubmitted(self):
+        path = self.households()
+        with open(self.results + '.submitted', 'w') as f:
+            f.write('1\n')
+        transport = FakeTransport()
+        client = Client('key', 'http://saim.test/saim/v1', transport=transport)
+
+        counts = Importer(client, self.results).import_households(read_rows(path))
+
+        self.assertEqual(counts, {'unknown': 1, 'skipped': 1, 'failed': 1, 'ok': 2})
+        self.assertEqual(len(transport.posts), 2)
+
+    def test_unreadable_line_and_response(self):
+        rows = [{'key': 'a', 'first_name': 'John', 'last_name': 'Doe', 'address': 'Cardboard Box #3',
+                 'email': 'homeless@nowhere.com', 'primary_phone': '(123) 456-7890'},
+                {'key': 'o', 'first_name': 'Otto', 'last_name': 'Opaque', 'address': 'House',
+                 'email': 'otto@opaque.com'}]
+        path = self.write('households.ndjson', '\n'.join([json.dumps(rows[0]), '{"key": "b", "first_name": ',
+                                                          '[1, 2]', json.dumps(rows[1])]))
+        transport = FakeTransport()
+        client = Client('key', 'http://saim.test/saim/v1', transport=transport)
+
+        counts = Importer(client, self.results).import_households(read_rows(path))
+        results = load_results(self.results)
+
+        self.assertEqual(counts, {'ok': 2, 'failed': 2})
+        self.assertTrue(results[2]['error'].startswith('malformed json'))
+        self.assertEqual(results[3]['error'], 'not a json object')
+        self.assertEqual((results[4]['state'], results[4]['id']), ('ok', None))
+        self.assertEqual(set(load_keys(self.results)), {'a'})
+
+    def test_stock_batches(self):
+        path = self.write('stock.ndjson', '\n'.join(json.dumps(row) for row in [
+            {'household_key': 'a', 'id': '1310035849', 'title': 'a title', 'on_hand': 3, 'min': 2, 'max': 5},
+            {'household_key': 'a', 'id': '1470432411', 'title': 'any old title', 'on_hand': 8, 'min': 4},
+            {'household_id': '1001', 'id': '1310035849', 'on_hand': 1, 'min': 1},
+            {'household_id': '1001', 'id': '1470432411', 'on_hand': 1},
+            {'household_id': 'bad', 'id': '1310035849', 'min': 1},
+            {'household_key': 'zzz', 'id': '1310035849', 'min': 1}
+        ]))
+        transport = FakeTransport()
+        client = Client('key', 'http://saim.test/saim/v1', transport=transport)
+
+        counts = Importer(client, self.results).import_stock(read_rows(path), {'a': '5001'}, batch_size=10)
+        results = load_results(self.results)
+
+        self.assertEqual(counts, {'failed': 3, 'ok': 3})
+        self.assertEqual(len(transport.posts), 3)
+        self.assertEqual(len(transport.posts[0][2]), 2)
+        self.assertEqual(results[4]['error']['error_message'], {'min': ['required field']})
+        self.assertEqual(results[5]['error']['control_code'], '7010')
+        self.assertEqual(results[6]['error']['error_message'], {'household_id': ['unknown household_key']})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from saim import Client
+from saim.client import STOCK
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.ledger import Ledger
+from saim.standin import StandinServer
+
+KEY = ('h', 'main', '1')
+
+
+class Racing:
+    # a client that posts a transaction right after the stock list was read, before the histories are
+    def __init__(self, client, household_id, stock_id):
+        self.client = client
+        self.household_id = household_id
+        self.stock_id = stock_id
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def request_json(self, method, template, params=None, body=None):
+        data = self.client.request_json(method, template, params, body)
+        if template == STOCK:
+            self.client.post_transaction(self.household_id, self.stock_id, {'type': 'add', 'quantity': 1})
+        return data
+
+
+class TestLedger(unittest.TestCase):
+    def test_ingest_only_applies_new_transactions(self):
+        ledger = Ledger()
+        ledger.open(KEY, opening=3)
+        history = [{'type': 'add', 'quantity': 5, 'date': '1'}, {'type': 'remove', 'quantity': 2, 'date': '2'}]
+
+        self.assertEqual(len(ledger.ingest(KEY, history)), 2)
+        self.assertEqual(ledger.balance(KEY), 6)
+
+        history.append({'type': 'add', 'quantity': 1, 'date': '3'})
+        self.assertEqual(ledger.ingest(KEY, history), [history[-1]])
+        self.assertEqual(ledger.ingest(KEY, history), [])
+        self.assertEqual(ledger.totals(KEY), {'opening': 3, 'added': 6, 'removed': 2, 'balance': 7,
+                                              'transactions': 3})
+        self.assertIsNone(ledger.check(KEY, 7))
+        self.assertEqual(ledger.check(KEY, 9).drift, 2)
+
+    def test_rewritten_history_is_replayed(self):
+        ledger = Ledger()
+        ledger.ingest(KEY, [{'type': 'add', 'quantity': 5, 'date': '1'}])
+        ledger.ingest(KEY, [{'type': 'add', 'quantity': 1, 'date': '2'}])
+
+        self.assertEqual(ledger.balance(KEY), 1)
+        self.assertEqual(ledger.replays, 1)
+
+    def test_unknown_type(self):
+        with self.assertRaises(ValueError):
+            Ledger().append(KEY, [{'type': 'steal', 'quantity': 1}])
+
+    def test_save_and_load(self):
+        ledger = Ledger()
+        history = [{'type': 'add', 'quantity': 5, 'date': '1'}]
+        ledger.ingest(KEY, history)
+        ledger.ingest(('h|2', 'main', '1'), history)
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'ledger.json')
+            ledger.save(path)
+            loaded = Ledger.load(path)
+        finally:
+            shutil.rmtree(directory)
+
+        history.append({'type': 'remove', 'quantity': 1, 'date': '2'})
+        self.assertEqual(loaded.balance(('h|2', 'main', '1')), 5)
+        self.assertEqual(len(loaded.ingest(KEY, history)), 1)
+        self.assertEqual(loaded.balance(KEY), 4)
+        self.assertEqual(loaded.replays, 0)
+
+
+class TestReconcile(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.client = Client('key', self.server.base_url, 'pooled')
+        self.household_id = self.client.post_household(SEED_HOUSEHOLD).json()['id']
+        self.client.post_stock(self.household_id, SEED_STOCK)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_drift(self):
+        ledger = Ledger()
+        self.client.post_transaction(self.household_id, '1310035849', {'type': 'add', 'quantity': 4})
+        self.assertEqual(ledger.reconcile(self.client, self.household_id), [])
+        key = (self.household_id, 'main', '1310035849')
+        self.assertEqual(ledger.totals(key)['opening'], 3)
+
+        self.client.post_transaction(self.household_id, '1310035849', {'type': 'remove', 'quantity': 2})
+        self.client.post_transaction(self.household_id, '1470432411', {'type': 'add', 'quantity': 1})
+        self.assertEqual(ledger.reconcile(self.client, self.household_id), [])
+        self.assertEqual(ledger.balance(key), 5)
+
+        # on_hand changed without a transaction
+        self.client.put_stock_item(self.household_id, '1470432411', {'on_hand': 20})
+        drifts = ledger.reconcile(self.client, self.household_id)
+        self.assertEqual([(d.key[2], d.on_hand, d.expected, d.drift) for d in drifts],
+                         [('1470432411', 20, 9, 11)])
+
+        self.client.delete_stock_item(self.household_id, '1470432411')
+        ledger.reconcile(self.client, self.household_id)
+        self.assertNotIn((self.household_id, 'main', '1470432411'), ledger)
+
+    def test_transaction_between_list_and_history(self):
+        ledger = Ledger()
+        racing = Racing(self.client, self.household_id, '1310035849')
+        self.assertEqual(ledger.reconcile(racing, self.household_id), [])
+        key = (self.household_id, 'main', '1310035849')
+        self.assertEqual(ledger.totals(key)['opening'], 3)
+
+        self.assertEqual(ledger.reconcile(racing, self.household_id), [])
+        self.assertEqual(ledger.balance(key), 5)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,154 @@
+import threading
+import time
+import unittest
+
+from saim import Client
+from saim.client import PRODUCTS
+from saim.errors import NotSentError, TransportError
+from saim.faults import FaultInjector, Rule
+from saim.limiter import AdaptiveLimiter
+from saim.standin import StandinServer
+
+
+class TestLimit(unittest.TestCase):
+    def limit(self, **kwargs):
+        return AdaptiveLimiter(**kwargs).limit_for('GET', PRODUCTS)
+
+    def test_increase_when_used(self):
+        limit = self.limit(initial=4, max_limit=6)
+        # one at a time is less than half the limit: no reason to raise it
+        for _ in range(20):
+            limit.release(limit.acquire(), 0.01)
+        self.assertEqual(limit.limit, 4)
+
+        # four at a time: +1/limit per answer, never past max_limit
+        for _ in range(30):
+            started = [limit.acquire() for _ in range(4)]
+            for start in started:
+                limit.release(start, 0.01)
+        self.assertEqual(limit.limit, 6)
+        self.assertEqual(limit.decreases, 0)
+
+    def test_cut_once_per_overload(self):
+        limit = self.limit(initial=10, backoff=0.5)
+        started = [limit.acquire() for _ in range(10)]
+        self.assertIsNone(limit.acquire(timeout=0.01))
+        # every request in flight got a 429; they count as one overload
+        for start in started:
+            limit.release(start, 0.01, overloaded=True)
+        self.assertEqual((limit.limit, limit.decreases, limit.overloads), (5, 1, 10))
+        # requests sent after the cut cut again
+        limit.release(limit.acquire(), 0.01, overloaded=True)
+        self.assertEqual(limit.limit, 2.5)
+        for _ in range(5):
+            limit.release(limit.acquire(), overloaded=True)
+        self.assertEqual(limit.limit, 1)
+
+    def test_latency(self):
+        limit = self.limit(initial=10, backoff=0.5, tolerance=2.0, slack=0.0, window=10)
+        for _ in range(5):
+            limit.release(limit.acquire(), 0.010)
+        self.assertEqual(limit.baseline, 0.010)
+        limit.release(limit.acquire(), 0.019)
+        self.assertEqual(limit.limit, 10)
+        # one slow answer doesn't make the smoothed latency twice the baseline, a run of them does
+        limit.release(limit.acquire(), 0.050)
+        self.assertEqual(limit.limit, 10)
+        for _ in range(5):
+            limit.release(limit.acquire(), 0.050)
+        self.assertEqual(limit.limit, 5)
+
+        # a lasting slowdown: after a window or two, 50ms is the new baseline and the limit stops going down
+        for _ in range(40):
+            limit.release(limit.acquire(), 0.050)
+        self.assertEqual(limit.baseline, 0.050)
+        decreases = limit.decreases
+        for _ in range(10):
+            limit.release(limit.acquire(), 0.050)
+        self.assertEqual(limit.decreases, decreases)
+
+    def test_waiters(self):
+        limit = self.limit(initial=2)
+        started = [limit.acquire(), limit.acquire()]
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(limit.acquire(timeout=5)))
+        waiter.start()
+        while not limit.waiting:
+            time.sleep(0.001)
+        self.assertEqual(limit.to_dict()['waiting'], 1)
+        limit.release(started[0], 0.01)
+        waiter.join()
+        self.assertIsNotNone(got[0])
+        self.assertEqual(limit.in_flight, 2)
+
+
+class TestAdaptiveClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.faults = FaultInjector()
+        cls.server = StandinServer(faults=cls.faults).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def hammer(self, client, calls, workers=16):
+        statuses = []
+        for _, resp, error in client.map(lambda _: client.get_products(), range(calls), max_workers=workers):
+            statuses.append(error or resp.status)
+        return statuses
+
+    def test_grows_while_healthy(self):
+        # 10ms whatever the load: nothing holds the limit back. the slack keeps the scheduling delays of a busy
+        # machine from passing for a slowdown
+        self.faults.set_rules([Rule('GET /products', latency=0.01)])
+        limiter = AdaptiveLimiter(initial=2, max_limit=12, slack=0.05)
+        with Client('key', self.server.base_url, 'pooled', limiter=limiter) as client:
+            self.assertEqual(set(self.hammer(client, 300)), {200})
+        stats = limiter.stats()['GET /products']
+        self.assertGreaterEqual(stats['limit'], 8)
+        self.assertEqual(stats['in_flight'], 0)
+
+    def test_backs_off_on_429(self):
+        # a server that works on 4 requests at a time and turns away the rest
+        rule = Rule('GET /products', latency=0.01, capacity=4, queue=0)
+        self.faults.set_rules([rule])
+        limiter = AdaptiveLimiter(initial=16, max_limit=32)
+        with Client('key', self.server.base_url, 'pooled', limiter=limiter, metrics=True) as client:
+            statuses = self.hammer(client, 400)
+            limit = limiter.limit_for('GET', PRODUCTS)
+            self.assertLessEqual(limit.limit, 8)
+            self.assertGreater(limit.decreases, 0)
+            self.assertEqual(client.metrics.value('saim_concurrency_limit', ('GET', PRODUCTS)), int(limit.limit))
+            self.assertEqual(client.metrics.value('saim_concurrency_waiting', ('GET', PRODUCTS)), 0)
+        # a fixed 16 workers would get most of their requests turned away
+        self.assertLess(statuses.count(429), len(statuses) / 4)
+        self.assertEqual(rule.shed, statuses.count(429))
+
+    def test_backs_off_when_slow(self):
+        # the same server queueing instead of turning requests away: latency grows with the requests in flight
+        self.faults.set_rules([Rule('GET /products', latency=0.02, capacity=4)])
+        limiter = AdaptiveLimiter(initial=16, max_limit=32)
+        with Client('key', self.server.base_url, 'pooled', limiter=limiter) as client:
+            self.assertEqual(set(self.hammer(client, 300)), {200})
+        # it keeps probing upward and cutting back, somewhere around twice the server's capacity
+        limit = limiter.limit_for('GET', PRODUCTS)
+        self.assertLess(limit.limit, 14)
+        self.assertEqual(limit.overloads, 0)
+        self.assertGreater(limit.decreases, 0)
+
+    def test_slot_timeout(self):
+        # one slot held for 0.3s: the other request gives up on it after 0.05s without going out, while the client's
+        # own timeout would have let it wait
+        self.faults.set_rules([Rule('GET /products', latency=0.3)])
+        limiter = AdaptiveLimiter(initial=1, max_limit=1, slot_timeout=0.05)
+        with Client('key', self.server.base_url, 'pooled', limiter=limiter) as client:
+            statuses = self.hammer(client, 2, workers=2)
+        errors = [status for status in statuses if status != 200]
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], NotSentError)
+        self.assertNotIsInstance(errors[0], TransportError)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
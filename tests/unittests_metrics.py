@@ -0,0 +1,167 @@
+import gc
+import re
+import threading
+import unittest
+import urllib.request
+import weakref
+
+from saim import Client
+from saim.cache import EntityCache
+from saim.client import HOUSEHOLD, HOUSEHOLDS, STOCK_ITEM
+from saim.errors import TransportError
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.metrics import DURATION, ERRORS, IN_FLIGHT, REQUESTS, MetricsServer, Registry
+from saim.standin import StandinServer
+from saim.transport import PooledTransport
+
+
+def parse(text):
+    # {(name, labels): value} of the sample lines
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = re.match(r'^(\w+)(\{.*\})? (\S+)$', line)
+        samples[(match.group(1), match.group(2) or '')] = float(match.group(3))
+    return samples
+
+
+class TestRegistry(unittest.TestCase):
+    def test_render(self):
+        registry = Registry(buckets=(0.1, 1.0))
+        registry.counter('jobs_total', 'Jobs.', ('kind',))
+        registry.gauge('depth', 'Queue depth.')
+        registry.histogram('wait_seconds', 'Wait.', ('kind',))
+        registry.inc('jobs_total', ('a "quoted"\nname',), 2)
+        registry.inc('depth', (), 3)
+        registry.inc('depth', (), -1)
+        for value in (0.05, 0.1, 0.5, 7):
+            registry.observe('wait_seconds', ('x',), value)
+
+        text = registry.render()
+        self.assertIn('# TYPE jobs_total counter', text)
+        self.assertIn('jobs_total{kind="a \\"quoted\\"\\nname"} 2\n', text)
+        self.assertIn('depth 2\n', text)
+        self.assertIn('wait_seconds_bucket{kind="x",le="0.1"} 2\n', text)
+        self.assertIn('wait_seconds_bucket{kind="x",le="1"} 3\n', text)
+        self.assertIn('wait_seconds_bucket{kind="x",le="+Inf"} 4\n', text)
+        self.assertIn('wait_seconds_sum{kind="x"} 7.65\n', text)
+        self.assertIn('wait_seconds_count{kind="x"} 4\n', text)
+
+        with self.assertRaises(ValueError):
+            registry.gauge('jobs_total', 'Jobs.', ('kind',))
+
+    def test_threads(self):
+        # every thread counts into its own shard; finished threads' counts are kept
+        registry = Registry()
+        registry.counter('n_total', 'N.')
+
+        def count():
+            for _ in range(10000):
+                registry.inc('n_total')
+
+        threads = [threading.Thread(target=count) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(registry.value('n_total'), 80000)
+        registry.inc('n_total')
+        self.assertEqual(registry.value('n_total'), 80001)
+        self.assertEqual(len(registry._shards), 1)
+
+
+class TestClientMetrics(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_requests(self):
+        with Client('key', self.server.base_url, 'pooled', metrics=True, cache=1 << 20, contracts=1.0) as client:
+            household_id = client.post_household(SEED_HOUSEHOLD).json()['id']
+            client.post_stock(household_id, SEED_STOCK)
+            for _ in range(3):
+                client.get_household(household_id)
+            client.get_stock_item(household_id, 'nope')
+            client.get_household('nope')
+            registry = client.metrics
+
+            self.assertEqual(registry.value(REQUESTS, ('POST', HOUSEHOLDS, '201', '')), 1)
+            # one from the server, two from the cache
+            self.assertEqual(registry.value(REQUESTS, ('GET', HOUSEHOLD, '200', '')), 1)
+            self.assertEqual(registry.value(REQUESTS, ('GET', STOCK_ITEM, '404', '1081')), 1)
+            self.assertEqual(registry.value(REQUESTS, ('GET', HOUSEHOLD, '401', '7010')), 1)
+            self.assertEqual(registry.value(IN_FLIGHT, ('GET', HOUSEHOLD)), 0)
+            self.assertEqual(registry.value('saim_cache_hits_total'), 2)
+            self.assertEqual(registry.value('saim_contract_checks_total'), 5)
+            self.assertEqual(registry.value('saim_contract_violations_total'), 0)
+            self.assertEqual(registry.value('saim_pool_connections_opened_total'), 1)
+            self.assertEqual(registry.value('saim_pool_connections_reused_total'), 4)
+            self.assertEqual(registry.value('saim_pool_connections', ('idle',)), 1)
+            self.assertEqual(registry.value('saim_pool_utilization'), 0.0)
+
+            samples = parse(registry.render())
+            self.assertEqual(samples[(DURATION + '_count', '{method="GET",endpoint="%s"}' % HOUSEHOLD)], 2)
+            self.assertEqual(samples[('saim_cache_hit_ratio', '')], 0.4)
+
+    def test_shared_registry(self):
+        registry = Registry()
+        cache = EntityCache()
+        pools = [PooledTransport() for _ in range(3)]
+        clients = [Client('key', self.server.base_url, pool, metrics=registry, cache=cache) for pool in pools]
+        household_id = clients[0].post_household(SEED_HOUSEHOLD).json()['id']
+        for client in clients:
+            client.get_products()
+            client.get_household(household_id)
+        # one connection out of three checked out
+        conn, _ = pools[0]._acquire(('http', '127.0.0.1', self.server.httpd.server_port), None)
+
+        self.assertEqual(registry.value('saim_pool_connections', ('idle',)), 2)
+        self.assertEqual(registry.value('saim_pool_connections', ('in_use',)), 1)
+        self.assertAlmostEqual(registry.value('saim_pool_utilization'), 1 / 3)
+        # the shared cache is read once: one miss, two hits
+        self.assertEqual(registry.value('saim_cache_hits_total'), 2)
+        self.assertAlmostEqual(registry.value('saim_cache_hit_ratio'), 2 / 3)
+        pools[0]._release(('http', '127.0.0.1', self.server.httpd.server_port), conn)
+
+        # closed clients aren't read any more, nor kept alive; their counters stay
+        opened = registry.value('saim_pool_connections_opened_total')
+        self.assertEqual(opened, 3)
+        for client in clients[1:]:
+            client.close()
+        closed = weakref.ref(clients.pop())
+        del client
+        gc.collect()
+        self.assertIsNone(closed())
+        self.assertEqual(registry.value('saim_pool_connections', ('idle',)), 1)
+        self.assertEqual(registry.value('saim_pool_connections_opened_total'), opened)
+        clients[0].close()
+        self.assertEqual(registry.value('saim_pool_connections_closed_total'), opened)
+        self.assertEqual(registry.value('saim_cache_hits_total'), 2)
+        self.assertNotIn(('saim_pool_connections', ('idle',)), registry.collect().values)
+
+    def test_transport_errors(self):
+        with Client('key', 'http://127.0.0.1:1/saim/v1', 'pooled', metrics=True) as client:
+            with self.assertRaises(TransportError):
+                client.get_household('1001')
+            self.assertEqual(client.metrics.value(ERRORS, ('GET', HOUSEHOLD)), 1)
+            self.assertEqual(client.metrics.value(IN_FLIGHT, ('GET', HOUSEHOLD)), 0)
+
+    def test_server(self):
+        registry = Registry()
+        with Client('key', self.server.base_url, metrics=registry) as client:
+            client.get_products()
+        with MetricsServer(registry, port=0) as server:
+            with urllib.request.urlopen(server.url) as resp:
+                self.assertTrue(resp.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+                samples = parse(resp.read().decode())
+        self.assertEqual(samples[(REQUESTS, '{method="GET",endpoint="/products",status="200",control_code=""}')], 1)
+        self.assertNotIn(('saim_pool_connections_opened_total', ''), samples)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,8 +1,11 @@
 import json
+import os
 import unittest
 import urllib.error
 import urllib.request
 
+from saim import cassette, fixtures, profiling
+
 
 base_url = 'https://apisb.shop.com/saim/v1'
 api_key = 'your-api-key-here'
@@ -10,6 +13,16 @@ api_key = 'your-api-key-here'
 # if you run TestHouseholds.test_post_households(), this will be overwritten in memory as intended
 household_id = '1001'
 
+# set SAIM_CASSETTE=<file> to record this run's traffic to a cassette the first time and replay it offline after that
+# (SAIM_CASSETTE_MODE=record|replay to force one or the other, SAIM_REPLAY_LATENCY=1 to replay with original timings)
+cassette.install_from_env()
+
+# set SAIM_FIXTURE_POOL=<pool.json> to run against a pre-created household leased from a fixture pool (see
+# saim.fixtures) instead of the one test_1_post_households creates, so the other tests don't depend on it running first
+household_lease = fixtures.lease_from_env(base_url, api_key)
+if household_lease is not None:
+    household_id = household_lease.household_id
+
 
 def get_response(req):
     try:
@@ -49,7 +62,8 @@ class TestHouseholds(unittest.TestCase):
         # this allows a global override of the household id so that all the other methods
         # can use this variable
         global household_id
-        household_id = resp['id']
+        if household_lease is None:
+            household_id = resp['id']
 
         self.assertTrue('id' in resp.keys())
         self.assertEqual(resp_code, 201)
@@ -720,9 +734,17 @@ if __name__ == '__main__':
 
     run_all = False
 
+    # set SAIM_PROFILE=<file.json> to get each test's time split into request build / network / json decode+assert,
+    # a slowest-tests report and a json artifact to compare across builds (python -m saim.profiling --compare a b)
+    profile = os.environ.get('SAIM_PROFILE')
+    if profile:
+        test_runner = profiling.ProfilingTestRunner(verbosity=2, artifact=profile)
+    else:
+        test_runner = unittest.TextTestRunner(verbosity=2)
+
     if run_all:
         # to run all tests, which will be in alphabetical order in the classes not in the order they are listed
-        unittest.main(verbosity=2)
+        unittest.main(testRunner=test_runner)
     else:
         # if using Eclipse, this should work fine as is;
         # if using PyCharm (presumably also IDEA), you have to go to some extra lengths to make sure it doesn't just
@@ -770,4 +792,4 @@ if __name__ == '__main__':
         test_suite.addTest(TestProducts('test_get_products_item'))
         test_suite.addTest(TestProducts('test_get_products_item_long_product_id'))
 
-        unittest.TextTestRunner(verbosity=2).run(test_suite)
+        test_runner.run(test_suite)
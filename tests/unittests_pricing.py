@@ -0,0 +1,92 @@
+import random
+import unittest
+
+from saim import Client, pricing
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.standin import PRODUCTS_CATALOG, StandinServer
+
+if pricing.available():
+    import numpy as np
+
+
+def item(stock_id, on_hand, min, max, on_order=0):
+    return {'id': stock_id, 'title': 'a title', 'on_hand': on_hand, 'on_order': on_order, 'min': min, 'max': max}
+
+
+@unittest.skipUnless(pricing.available(), 'needs numpy')
+class TestRestock(unittest.TestCase):
+    def test_quantities(self):
+        quantity = pricing.restock_quantities(on_hand=[3, 2, 1, 1, 0, 9],
+                                              on_order=[0, 0, 3, 0, 0, 0],
+                                              minimum=[2, 3, 4, 4, 2, 4],
+                                              maximum=[5, 6, 10, 0, 1, 10])
+        # at min: nothing; below min: up to max; on order counts; max missing or under min: up to min
+        np.testing.assert_array_equal(quantity, [0, 4, 0, 3, 2, 0])
+
+    def test_cart(self):
+        prices = pricing.PriceTable.from_products([
+            PRODUCTS_CATALOG[0],
+            {'id': '1310035849', 'price': 0.1},
+            {'id': '1470432411', 'price': 0.2},
+            {'id': '42', 'price': None}])
+        stock = pricing.StockColumns.from_lists({
+            '1001': [item('1207714220', 0, 2, 5), item('1310035849', 1, 2, 4), item('1470432411', 8, 4, 10)],
+            '1002': [item('1470432411', 0, 1, 3), item('42', 0, 1, 1), item('nope', 0, 1, 2)],
+            '1003': [item('1207714220', 5, 2, 5)]})
+        cart = pricing.restock(stock, prices)
+
+        self.assertEqual(cart.per_household(), {
+            '1001': {'items': 2, 'units': 8, 'cost': 223.05, 'unpriced': 0},
+            '1002': {'items': 3, 'units': 6, 'cost': 0.6, 'unpriced': 2},
+            '1003': {'items': 0, 'units': 0, 'cost': 0.0, 'unpriced': 0}})
+        self.assertEqual(cart.totals(), {'households': 2, 'items': 5, 'units': 14, 'cost': 223.65, 'unpriced': 2})
+        lines = list(cart.lines())
+        self.assertEqual(lines[0], {'household_id': '1001', 'stock_id': '1207714220', 'quantity': 5, 'price': 44.55,
+                                    'cost': 222.75})
+        self.assertEqual([line['price'] for line in lines], [44.55, 0.1, 0.2, None, None])
+
+    def test_against_loop(self):
+        rng = random.Random(1)
+        catalog = [{'id': str(n), 'price': round(rng.uniform(0.5, 80), 2)} for n in range(0, 400, 2)]
+        stock_lists = {str(1001 + h): [item(str(rng.randrange(400)), rng.randrange(10), rng.randrange(6),
+                                            rng.randrange(12), rng.randrange(3)) for _ in range(rng.randrange(40))]
+                       for h in range(50)}
+        cart = pricing.restock(pricing.StockColumns.from_lists(stock_lists),
+                               pricing.PriceTable.from_products(catalog))
+
+        prices = {product['id']: product['price'] for product in catalog}
+        expected = {}
+        for household_id, items in stock_lists.items():
+            cents = units = 0
+            for stock_item in items:
+                position = stock_item['on_hand'] + stock_item['on_order']
+                if position < stock_item['min']:
+                    quantity = max(stock_item['max'], stock_item['min']) - position
+                    units += quantity
+                    cents += quantity * round(prices.get(stock_item['id'], 0) * 100)
+            expected[household_id] = (units, cents / 100)
+        self.assertEqual({household_id: (totals['units'], totals['cost'])
+                          for household_id, totals in cart.per_household().items()}, expected)
+
+    def test_empty(self):
+        cart = pricing.restock(pricing.StockColumns.from_lists({'1001': []}), pricing.PriceTable([], []))
+        self.assertEqual(cart.totals(), {'households': 0, 'items': 0, 'units': 0, 'cost': 0.0, 'unpriced': 0})
+        self.assertEqual(cart.per_household()['1001']['units'], 0)
+
+    def test_collect(self):
+        with StandinServer() as server, Client('key', server.base_url, 'pooled') as client:
+            household_id = client.post_household(SEED_HOUSEHOLD).json()['id']
+            client.post_stock(household_id, SEED_STOCK + [item('1207714220', 1, 2, 4)])
+            client.post_transaction(household_id, '1470432411', {'type': 'remove', 'quantity': 7})
+            stock, prices = pricing.collect(client, [household_id])
+
+        self.assertEqual(len(stock), 3)
+        self.assertEqual(len(prices), len(PRODUCTS_CATALOG))
+        cart = pricing.restock(stock, prices)
+        # 1 of 1470432411 left (min 4, max 10) and 1 of 1207714220 (min 2, max 4)
+        self.assertEqual(cart.per_household()[household_id], {'items': 2, 'units': 12, 'cost': 133.65,
+                                                               'unpriced': 1})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,74 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+
+from saim import profiling
+from saim.standin import StandinServer
+
+server = None
+
+
+def sample_tests():
+    # shaped like the tests in unittests_plus.py, against the local stand-in; built on demand so the loader doesn't
+    # pick it up on its own
+    class SampleTests(unittest.TestCase):
+        def test_post_households(self):
+            req_json = json.dumps({'first_name': 'John', 'address': 'Cardboard Box #3'}).encode()
+            req = urllib.request.Request(server.base_url + '/households', data=req_json,
+                                         headers={'Content-Type': 'application/json', 'api_key': 'key'}, method='POST')
+            resp = urllib.request.urlopen(req)
+
+            self.assertTrue('id' in json.loads(resp.read().decode()))
+
+        def test_get_households_invalid_household_id(self):
+            req = urllib.request.Request(server.base_url + '/households/bad_id', headers={'api_key': 'key'})
+            try:
+                resp = urllib.request.urlopen(req)
+            except urllib.error.URLError as e:
+                resp = e
+
+            self.assertEqual(json.loads(resp.read().decode())['error']['control_code'], '7010')
+            self.assertEqual(resp.getcode(), 401)
+
+    return SampleTests
+
+
+class TestProfiling(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        global server
+        server = StandinServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        server.stop()
+
+    def test_profile_and_compare(self):
+        fd, artifact = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, artifact)
+        stream = io.StringIO()
+        suite = unittest.defaultTestLoader.loadTestsFromTestCase(sample_tests())
+
+        result = profiling.ProfilingTestRunner(stream=stream, artifact=artifact).run(suite)
+
+        self.assertTrue(result.wasSuccessful())
+        self.assertIn('slowest 2 tests', stream.getvalue())
+        with open(artifact) as f:
+            profiles = {p['test']: p for p in json.load(f)['tests']}
+        profile = profiles['SampleTests.test_get_households_invalid_household_id']
+        self.assertEqual(profile['requests'], 1)
+        self.assertGreater(profile['network'], 0)
+        self.assertGreater(profile['json_decode'], 0)
+        self.assertAlmostEqual(profile['build'] + profile['network'] + profile['decode_assert'], profile['total'])
+        self.assertIs(json.loads, profiling.json.loads)
+
+        self.assertEqual(profiling.compare(artifact, artifact, stream=io.StringIO()), [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,135 @@
+import json
+import socket
+import time
+import unittest
+
+from saim import Client
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.scans import BarcodeIndex, Latencies, ScanIngestor, ScanServer, barcode_of
+from saim.standin import PRODUCTS_CATALOG, StandinServer
+
+# 400003 is a product the household doesn't stock
+INDEX = {'400001': '1310035849', '400002': '1470432411', '400003': '1207714220'}
+
+
+class CountingClient(Client):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.posts = []
+
+    def post_transaction(self, household_id, stock_id, transaction, list_id='main'):
+        self.posts.append((household_id, stock_id, transaction))
+        return super().post_transaction(household_id, stock_id, transaction, list_id)
+
+
+class TestIndex(unittest.TestCase):
+    def test_from_products(self):
+        self.assertEqual(barcode_of(PRODUCTS_CATALOG[0]), '1207714220')
+        self.assertEqual(barcode_of({'id': '42'}), '42')
+        index = BarcodeIndex.from_products(PRODUCTS_CATALOG)
+        self.assertEqual(index.resolve('1207714220'), '1207714220')
+        self.assertIsNone(index.resolve('0'))
+
+    def test_latencies(self):
+        latencies = Latencies(window=100)
+        self.assertEqual(latencies.percentiles(), {})
+        for n in range(1, 201):
+            latencies.add(n / 1000.0)
+        percentiles = latencies.percentiles((50, 99))
+        # only the last 100 are kept
+        self.assertEqual(percentiles, {'p50': 0.15, 'p99': 0.199, 'max': 0.2})
+        self.assertEqual(latencies.count, 200)
+
+
+class TestScanIngestor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.client = CountingClient('key', self.server.base_url, 'pooled')
+        self.household_id = self.client.post_household(SEED_HOUSEHOLD).json()['id']
+        self.client.post_stock(self.household_id, SEED_STOCK)
+
+    def tearDown(self):
+        self.client.close()
+
+    def on_hand(self):
+        return {item['id']: item['on_hand'] for item in self.client.get_stock(self.household_id).json()}
+
+    def test_batches_fold_scans(self):
+        with ScanIngestor(self.client, BarcodeIndex(INDEX), max_batch=1000, max_delay=0.2) as ingestor:
+            for _ in range(100):
+                ingestor.submit({'household_id': self.household_id, 'barcode': '400001'})
+            for _ in range(10):
+                ingestor.submit({'household_id': self.household_id, 'barcode': '400002', 'type': 'remove',
+                                 'quantity': 2})
+            for _ in range(5):
+                ingestor.submit({'household_id': self.household_id, 'barcode': '400003'})
+            ingestor.submit({'household_id': self.household_id, 'barcode': '999999'})
+            ingestor.submit({'household_id': self.household_id, 'barcode': '400001', 'type': 'steal'})
+            ingestor.submit({'barcode': '400001'})
+            self.assertTrue(ingestor.flush(5))
+            stats = ingestor.stats()
+
+        self.assertEqual(self.on_hand(), {'1310035849': 103, '1470432411': -12})
+        self.assertEqual(sorted(self.client.posts), [
+            (self.household_id, '1207714220', {'type': 'add', 'quantity': 5}),
+            (self.household_id, '1310035849', {'type': 'add', 'quantity': 100}),
+            (self.household_id, '1470432411', {'type': 'remove', 'quantity': 20})])
+        self.assertEqual(stats['committed'], 110)
+        self.assertEqual(stats['failed'], 5)
+        self.assertEqual((stats['transactions'], stats['transactions_committed']), (3, 2))
+        self.assertEqual(stats['batches'], 1)
+        self.assertEqual(stats['unknown_barcode'], 1)
+        self.assertEqual(stats['invalid'], 2)
+        # the failed transaction doesn't count
+        self.assertEqual(stats['scans_per_transaction'], 55)
+        self.assertEqual(set(stats['latency']), {'p50', 'p90', 'p99', 'p99.9', 'max'})
+        # every scan waited for the batch to close
+        self.assertGreaterEqual(stats['latency']['p50'], 0.2)
+
+    def test_size_closes_batch(self):
+        with ScanIngestor(self.client, BarcodeIndex(INDEX), max_batch=10, max_delay=10) as ingestor:
+            start = time.monotonic()
+            for _ in range(30):
+                ingestor.submit({'household_id': self.household_id, 'barcode': '400001'})
+            self.assertTrue(ingestor.flush(5))
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertEqual(ingestor.stats()['batches'], 3)
+        self.assertEqual(self.on_hand()['1310035849'], 33)
+
+    def test_full_queue_rejects(self):
+        ingestor = ScanIngestor(self.client, BarcodeIndex(INDEX), queue_size=2)
+        scan = {'household_id': self.household_id, 'barcode': '400001'}
+        self.assertTrue(ingestor.submit(scan))
+        self.assertTrue(ingestor.submit(scan))
+        self.assertFalse(ingestor.submit(scan, timeout=0.01))
+        ingestor.start()
+        self.assertTrue(ingestor.flush(5))
+        ingestor.close()
+        self.assertEqual(ingestor.stats()['rejected'], 1)
+        self.assertEqual(self.on_hand()['1310035849'], 5)
+
+    def test_socket(self):
+        with ScanIngestor(self.client, BarcodeIndex(INDEX), max_delay=0.01) as ingestor:
+            with ScanServer(ingestor) as server:
+                with socket.create_connection(server.address) as sock:
+                    lines = [json.dumps({'household_id': self.household_id, 'barcode': '400002'})] * 5
+                    sock.sendall(('\n'.join(lines + ['not json', '']) + '\n').encode())
+                deadline = time.monotonic() + 5
+                while ingestor.stats().get('committed', 0) < 5 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertTrue(ingestor.flush(5))
+                stats = ingestor.stats()
+        self.assertEqual(stats['committed'], 5)
+        self.assertEqual(stats['invalid'], 1)
+        self.assertEqual(self.on_hand()['1470432411'], 13)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
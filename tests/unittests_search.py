@@ -0,0 +1,66 @@
+import unittest
+
+from saim.search import ProductIndex, tokenize
+
+products = [
+    {'id': '1207714220',
+     'title': 'Gillette Proglide Manual Razor Blade Refills for Men, 8 Count',
+     'description': ("Gillette's No. 1 on sensitive skin. 5 blade ProGlide system + 1 precision trimmer."),
+     'price': 44.55},
+    {'id': '1310035849',
+     'title': 'Disposable Razor, 12 Count',
+     'description': 'Twin blade razor for everyday use.',
+     'price': 9.99},
+    {'id': '1470432411',
+     'title': 'Coffee Filters',
+     'description': 'Basket filters, 200 count. Not a razor.',
+     'price': 3.49}
+]
+
+
+class TestProductIndex(unittest.TestCase):
+    def test_tokenize_case_folds(self):
+        self.assertEqual(tokenize("Gillette's ProGlide, 8 Count"), ['gillette', 's', 'proglide', '8', 'count'])
+
+    def test_search_matches_all_words(self):
+        index = ProductIndex(products)
+        result = [product['id'] for product, score in index.search('Proglide razor')]
+
+        self.assertEqual(result, ['1207714220'])
+
+    def test_search_ranks_title_hits_first(self):
+        index = ProductIndex(products)
+        result = [product['id'] for product, score in index.search('razor', prefix=False)]
+
+        self.assertEqual(result[-1], '1470432411')
+        self.assertEqual(set(result), {'1207714220', '1310035849', '1470432411'})
+
+    def test_search_prefix(self):
+        index = ProductIndex(products)
+
+        self.assertEqual([p['id'] for p, s in index.search('coff')], ['1470432411'])
+        self.assertEqual(index.search('coff', prefix=False), [])
+
+    def test_update_reindexes(self):
+        index = ProductIndex(products)
+        index.update(dict(products[2], title='Espresso Filters', description='Paper.'))
+
+        self.assertEqual(index.search('coffee'), [])
+        self.assertEqual([p['id'] for p, s in index.search('espresso')], ['1470432411'])
+        self.assertEqual(index.expand('cof'), [])
+
+    def test_remove(self):
+        index = ProductIndex(products)
+        index.remove('1207714220')
+
+        self.assertEqual(index.search('proglide'), [])
+        self.assertEqual(len(index), 2)
+
+    def test_limit(self):
+        index = ProductIndex(products)
+
+        self.assertEqual(len(index.search('count', limit=1)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,77 @@
+import json
+import unittest
+
+from saim import Client
+from saim.fixtures import SEED_HOUSEHOLD
+from saim.serialize import JsonArrayWriter
+from saim.standin import Handler, StandinServer
+
+ITEMS = [{'id': str(n), 'title': 'item é "%d"' % n, 'on_hand': n, 'min': 1, 'max': 10} for n in range(1000)]
+
+
+class HeaderRecordingHandler(Handler):
+    headers_seen = []
+
+    def do_POST(self):
+        HeaderRecordingHandler.headers_seen.append(dict(self.headers))
+        self._handle()
+
+
+class TestJsonArrayWriter(unittest.TestCase):
+    def test_dump(self):
+        writer = JsonArrayWriter(capacity=16, batch=7)
+        for items in (ITEMS, ITEMS[:1], [], ITEMS[:20]):
+            self.assertEqual(json.loads(bytes(writer.dump(items))), items)
+
+    def test_buffer_is_reused(self):
+        writer = JsonArrayWriter(capacity=16)
+        body = writer.dump(ITEMS)
+        buffer = writer.buffer
+        del body
+        writer.dump(ITEMS[:10])
+        self.assertIs(writer.buffer, buffer)
+
+    def test_held_body_does_not_block_a_larger_dump(self):
+        writer = JsonArrayWriter(capacity=16)
+        small = writer.dump(ITEMS[:1])
+        self.assertEqual(json.loads(bytes(writer.dump(ITEMS))), ITEMS)
+        self.assertEqual(len(small), len(json.dumps(ITEMS[:1], separators=(',', ':'))))
+
+    def test_chunks(self):
+        writer = JsonArrayWriter(batch=10)
+        for chunk_size in (1, 100, 4096, 1 << 20):
+            chunks = list(writer.chunks(ITEMS, chunk_size))
+            self.assertEqual(json.loads(b''.join(chunks)), ITEMS)
+            if chunk_size == 4096:
+                self.assertTrue(all(len(chunk) <= chunk_size for chunk in chunks))
+                self.assertGreater(len(chunks), 10)
+        self.assertEqual(list(writer.chunks([])), [b'[]'])
+
+
+class TestPostStock(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer(handler=HeaderRecordingHandler).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_post_stock(self):
+        for transport in ('urllib', 'pooled'):
+            with Client('key', self.server.base_url, transport) as client:
+                household_id = client.post_household(SEED_HOUSEHOLD).json()['id']
+                for chunked in (False, True):
+                    del HeaderRecordingHandler.headers_seen[:]
+                    resp = client.post_stock(household_id, ITEMS, chunked=chunked)
+                    self.assertEqual(resp.status, 200, resp.payload)
+                    headers = HeaderRecordingHandler.headers_seen[0]
+                    self.assertEqual(headers.get('Transfer-Encoding') == 'chunked', chunked)
+
+                stock = client.get_stock(household_id).json()
+                self.assertEqual(len(stock), len(ITEMS))
+                self.assertEqual(stock[5]['title'], ITEMS[5]['title'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
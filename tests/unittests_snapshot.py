@@ -0,0 +1,73 @@
+import unittest
+
+from saim import Client
+from saim.faults import FaultInjector, Rule
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.snapshot import snapshot, snapshots
+from saim.standin import StandinServer
+
+LATENCY = 0.05
+
+
+class TestSnapshot(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.faults = FaultInjector()
+        cls.server = StandinServer(faults=cls.faults).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.faults.set_rules([])
+        self.client = Client('key', self.server.base_url, 'pooled')
+        self.household_id = self.client.post_household(SEED_HOUSEHOLD).json()['id']
+        self.client.post_stock(self.household_id, SEED_STOCK)
+        self.client.post_transaction(self.household_id, '1310035849', {'type': 'add', 'quantity': 2})
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_snapshot(self):
+        snap = snapshot(self.client, self.household_id)
+
+        self.assertEqual(snap.household, dict(SEED_HOUSEHOLD, id=self.household_id))
+        stock = snap.lists['main']['stock']
+        self.assertEqual(sorted(stock), ['1310035849', '1470432411'])
+        self.assertEqual(stock['1310035849']['on_hand'], 5)
+        self.assertEqual([t['quantity'] for t in stock['1310035849']['transactions']], [2])
+        self.assertEqual(stock['1470432411']['transactions'], [])
+        self.assertEqual(sorted(call.name for call in snap.calls),
+                         ['household', 'lists', 'stock', 'transactions', 'transactions'])
+        self.assertEqual(snap.round_trips, 3)
+        self.assertEqual(snap.errors, [])
+
+    def test_costs_the_depth_of_the_tree(self):
+        self.faults.set_rules([Rule('GET *', latency=LATENCY)])
+        snap = snapshot(self.client, self.household_id)
+
+        self.assertEqual(len(snap.calls), 5)
+        self.assertLess(snap.elapsed, 4.5 * LATENCY)
+        self.assertTrue(all(call.elapsed >= LATENCY for call in snap.calls))
+
+    def test_errors(self):
+        self.faults.set_rules([Rule('GET */transactions', errors=1.0, status=503)])
+        snap = snapshot(self.client, self.household_id)
+
+        self.assertEqual([(call.name, call.status) for call in snap.errors], [('transactions', 503)] * 2)
+        self.assertIsNone(snap.lists['main']['stock']['1310035849']['transactions'])
+        self.assertIsNotNone(snap.household)
+
+        snap = snapshot(self.client, 'nope', transactions=False)
+        self.assertEqual(sorted(call.status for call in snap.errors), [401, 401])
+
+    def test_snapshots(self):
+        other = self.client.post_household(SEED_HOUSEHOLD).json()['id']
+        result = dict(snapshots(self.client, [self.household_id, other], transactions=False))
+        self.assertEqual(len(result[self.household_id].lists['main']['stock']), 2)
+        self.assertEqual(result[other].lists['main']['stock'], {})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,90 @@
+import unittest
+
+from saim import Client
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.standin import StandinServer
+from saim.sync import HashRing, SyncPool
+
+
+class TestHashRing(unittest.TestCase):
+    def test_adding_a_node_only_moves_its_keys(self):
+        keys = [str(n) for n in range(2000)]
+        ring = HashRing(['a', 'b', 'c'])
+        before = {key: ring.node_for(key) for key in keys}
+        ring.add('d')
+        after = {key: ring.node_for(key) for key in keys}
+
+        moved = [key for key in keys if before[key] != after[key]]
+        self.assertTrue(all(after[key] == 'd' for key in moved))
+        self.assertTrue(300 < len(moved) < 700)
+
+        ring.remove('d')
+        self.assertEqual({key: ring.node_for(key) for key in keys}, before)
+
+
+class TestSyncPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer().start()
+        with Client('key', cls.server.base_url, 'pooled') as client:
+            cls.household_ids = [client.post_household(SEED_HOUSEHOLD).json()['id'] for _ in range(30)]
+            for household_id in cls.household_ids:
+                client.post_stock(household_id, SEED_STOCK)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.pool = SyncPool('key', self.server.base_url, workers=2, threads=4)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_sync(self):
+        report = self.pool.sync(self.household_ids, timeout=30)
+
+        self.assertEqual(set(report.results), set(self.household_ids))
+        self.assertEqual(report.results[self.household_ids[0]], SEED_STOCK)
+        self.assertEqual(report.errors, {})
+        self.assertEqual(set(report.metrics), {'worker-1', 'worker-2'})
+        self.assertEqual(report.totals()['households'], 30)
+
+        # households stay with their worker, whose etags make the second sync conditional
+        report = self.pool.sync(self.household_ids, timeout=30)
+        self.assertEqual(report.totals()['not_modified'], 30)
+
+    def test_rebalance(self):
+        first = self.pool.sync(self.household_ids, timeout=30)
+        self.pool.add_worker()
+        report = self.pool.sync(self.household_ids, timeout=30)
+
+        moved = set(report.assignment['worker-3'])
+        self.assertTrue(moved)
+        self.assertFalse(moved & set(report.assignment['worker-1'] + report.assignment['worker-2']))
+        self.assertEqual(report.totals()['not_modified'], 30 - len(moved))
+        self.assertEqual(report.results, first.results)
+
+        self.pool.remove_worker('worker-1')
+        report = self.pool.sync(self.household_ids, timeout=30)
+        self.assertEqual(set(report.metrics), {'worker-2', 'worker-3'})
+        self.assertEqual(len(report.results), 30)
+
+    def test_dead_worker(self):
+        process, _ = self.pool._workers['worker-1']
+        process.terminate()
+        process.join()
+
+        report = self.pool.sync(self.household_ids, timeout=30)
+        self.assertEqual(len(report.results), 30)
+        self.assertTrue(report.reassigned)
+        self.assertEqual(self.pool.workers, ['worker-2'])
+
+    def test_errors(self):
+        report = self.pool.sync(['nope'], timeout=30)
+        self.assertEqual(report.results, {})
+        self.assertTrue(report.errors['nope'].startswith('ApiError'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,162 @@
+import os
+import tempfile
+import unittest
+
+from saim import Client
+from saim.client import HOUSEHOLD
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.snapshot import snapshot
+from saim.standin import Handler, StandinServer
+from saim.tracing import Collector, FileExporter, Tracer, critical_path, load, parse_traceparent, render
+
+
+class RecordingHandler(Handler):
+    # remembers the traceparent of every request; with drop_get set it reads the next GET and closes the connection
+    # instead of answering it, like a server timing out a kept-alive connection just as a request arrives
+    traceparents = []
+    drop_get = False
+
+    def do_GET(self):
+        RecordingHandler.traceparents.append(self.headers.get('traceparent'))
+        if RecordingHandler.drop_get:
+            RecordingHandler.drop_get = False
+            self.close_connection = True
+            return
+        self._handle()
+
+    def do_POST(self):
+        RecordingHandler.traceparents.append(self.headers.get('traceparent'))
+        self._handle()
+
+
+class TestTraceparent(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_traceparent('00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01'),
+                         ('4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7', True))
+        self.assertEqual(parse_traceparent('00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00')[2], False)
+        for value in (None, '', 'garbage', '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7',
+                      'ff-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01',
+                      '00-00000000000000000000000000000000-00f067aa0ba902b7-01'):
+            self.assertIsNone(parse_traceparent(value), value)
+
+    def test_continues_remote_trace(self):
+        tracer = Tracer()
+        with tracer.span('handler', traceparent='00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01') as span:
+            with tracer.span('child') as child:
+                pass
+        self.assertEqual(span.trace_id, '4bf92f3577b34da6a3ce929d0e0e4736')
+        self.assertEqual(span.parent_id, '00f067aa0ba902b7')
+        self.assertEqual(child.parent_id, span.span_id)
+        self.assertEqual([s['name'] for s in tracer.exporter.spans()], ['child', 'handler'])
+
+
+class TestClientTracing(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer(handler=RecordingHandler).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        del RecordingHandler.traceparents[:]
+        RecordingHandler.drop_get = False
+        self.tracer = Tracer(Collector())
+
+    def spans(self, name=None):
+        return [span for span in self.tracer.exporter.spans() if name is None or span['name'] == name]
+
+    def test_call_and_attempt_spans(self):
+        for transport in ('pooled', 'urllib'):
+            self.tracer.exporter.clear()
+            del RecordingHandler.traceparents[:]
+            with Client('key', self.server.base_url, transport, tracer=self.tracer) as client:
+                household_id = client.post_household(SEED_HOUSEHOLD).json()['id']
+                with self.tracer.span('checkout'):
+                    client.get_household(household_id)
+
+            root, = self.spans('checkout')
+            call, = self.spans('GET ' + HOUSEHOLD)
+            attempt = [span for span in self.spans('HTTP GET')][0]
+            self.assertEqual(call['parent_id'], root['span_id'])
+            self.assertEqual(attempt['parent_id'], call['span_id'])
+            self.assertEqual(attempt['trace_id'], root['trace_id'])
+            self.assertEqual(call['attributes'], {'household_id': household_id, 'http.status_code': 200})
+            self.assertEqual(attempt['attributes']['http.status_code'], 200)
+            # the server saw the attempt's span as its parent
+            self.assertEqual(RecordingHandler.traceparents[-1], '00-%s-%s-01' % (root['trace_id'],
+                                                                                attempt['span_id']))
+            # the post before the checkout is a trace of its own
+            post, = self.spans('POST /households')
+            self.assertIsNone(post['parent_id'])
+            self.assertNotEqual(post['trace_id'], root['trace_id'])
+
+    def test_retry_is_an_attempt(self):
+        with Client('key', self.server.base_url, 'pooled', tracer=self.tracer) as client:
+            household_id = client.post_household(SEED_HOUSEHOLD).json()['id']
+            self.tracer.exporter.clear()
+            RecordingHandler.drop_get = True
+            self.assertEqual(client.get_household(household_id).status, 200)
+
+        call, = self.spans('GET ' + HOUSEHOLD)
+        attempts = sorted(self.spans('HTTP GET'), key=lambda span: span['attributes']['attempt'])
+        self.assertEqual([span['attributes']['attempt'] for span in attempts], [1, 2])
+        self.assertEqual([span['parent_id'] for span in attempts], [call['span_id']] * 2)
+        self.assertTrue(attempts[0]['attributes']['net.reused'])
+        self.assertIn('RemoteDisconnected', attempts[0]['error'])
+        self.assertIsNone(attempts[1]['error'])
+        self.assertNotEqual(RecordingHandler.traceparents[-1], RecordingHandler.traceparents[-2])
+
+    def test_sampling(self):
+        tracer = Tracer(Collector(), sample_rate=0.0)
+        with Client('key', self.server.base_url, 'pooled', tracer=tracer) as client:
+            client.get_products()
+        self.assertEqual(tracer.exporter.spans(), [])
+        # unsampled traces still pass their ids on
+        self.assertTrue(RecordingHandler.traceparents[-1].endswith('-00'))
+
+        tracer = Tracer(Collector(), sample_rate=0.5, seed=1)
+        for _ in range(200):
+            with tracer.span('root'):
+                pass
+        self.assertTrue(60 < len(tracer.exporter.spans()) < 140)
+
+    def test_fan_out(self):
+        with Client('key', self.server.base_url, 'pooled', tracer=self.tracer) as client:
+            household_id = client.post_household(SEED_HOUSEHOLD).json()['id']
+            client.post_stock(household_id, SEED_STOCK)
+            self.tracer.exporter.clear()
+            snap = snapshot(client, household_id)
+
+            root, = self.spans('snapshot')
+            calls = [span for span in self.spans() if span['name'].startswith('GET ')]
+            self.assertEqual(len(calls), len(snap.calls))
+            self.assertEqual({span['parent_id'] for span in calls}, {root['span_id']})
+            self.assertEqual(root['attributes'], {'household_id': household_id, 'calls': len(snap.calls)})
+            path = critical_path(self.spans())
+            self.assertIn(root['span_id'], path)
+            self.assertEqual(len(path), 3)
+            text = render(self.spans())
+            self.assertIn('snapshot calls=%d household_id=%s' % (len(snap.calls), household_id), text)
+            self.assertEqual(text.count('\n* '), 3)
+
+            # client.map carries the caller's span to its threads
+            self.tracer.exporter.clear()
+            with self.tracer.span('batch') as batch:
+                list(client.map(client.get_household, [household_id] * 5))
+            self.assertEqual([span['parent_id'] for span in self.spans('GET ' + HOUSEHOLD)], [batch.span_id] * 5)
+
+    def test_file_exporter(self):
+        path = os.path.join(tempfile.mkdtemp(), 'spans.ndjson')
+        tracer = Tracer(FileExporter(path))
+        with Client('key', self.server.base_url, 'pooled', tracer=tracer) as client:
+            client.get_products()
+        tracer.close()
+        spans = load(path)
+        self.assertEqual([span['name'] for span in spans], ['HTTP GET', 'GET /products'])
+        self.assertIn('GET /products', render(spans))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+import socket
+import unittest
+import warnings
+
+from saim import Client
+from saim import http2
+from saim.errors import TransportError
+from saim.fixtures import SEED_HOUSEHOLD
+from saim.standin import Handler, StandinServer
+from saim.transport import PooledTransport, UrllibTransport, make_transport
+
+
+class DropAfterPost(Handler):
+    # carries out every POST, then closes the connection instead of answering
+    def respond(self, status, payload, headers=None):
+        if self.command == 'POST':
+            self.close_connection = True
+            return
+        super().respond(status, payload, headers)
+
+
+class TestPooledTransport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_standin_answers_like_the_sandbox(self):
+        with Client('key', self.server.base_url, 'pooled') as client:
+            resp = client.post_household({'first_name': 'John', 'last_name': 'Doe', 'address': 'Cardboard Box #3',
+                                          'email': 'homeless@nowhere.com', 'primary_phone': '(123) 456-7890'})
+            household_id = resp.json()['id']
+
+            self.assertEqual(resp.status, 201)
+            self.assertEqual(client.get_lists(household_id).json(), [{'description': 'default', 'id': 'main'}])
+            self.assertEqual(client.get_household('bad_id').error['control_code'], '7010')
+            self.assertEqual(client.post_stock(household_id, [{'id': '1310035849', 'max': 5}]).json(),
+                             {'error': {'error_message': {'min': ['required field']},
+                                        'error_title': 'Invalid request data.', 'control_code': '7020'}})
+            self.assertEqual(client.post_stock(household_id, [{'id': '1310035849', 'min': 2}], 'bad_list').status,
+                             404)
+            self.assertEqual(client.post_transaction(household_id, '1310035849', {'type': 'add'}).status, 404)
+            self.assertEqual(client.get_product('1' * 101).error['error_message'],
+                             {'product_id': ['max length is 100']})
+
+    def test_connections_are_reused(self):
+        transport = PooledTransport()
+        with Client('key', self.server.base_url, transport) as client:
+            client.get_products()
+            conn = transport._idle[('http', '127.0.0.1', self.server.httpd.server_port)][0]
+            client.get_products()
+
+            self.assertIs(transport._idle[('http', '127.0.0.1', self.server.httpd.server_port)][0], conn)
+
+    def test_stale_connection_is_retried(self):
+        transport = PooledTransport()
+        with Client('key', self.server.base_url, transport) as client:
+            client.get_products()
+            # the server dropping an idle keep-alive connection
+            transport._idle[('http', '127.0.0.1', self.server.httpd.server_port)][0].sock.shutdown(socket.SHUT_RDWR)
+
+            self.assertEqual(client.get_products().status, 200)
+
+    def test_connection_closed_while_idle_is_replaced(self):
+        transport = PooledTransport()
+        with Client('key', self.server.base_url, transport) as client:
+            client.get_products()
+            conn = transport._idle[('http', '127.0.0.1', self.server.httpd.server_port)][0]
+            conn.sock.shutdown(socket.SHUT_RDWR)
+
+            self.assertEqual(client.post_household(SEED_HOUSEHOLD).status, 201)
+            self.assertEqual((transport.stats()['reused'], transport.retries), (1, 0))
+            self.assertIsNone(conn.sock)
+
+    def test_post_is_not_resent(self):
+        # the server created the household and dropped the connection before answering: sending the POST again
+        # would create a second one
+        with StandinServer(handler=DropAfterPost) as server:
+            transport = PooledTransport()
+            with Client('key', server.base_url, transport) as client:
+                client.get_products()
+                with self.assertRaises(TransportError):
+                    client.post_household(SEED_HOUSEHOLD)
+                self.assertEqual(transport.stats()['reused'], 1)
+                self.assertEqual(transport.retries, 0)
+            self.assertEqual(len(server.backend.households), 1)
+
+    def test_make_transport(self):
+        self.assertIsInstance(make_transport('urllib'), UrllibTransport)
+        self.assertIsInstance(make_transport('pooled'), PooledTransport)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            transport = make_transport('http2')
+        self.assertIsInstance(transport, http2.Http2Transport if http2.available() else PooledTransport)
+        with self.assertRaises(ValueError):
+            make_transport('carrier pigeon')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+import socket
+import threading
+import time
+import unittest
+
+from saim import Client
+from saim.dnscache import DnsCache
+from saim.standin import Handler, StandinServer
+from saim.warmup import measure
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ConnectionCountingHandler(Handler):
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with ConnectionCountingHandler.lock:
+            ConnectionCountingHandler.connections += 1
+
+    @classmethod
+    def settled(cls, expected, timeout=2.0):
+        # accepted connections reach setup() on the server's threads, possibly after the client has moved on
+        deadline = time.monotonic() + timeout
+        while cls.connections < expected and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return cls.connections
+
+
+class TestDnsCache(unittest.TestCase):
+    def test_ttl(self):
+        lookups = []
+
+        def resolver(host, port):
+            lookups.append(host)
+            return socket.getaddrinfo('127.0.0.1', port, type=socket.SOCK_STREAM), 30 if host == 'short' else None
+
+        clock = Clock()
+        cache = DnsCache(ttl=60, resolver=resolver, clock=clock)
+        for host in ('short', 'default', 'short', 'default'):
+            cache.resolve(host, 80)
+        self.assertEqual(lookups, ['short', 'default'])
+
+        clock.now = 45
+        cache.resolve('short', 80)
+        cache.resolve('default', 80)
+        self.assertEqual(lookups, ['short', 'default', 'short'])
+        self.assertEqual(cache.stats()['hits'], 3)
+
+    def test_literal_address(self):
+        # nothing to ask dns about, with or without dnspython
+        infos, ttl = DnsCache()._resolve('127.0.0.1', 80)
+        self.assertEqual(infos[0][4], ('127.0.0.1', 80))
+        self.assertIsNone(ttl)
+
+
+class TestWarmUp(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer(handler=ConnectionCountingHandler).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_warm_up(self):
+        base_url = self.server.base_url.replace('127.0.0.1', 'localhost')
+        with Client('key', base_url, 'pooled') as client:
+            before = ConnectionCountingHandler.connections
+            report = client.warm_up(3)
+            self.assertEqual(report['connections'], 3)
+            self.assertEqual(ConnectionCountingHandler.settled(before + 3) - before, 3)
+
+            # the requests use the connections that are already open
+            for _ in range(3):
+                self.assertTrue(client.get_products().ok)
+            self.assertEqual(ConnectionCountingHandler.connections - before, 3)
+            self.assertEqual(client.transport.dns.stats()['misses'], 1)
+
+    def test_warm_up_through_wrappers(self):
+        with Client('key', self.server.base_url, 'pooled', cache=1024, contracts=1.0) as client:
+            self.assertEqual(client.warm_up(2)['connections'], 2)
+        with Client('key', self.server.base_url, 'urllib') as client:
+            self.assertEqual(client.warm_up(2)['connections'], 0)
+
+    def test_measure(self):
+        report = measure('key', self.server.base_url, connections=2, requests=5)
+        self.assertEqual(report['cold']['status'], 200)
+        self.assertEqual(report['warm']['status'], 200)
+        self.assertEqual(report['warm_up']['connections'], 2)
+        self.assertEqual(report['steady']['requests'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
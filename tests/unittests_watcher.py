@@ -0,0 +1,164 @@
+import unittest
+
+from saim import Client
+from saim.fixtures import SEED_HOUSEHOLD, SEED_STOCK
+from saim.standin import Handler, StandinServer
+from saim.watcher import StockWatcher
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class NoValidators(Handler):
+    # no ETag on anything, so the watcher falls back to hashing the payload; `garbled` answers stock GETs with html
+    garbled = False
+
+    def respond(self, status, payload, headers=None):
+        if self.garbled and self.command == 'GET' and self.path.endswith('/stock'):
+            payload = b'<html><body>Bad Gateway</body></html>'
+        super().respond(status, payload)
+
+
+class TestStockWatcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.client = Client('key', self.server.base_url, 'pooled')
+        self.household_id = self.client.post_household(SEED_HOUSEHOLD).json()['id']
+        self.client.post_stock(self.household_id, SEED_STOCK)
+        self.clock = Clock()
+        self.watcher = StockWatcher(self.client, min_interval=1, max_interval=60, backoff=2, clock=self.clock)
+        self.deltas = []
+        self.watcher.subscribe(self.deltas.extend)
+        self.watcher.watch(self.household_id)
+
+    def tearDown(self):
+        self.client.close()
+
+    def poll(self):
+        self.clock.now += self.watcher.poll_due()
+
+    def test_deltas(self):
+        self.poll()
+        self.assertEqual(self.deltas, [])
+
+        self.client.post_transaction(self.household_id, '1310035849', {'type': 'add', 'quantity': 10})
+        self.client.put_stock_item(self.household_id, '1470432411', {'max': 15})
+        self.client.post_stock(self.household_id, [{'id': '1207714220', 'min': 1, 'max': 2}])
+        self.poll()
+
+        changes = {(d.stock_id, d.kind): d.changes for d in self.deltas}
+        self.assertEqual(changes, {('1310035849', 'changed'): {'on_hand': (3, 13)},
+                                   ('1470432411', 'changed'): {'max': (10, 15)},
+                                   ('1207714220', 'added'): {}})
+
+        del self.deltas[:]
+        self.client.delete_stock_item(self.household_id, '1207714220')
+        self.poll()
+        self.assertEqual([(d.stock_id, d.kind) for d in self.deltas], [('1207714220', 'removed')])
+
+    def test_conditional_polls_and_adaptive_interval(self):
+        for _ in range(4):
+            self.poll()
+        stats = self.watcher.stats(self.household_id)
+
+        self.assertEqual(stats['polls'], 4)
+        self.assertEqual(stats['not_modified'], 3)
+        self.assertEqual(stats['interval'], 16)
+
+        self.client.put_stock_item(self.household_id, '1470432411', {'max': 15})
+        self.poll()
+        self.assertEqual(self.watcher.stats(self.household_id)['interval'], 8)
+
+    def test_watch_again(self):
+        self.poll()
+        self.watcher.unwatch(self.household_id)
+        self.watcher.watch(self.household_id)
+        self.watcher.watch(self.household_id)
+        for _ in range(4):
+            self.poll()
+
+        # once per cycle: the entries from before the unwatch don't poll it as well
+        self.assertEqual(self.watcher.stats(self.household_id)['polls'], 4)
+        self.assertEqual(self.watcher.stats(self.household_id)['interval'], 16)
+
+    def test_raising_subscriber(self):
+        def broken(deltas):
+            raise RuntimeError('subscriber bug')
+
+        self.watcher.subscribe(broken)
+        self.poll()
+        self.client.put_stock_item(self.household_id, '1470432411', {'max': 15})
+        self.poll()
+
+        # the other subscriber still got the change and the household is still polled
+        self.assertEqual([(d.stock_id, d.kind) for d in self.deltas], [('1470432411', 'changed')])
+        self.assertEqual(self.watcher.stats(self.household_id)['errors'], 1)
+        self.poll()
+        self.assertEqual(self.watcher.stats(self.household_id)['polls'], 3)
+
+
+class TestWithoutValidators(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandinServer(handler=NoValidators).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.client = Client('key', self.server.base_url, 'pooled')
+        self.household_id = self.client.post_household(SEED_HOUSEHOLD).json()['id']
+        self.client.post_stock(self.household_id, SEED_STOCK)
+        self.clock = Clock()
+        self.watcher = StockWatcher(self.client, min_interval=1, max_interval=60, backoff=2, clock=self.clock)
+        self.deltas = []
+        self.watcher.subscribe(self.deltas.extend)
+        self.watcher.watch(self.household_id)
+
+    def tearDown(self):
+        NoValidators.garbled = False
+        self.client.close()
+
+    def poll(self):
+        self.clock.now += self.watcher.poll_due()
+
+    def test_content_hash(self):
+        for _ in range(3):
+            self.poll()
+        stats = self.watcher.stats(self.household_id)
+        self.assertEqual((stats['polls'], stats['not_modified'], stats['unchanged']), (3, 0, 2))
+
+        self.client.put_stock_item(self.household_id, '1470432411', {'max': 15})
+        self.poll()
+        self.assertEqual([(d.stock_id, d.changes) for d in self.deltas], [('1470432411', {'max': (10, 15)})])
+
+    def test_bad_payload(self):
+        self.poll()
+        NoValidators.garbled = True
+        self.poll()
+        self.poll()
+        stats = self.watcher.stats(self.household_id)
+        self.assertEqual((stats['polls'], stats['errors']), (3, 2))
+
+        # the html wasn't taken for the stock: the first good answer after it is compared with the last good one
+        NoValidators.garbled = False
+        self.client.put_stock_item(self.household_id, '1470432411', {'max': 15})
+        self.poll()
+        self.assertEqual([(d.stock_id, d.changes) for d in self.deltas], [('1470432411', {'max': (10, 15)})])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)